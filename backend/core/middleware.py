@@ -0,0 +1,53 @@
+import time
+from django.db import connection
+from .metrics import registry
+
+# Buckets of the number of database queries made by a request
+DB_QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+http_requests = registry.counter(
+    "esemtials_http_requests_total",
+    "HTTP requests by view, method and status code.",
+    labels=("view", "method", "status"),
+)
+http_request_duration = registry.histogram(
+    "esemtials_http_request_duration_seconds",
+    "Latency of the HTTP requests by view.",
+    labels=("view", "method"),
+)
+http_request_db_queries = registry.histogram(
+    "esemtials_http_request_db_queries",
+    "Database queries made by the HTTP requests by view.",
+    labels=("view", "method"),
+    buckets=DB_QUERY_BUCKETS,
+)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    # Latency, status code and number of database queries of every request, labelled
+    # with the URL name of the view. Requests that match no URL are "unmatched"
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, "resolver_match", None)
+        view = (match.view_name or match._func_path) if match else "unmatched"
+        http_requests.inc(view=view, method=request.method, status=response.status_code)
+        http_request_duration.observe(elapsed, view=view, method=request.method)
+        http_request_db_queries.observe(queries.count, view=view, method=request.method)
+        return response
@@ -0,0 +1,117 @@
+import json
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+def cursor_pagination_setting(name, default=None):
+    return getattr(settings, "CURSOR_PAGINATION", {}).get(name, default)
+
+
+class OptInCursorPagination(CursorPagination):
+    # Keyset pagination on the `cursor_ordering` of the view, which ends with a unique
+    # field (id / pk). The cursor holds the values of every ordering field of the item
+    # it points at and pages continue after that whole key, DRF's CursorPagination
+    # only keys on the first field and skips the ties with an offset.
+    # It is opt-in: requests carrying a cursor or page_size get {"next", "previous",
+    # "results"} pages, the others still get the whole list as a plain array
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+
+    def get_page_size(self, request):
+        self.page_size = cursor_pagination_setting("PAGE_SIZE", 50)
+        self.max_page_size = cursor_pagination_setting("MAX_PAGE_SIZE", 500)
+        return super().get_page_size(request)
+
+    def get_ordering(self, request, queryset, view):
+        return tuple(view.cursor_ordering)
+
+    def _get_position_from_instance(self, instance, ordering):
+        return json.dumps(
+            [str(getattr(instance, field.lstrip("-"))) for field in ordering]
+        )
+
+    def keyset_filter(self, queryset, position, reverse):
+        # Items after the key of the cursor: (a, b) > (x, y) is a > x or (a = x and
+        # b > y), each field compared in its own direction
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            condition = Q()
+            equal = Q()
+            for field, value in zip(self.ordering, values):
+                name = field.lstrip("-")
+                model_field = (
+                    queryset.model._meta.pk
+                    if name == "pk"
+                    else queryset.model._meta.get_field(name)
+                )
+                value = model_field.to_python(value)
+                lookup = "lt" if reverse != field.startswith("-") else "gt"
+                condition |= equal & Q(**{f"{name}__{lookup}": value})
+                equal &= Q(**{name: value})
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return queryset.filter(condition)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not any(
+            param in request.query_params
+            for param in (self.cursor_query_param, self.page_size_query_param)
+        ):
+            return None
+
+        # CursorPagination.paginate_queryset with the keyset filter on every field
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            offset, reverse, current_position = 0, False, None
+        else:
+            offset, reverse, current_position = self.cursor
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [
+                field[1:] if field.startswith("-") else f"-{field}"
+                for field in ordering
+            ]
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            queryset = self.keyset_filter(queryset, current_position, reverse)
+
+        # one more item tells whether a page follows
+        results = list(queryset[offset : offset + self.page_size + 1])
+        self.page = results[: self.page_size]
+        has_following_position = len(results) > len(self.page)
+        following_position = None
+        if has_following_position:
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None or offset > 0
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
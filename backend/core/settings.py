@@ -50,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.MetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -91,6 +92,136 @@ WSGI_APPLICATION = "core.wsgi.application"
 
 REST_FRAMEWORK = {"DEFAULT_AUTHENTICATION_CLASSES": ("knox.auth.TokenAuthentication",)}
 
+# Cursor pagination of the list endpoints (team members, comments, git integrations,
+# projects, notes, users). Requests with a cursor or page_size query parameter get
+# pages of PAGE_SIZE items (page_size up to MAX_PAGE_SIZE), the others the whole list
+CURSOR_PAGINATION = {
+    "PAGE_SIZE": 50,
+    "MAX_PAGE_SIZE": 500,
+}
+
+# Base url of the GitLab REST API, set it to the local stand-in server
+# (python manage.py gitlab_standin) to run the stats pipeline without gitlab.com
+GITLAB_API_URL = os.environ.get("GITLAB_API_URL", "https://gitlab.com/api/v4")
+
+# GitLab API client - one pooled keep-alive session shared by team/utils.py
+# POOL_CONNECTIONS is the number of hosts kept in the pool,
+# POOL_MAXSIZE is the number of connections kept alive per host,
+# MAX_WORKERS bounds how many per-project/per-commit requests run in parallel,
+# list endpoints are paginated with PER_PAGE and optionally capped per call
+# with MAX_PAGES / MAX_ITEMS (None means read every page)
+GITLAB_CLIENT = {
+    "POOL_CONNECTIONS": 10,
+    "POOL_MAXSIZE": 20,
+    "POOL_BLOCK": False,
+    "TIMEOUT": 30,
+    "MAX_WORKERS": 8,
+    "PER_PAGE": 100,
+    "MAX_PAGES": None,
+    "MAX_ITEMS": None,
+    "HEADERS": {"Content-Type": "application/json"},
+}
+
+# Token bucket scheduler keyed by GitLab access token, RATE requests per second
+# with bursts up to BURST, paced further by the RateLimit-* / Retry-After headers.
+# A RATE of 0 disables it like ENABLED False. Throttled (429) requests are retried up
+# to MAX_RETRIES times
+GITLAB_RATE_LIMIT = {
+    "ENABLED": True,
+    "RATE": 25,
+    "BURST": 50,
+    "MAX_RETRIES": 3,
+    "MAX_BACKOFF": 60,
+}
+
+# Where commit line counts come from - "listing" reads them in bulk from the
+# commits listing (with_stats=true), "diff" downloads the diff of every commit
+GITLAB_COMMIT_STATS_SOURCE = "listing"
+
+# How much added / removed line content is kept for each commit diff -
+# "counts" (line counts only), "first_n" (the first GITLAB_DIFF_CONTENT_MAX_LINES
+# lines of each kind) or "full" (every line)
+GITLAB_DIFF_CONTENT_RETENTION = "counts"
+GITLAB_DIFF_CONTENT_MAX_LINES = 20
+
+# On-disk cache for commit diffs keyed by (project_id, sha),
+# least recently used entries are evicted once MAX_BYTES is exceeded
+GITLAB_DIFF_CACHE = {
+    "ENABLED": True,
+    "DIR": BASE_DIR / "cache" / "gitlab_diffs",
+    "MAX_BYTES": 256 * 1024 * 1024,
+}
+
+# Coding stats are computed by a worker (python manage.py run_coding_stats_worker)
+# polling the CodingStatsJob table. With RUN_IN_BACKGROUND set to False the job is
+# run inside the request instead. Jobs running longer than RUNNING_TIMEOUT seconds
+# are considered abandoned and queued again.
+CODING_STATS_JOBS = {
+    "RUN_IN_BACKGROUND": True,
+    "POLL_INTERVAL": 2,
+    "RUNNING_TIMEOUT": 3600,
+}
+
+# Aggregate coding stats with numpy arrays when numpy is installed (it is optional,
+# pip install numpy). The vectorized path pays off for teammembers with many projects,
+# below MIN_PROJECTS the plain python buckets are faster.
+CODING_STATS_NUMPY = {
+    "ENABLED": True,
+    "MIN_PROJECTS": 20,
+}
+
+# Days of CodingActivityDailyRollup rows kept. Raw MRs and commits only cover the last
+# 60 days, the rollups keep the history used by the coding stats range endpoint.
+CODING_STATS_ROLLUP_RETENTION_DAYS = 730
+
+# Every coding stats job records the time, GitLab requests and bytes received of each
+# stage in its result ("timings"). With SERVER_TIMING they are also sent in a
+# Server-Timing header by the job endpoints once the job is finished
+CODING_STATS_TIMINGS = {
+    "SERVER_TIMING": True,
+}
+
+# GitLab webhook receiver (team/gitlab-webhook/) for push, merge request and note events.
+# Set SECRET_TOKEN to the secret token of the GitLab webhook, without it every delivery
+# is rejected. Events are applied to the stats of the matching teammembers by the worker
+GITLAB_WEBHOOK = {
+    "SECRET_TOKEN": os.environ.get("GITLAB_WEBHOOK_SECRET_TOKEN"),
+}
+
+# Stale-while-revalidate for the coding stats detail and list endpoints: stats whose
+# latestUpdate is older than MAX_AGE seconds are served flagged as stale and an update
+# job is queued for the worker. A teammember gets at most one such job per RETRY_AFTER
+# seconds. Nothing is queued when the jobs do not RUN_IN_BACKGROUND (reads never wait)
+CODING_STATS_STALENESS = {
+    "ENABLED": True,
+    "MAX_AGE": 6 * 3600,
+    "RETRY_AFTER": 5 * 60,
+}
+
+# Django cache, in process memory by default. The coding stats detail entries check the
+# `updated` time of the stats, so changes saved by the worker process are picked up too
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "esemtials",
+    }
+}
+
+# Serialized coding stats detail responses are cached per teammember for TIMEOUT
+# seconds, saving or deleting the stats drops the entry
+CODING_STATS_CACHE = {
+    "ENABLED": True,
+    "TIMEOUT": 24 * 3600,
+}
+
+# In process metrics (request latency and status per view, database queries, GitLab
+# calls) served in the Prometheus text format on /metrics/. Only the ALLOWED_IPS can
+# read them, an empty list opens the endpoint to everyone
+METRICS = {
+    "ENABLED": True,
+    "ALLOWED_IPS": ["127.0.0.1", "::1"],
+}
+
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
@@ -22,6 +22,7 @@ from django.views.generic import TemplateView
 from knox import views as knox_views
 from django.conf import settings
 from django.conf.urls.static import static  #
+from .views import metrics_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -47,6 +48,7 @@ urlpatterns = [
     ),
     path("team/", include("team.urls")),
     path("dashboard/", include("dashboard.urls")),
+    path("metrics/", metrics_view, name="metrics"),
 ]
 
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from .metrics import registry
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def metrics_setting(name, default=None):
+    return getattr(settings, "METRICS", {}).get(name, default)
+
+
+def metrics_view(request):
+    # Metrics of this process in the Prometheus text format, for a local scraper
+    if not metrics_setting("ENABLED", True):
+        raise Http404
+    allowed_ips = metrics_setting("ALLOWED_IPS")
+    if allowed_ips and request.META.get("REMOTE_ADDR") not in allowed_ips:
+        raise Http404
+    return HttpResponse(registry.exposition(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -12,6 +12,10 @@ class Project(models.Model):
     project_created = models.DateTimeField(default=timezone.now)
     project_updated = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        # the project list and its cursor pages, last updated first
+        indexes = [models.Index(fields=["project_owner", "project_updated", "id"])]
+
     def __str__(self):
         return f"{self.project_owner} {self.project_name}"
 
@@ -27,5 +31,8 @@ class Note(models.Model):
     note_content = models.JSONField(blank=True, null=True)
     note_updated = models.DateTimeField(null=False)
 
+    class Meta:
+        indexes = [models.Index(fields=["note_owner", "note_updated", "id"])]
+
     def __str__(self):
         return f"{self.note_owner} {self.note_name}"
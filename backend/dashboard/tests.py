@@ -1,3 +1,90 @@
+import base64
+import json
+from datetime import timedelta
+from urllib.parse import urlencode
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from users.models import CustomUser
+from .models import Note, Project
 
-# Create your tests here.
+
+class NoteCursorPaginationTests(TestCase):
+    def setUp(self):
+        user = CustomUser.objects.create_user(
+            email="owner@example.com", username="owner", password="pw"
+        )
+        project = Project.objects.create(project_owner=user, project_name="project")
+        # several notes share their note_updated, the first field of the ordering
+        now = timezone.now().replace(microsecond=123456)
+        self.notes = [
+            Note.objects.create(
+                note_owner=user,
+                project=project,
+                note_name=f"note {number}",
+                note_updated=now - timedelta(minutes=minutes),
+            )
+            for number, minutes in enumerate([0, 5, 5, 5, 10, 10, 15])
+        ]
+        self.ordered_ids = [
+            note.pk
+            for note in sorted(
+                self.notes, key=lambda note: (note.note_updated, note.pk), reverse=True
+            )
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.url = reverse("note-list")
+
+    def ids(self, response):
+        return [note["id"] for note in response.data["results"]]
+
+    def test_requests_without_cursor_or_page_size_get_the_whole_list(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([note["id"] for note in response.data], self.ordered_ids)
+
+    def test_next_links_page_through_ties_on_the_first_field(self):
+        pages = []
+        response = self.client.get(self.url, {"page_size": 2})
+        while True:
+            pages.append(self.ids(response))
+            if response.data["next"] is None:
+                break
+            response = self.client.get(response.data["next"])
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        self.assertEqual(sum(pages, []), self.ordered_ids)
+
+    def test_previous_links_walk_back_over_the_datetime_ordering(self):
+        forward = []
+        response = self.client.get(self.url, {"page_size": 3})
+        while True:
+            forward.append(self.ids(response))
+            if response.data["next"] is None:
+                break
+            response = self.client.get(response.data["next"])
+
+        backward = []
+        while response.data["previous"] is not None:
+            response = self.client.get(response.data["previous"])
+            backward.append(self.ids(response))
+
+        self.assertEqual(backward, forward[-2::-1])
+        self.assertIsNone(response.data["previous"])
+        self.assertIsNotNone(response.data["next"])
+
+    def test_invalid_cursors_are_a_404(self):
+        positions = [
+            "not json",
+            json.dumps(["2024-01-01T00:00:00+00:00"]),  # one field of the two
+            json.dumps(["not a date", "1"]),
+        ]
+        cursors = ["garbage"] + [
+            base64.b64encode(urlencode({"p": position}).encode()).decode()
+            for position in positions
+        ]
+        for cursor in cursors:
+            response = self.client.get(self.url, {"cursor": cursor})
+            self.assertEqual(response.status_code, 404, cursor)
@@ -8,6 +8,7 @@ from rest_framework.generics import (
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import PermissionDenied
 from rest_framework import permissions
+from core.pagination import OptInCursorPagination
 
 from .models import Project, Note
 from .serializers import ProjectSerializer, NoteSerializer
@@ -28,11 +29,15 @@ class ProjectCreateAPIView(CreateAPIView):
 
 class ProjectListAPIView(ListAPIView):
     serializer_class = ProjectSerializer
+    pagination_class = OptInCursorPagination
+    cursor_ordering = ("-project_updated", "-id")
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
-        return Project.objects.filter(project_owner=user).order_by("-project_updated")
+        return Project.objects.filter(project_owner=user).order_by(
+            *self.cursor_ordering
+        )
 
 
 class ProjectDetailAPIView(RetrieveAPIView):
@@ -90,10 +95,12 @@ class NoteUpdateAPIView(UpdateAPIView):
 class NoteListAPIView(ListAPIView):
     serializer_class = NoteSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OptInCursorPagination
+    cursor_ordering = ("-note_updated", "-id")
 
     def get_queryset(self):
         user = self.request.user
-        return Note.objects.filter(note_owner=user).order_by("-note_updated")
+        return Note.objects.filter(note_owner=user).order_by(*self.cursor_ordering)
 
 
 class NoteDetailAPIView(RetrieveAPIView):
@@ -0,0 +1,366 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import (
+    CodingActivityDailyRollup,
+    GitLabProject,
+    GitLabMergeRequest,
+    GitLabMergeRequestNote,
+    GitLabCommit,
+    GitLabCommitDiffStat,
+)
+
+# Rows per INSERT and ids per IN (...) lookup, well below the SQLite variables limit
+BATCH_SIZE = 500
+
+
+def batches(items, size=BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def upsert(model, objects, unique_fields, update_fields):
+    model.objects.bulk_create(
+        objects,
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=unique_fields,
+        update_fields=update_fields,
+    )
+
+
+def parse_optional_datetime(value):
+    return parse_datetime(value) if value else None
+
+
+def store_coding_activity(teammember, body, first_full_day=None):
+    # Upsert the records of a fetched body (see coding_stats.fetch_coding_activity)
+    # into the GitLab activity tables, returns the number of rows written per table.
+    # Rollups are only rebuilt from first_full_day on, older days of the raw tables are
+    # incomplete (the fetch starts in the middle of a day) and keep their rollups
+    projects = []
+    merge_requests = {}
+    notes = {}
+    commits = {}
+    diff_stats = {}
+
+    for project_id, project_data in body.items():
+        project_id = int(project_id)
+        projects.append(
+            GitLabProject(
+                project_id=project_id,
+                name=project_data["project_name"],
+                web_url=project_data["project_url"],
+            )
+        )
+
+        # an MR both created and reviewed by the teammember is stored once
+        for role, records in (
+            ("is_author", project_data["created_mrs_data"]),
+            ("is_reviewer", project_data["reviewed_mrs_data"]),
+        ):
+            for mr in records:
+                mr_id = int(mr["mr_id"])
+                merge_request = merge_requests.get(mr_id)
+                if merge_request is None:
+                    merge_request = merge_requests[mr_id] = GitLabMergeRequest(
+                        teammember=teammember,
+                        mr_id=mr_id,
+                        project_id=project_id,
+                        iid=mr["iid"],
+                        created_at=parse_datetime(mr["created_at"]),
+                        merged_at=parse_optional_datetime(mr["merged_at"]),
+                        create_to_merge=mr.get("create_to_merge"),
+                    )
+                setattr(merge_request, role, True)
+                if mr.get("comment_ids"):
+                    notes[mr_id] = list(
+                        zip(
+                            mr["comment_ids"],
+                            mr.get("comment_bodies") or [""] * len(mr["comment_ids"]),
+                        )
+                    )
+
+        for commit in project_data["created_commits_data"]:
+            key = (project_id, commit["commit_short_id"])
+            commits[key] = GitLabCommit(
+                teammember=teammember,
+                project_id=project_id,
+                short_id=commit["commit_short_id"],
+                web_url=commit["commit_web_url"] or "",
+                created_at=parse_datetime(commit["created_at"]),
+            )
+            diff_data = commit.get("diff_data") or []
+            diff_stats[key] = {
+                "lines_added": sum(int(item["lines_added"]) for item in diff_data),
+                "lines_removed": sum(int(item["lines_removed"]) for item in diff_data),
+                "added_lines_content": [
+                    line for item in diff_data for line in item["added_lines_content"]
+                ],
+                "removed_lines_content": [
+                    line for item in diff_data for line in item["removed_lines_content"]
+                ],
+            }
+
+    with transaction.atomic():
+        upsert(GitLabProject, projects, ["project_id"], ["name", "web_url"])
+        upsert(
+            GitLabMergeRequest,
+            list(merge_requests.values()),
+            ["teammember", "mr_id"],
+            [
+                "project_id",
+                "iid",
+                "created_at",
+                "merged_at",
+                "create_to_merge",
+                "is_author",
+                "is_reviewer",
+            ],
+        )
+        upsert(
+            GitLabCommit,
+            list(commits.values()),
+            ["teammember", "project_id", "short_id"],
+            ["web_url", "created_at"],
+        )
+
+        # upserted rows do not get their primary keys back, look them up for the children
+        merge_request_pks = {}
+        for mr_ids in batches(notes):
+            merge_request_pks.update(
+                GitLabMergeRequest.objects.filter(
+                    teammember=teammember, mr_id__in=mr_ids
+                ).values_list("mr_id", "pk")
+            )
+        upsert(
+            GitLabMergeRequestNote,
+            [
+                GitLabMergeRequestNote(
+                    merge_request_id=merge_request_pks[mr_id],
+                    note_id=note_id,
+                    body=note_body or "",
+                )
+                for mr_id, mr_notes in notes.items()
+                for note_id, note_body in mr_notes
+            ],
+            ["merge_request", "note_id"],
+            ["body"],
+        )
+
+        commit_pks = {}
+        for keys in batches(commits):
+            for project_id, short_id, pk in GitLabCommit.objects.filter(
+                teammember=teammember, short_id__in=[short_id for _, short_id in keys]
+            ).values_list("project_id", "short_id", "pk"):
+                commit_pks[(project_id, short_id)] = pk
+        upsert(
+            GitLabCommitDiffStat,
+            [
+                GitLabCommitDiffStat(commit_id=commit_pks[key], **diff_stat)
+                for key, diff_stat in diff_stats.items()
+            ],
+            ["commit"],
+            [
+                "lines_added",
+                "lines_removed",
+                "added_lines_content",
+                "removed_lines_content",
+            ],
+        )
+
+        # rebuild the rollups of the days the fetched records were created on
+        created_days = [
+            created_at.astimezone(dt_timezone.utc).date()
+            for created_at in [mr.created_at for mr in merge_requests.values()]
+            + [commit.created_at for commit in commits.values()]
+        ]
+        if first_full_day is not None:
+            created_days = [day for day in created_days if day >= first_full_day]
+        if created_days:
+            refresh_daily_rollups(teammember, min(created_days), max(created_days))
+
+    return {
+        "projects": len(projects),
+        "merge_requests": len(merge_requests),
+        "notes": sum(len(mr_notes) for mr_notes in notes.values()),
+        "commits": len(commits),
+    }
+
+
+def day_start(day):
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+
+
+def refresh_daily_rollups(teammember, first_day, last_day):
+    # Rebuild the CodingActivityDailyRollup rows of the days [first_day, last_day]
+    # with SQL aggregates over the activity tables, the other days are not touched
+    created_in_range = {
+        "teammember": teammember,
+        "created_at__gte": day_start(first_day),
+        "created_at__lt": day_start(last_day + timedelta(days=1)),
+    }
+    rollups = {}
+
+    def rollup(project_id, day):
+        if (project_id, day) not in rollups:
+            rollups[(project_id, day)] = CodingActivityDailyRollup(
+                teammember=teammember, project_id=project_id, day=day
+            )
+        return rollups[(project_id, day)]
+
+    merge_requests = GitLabMergeRequest.objects.filter(**created_in_range)
+    for row in (
+        merge_requests.annotate(day=TruncDate("created_at", tzinfo=dt_timezone.utc))
+        .values("project_id", "day")
+        .annotate(
+            created=Count("id", filter=Q(is_author=True)),
+            reviewed=Count("id", filter=Q(is_reviewer=True)),
+            merged=Count("id", filter=Q(is_author=True, create_to_merge__isnull=False)),
+            create_to_merge=Sum("create_to_merge", filter=Q(is_author=True)),
+        )
+    ):
+        day_rollup = rollup(row["project_id"], row["day"])
+        day_rollup.created_mrs = row["created"]
+        day_rollup.reviewed_mrs = row["reviewed"]
+        day_rollup.merged_mrs = row["merged"]
+        day_rollup.create_to_merge_seconds = row["create_to_merge"] or 0
+
+    # comments are counted in the MRs created by the teammember
+    for row in (
+        GitLabMergeRequestNote.objects.filter(
+            merge_request__in=merge_requests.filter(is_author=True)
+        )
+        .annotate(
+            day=TruncDate("merge_request__created_at", tzinfo=dt_timezone.utc)
+        )
+        .values("merge_request__project_id", "day")
+        .annotate(comments=Count("id"))
+    ):
+        rollup(row["merge_request__project_id"], row["day"]).comments = row["comments"]
+
+    for row in (
+        GitLabCommit.objects.filter(**created_in_range)
+        .annotate(day=TruncDate("created_at", tzinfo=dt_timezone.utc))
+        .values("project_id", "day")
+        .annotate(
+            count=Count("id"),
+            added=Sum("diff_stat__lines_added"),
+            removed=Sum("diff_stat__lines_removed"),
+        )
+    ):
+        day_rollup = rollup(row["project_id"], row["day"])
+        day_rollup.commits = row["count"]
+        day_rollup.lines_added = row["added"] or 0
+        day_rollup.lines_removed = row["removed"] or 0
+
+    with transaction.atomic():
+        # days left without activity lose their row
+        CodingActivityDailyRollup.objects.filter(
+            teammember=teammember, day__range=(first_day, last_day)
+        ).delete()
+        CodingActivityDailyRollup.objects.bulk_create(
+            rollups.values(), batch_size=BATCH_SIZE
+        )
+    return len(rollups)
+
+
+def expire_coding_activity_rows(teammember, before):
+    # Delete the MRs and commits of the teammember created before `before`, the notes and
+    # diff stats go with them. Daily rollups are kept for CODING_STATS_ROLLUP_RETENTION_DAYS
+    merge_requests, _ = GitLabMergeRequest.objects.filter(
+        teammember=teammember, created_at__lt=before
+    ).delete()
+    commits, _ = GitLabCommit.objects.filter(
+        teammember=teammember, created_at__lt=before
+    ).delete()
+    retention_days = getattr(settings, "CODING_STATS_ROLLUP_RETENTION_DAYS", 730)
+    rollups, _ = CodingActivityDailyRollup.objects.filter(
+        teammember=teammember,
+        day__lt=timezone.now().date() - timedelta(days=retention_days),
+    ).delete()
+    return merge_requests + commits + rollups
+
+
+# Rollup columns summed by the range queries
+ROLLUP_SUMS = (
+    "created_mrs",
+    "reviewed_mrs",
+    "merged_mrs",
+    "create_to_merge_seconds",
+    "comments",
+    "commits",
+    "lines_added",
+    "lines_removed",
+)
+
+# How the days of a range are grouped, with the start of the period of a day
+RANGE_GRANULARITIES = {
+    "day": (F("day"), lambda day: day),
+    "week": (TruncWeek("day"), lambda day: day - timedelta(days=day.weekday())),
+    "month": (TruncMonth("day"), lambda day: day.replace(day=1)),
+}
+
+
+def next_period(period, granularity):
+    if granularity == "day":
+        return period + timedelta(days=1)
+    if granularity == "week":
+        return period + timedelta(weeks=1)
+    return (period + timedelta(days=32)).replace(day=1)
+
+
+def range_counters(sums, days):
+    # Counters of summed rollup rows, create to merge is the average of the merged MRs
+    counters = {column: sums.get(column) or 0 for column in ROLLUP_SUMS}
+    seconds = counters.pop("create_to_merge_seconds")
+    counters["create_to_merge"] = (
+        seconds / counters["merged_mrs"] if counters["merged_mrs"] else 0
+    )
+    if days is not None:
+        counters["commits_frequency"] = round(counters["commits"] / days, 1)
+    return counters
+
+
+def coding_activity_range(teammember, start, end, granularity="day"):
+    # Totals and per period series of the days [start, end] read from the daily rollups,
+    # periods without activity are in the series with zero counters
+    rollups = CodingActivityDailyRollup.objects.filter(
+        teammember=teammember, day__range=(start, end)
+    )
+    sums = {column: Sum(column) for column in ROLLUP_SUMS}
+    days = (end - start).days + 1
+
+    aggregates = rollups.aggregate(
+        # projects where MRs were created or reviewed, like the coding stats counters
+        active_projects=Count(
+            "project_id",
+            distinct=True,
+            filter=Q(created_mrs__gt=0) | Q(reviewed_mrs__gt=0),
+        ),
+        **sums,
+    )
+    totals = range_counters(aggregates, days)
+    totals["active_projects"] = aggregates["active_projects"]
+
+    truncate, period_of = RANGE_GRANULARITIES[granularity]
+    periods = {
+        row["period"]: range_counters(row, None)
+        for row in rollups.annotate(period=truncate)
+        .values("period")
+        .annotate(**sums)
+        .order_by("period")
+    }
+    series = []
+    period = period_of(start)
+    while period <= end:
+        counters = periods.get(period) or range_counters({}, None)
+        series.append({"period": period.isoformat(), **counters})
+        period = next_period(period, granularity)
+
+    return {"totals": totals, "series": series}
@@ -4,6 +4,15 @@ from .models import (
     TeamMemberComment,
     TeamMemberGitIntegrationData,
     TeammemberCodingStats,
+    TeammemberCodingStatsBody,
+    CodingStatsJob,
+    GitLabProject,
+    GitLabMergeRequest,
+    GitLabMergeRequestNote,
+    GitLabCommit,
+    GitLabCommitDiffStat,
+    CodingActivityDailyRollup,
+    ProjectCodingStats,
 )
 
 # Register your models here.
@@ -12,3 +21,12 @@ admin.site.register(Teammember)
 admin.site.register(TeamMemberComment)
 admin.site.register(TeamMemberGitIntegrationData)
 admin.site.register(TeammemberCodingStats)
+admin.site.register(TeammemberCodingStatsBody)
+admin.site.register(CodingStatsJob)
+admin.site.register(GitLabProject)
+admin.site.register(GitLabMergeRequest)
+admin.site.register(GitLabMergeRequestNote)
+admin.site.register(GitLabCommit)
+admin.site.register(GitLabCommitDiffStat)
+admin.site.register(CodingActivityDailyRollup)
+admin.site.register(ProjectCodingStats)
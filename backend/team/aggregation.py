@@ -0,0 +1,338 @@
+from datetime import date as date_type, datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.utils import timezone
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, the plain python buckets are used without it
+    numpy = None
+
+# Days of activity kept in the buckets, the "previous30" window ends 60 days ago
+BUCKET_DAYS = 60
+
+# Columns of a day bucket
+CREATED_MRS = 0
+REVIEWED_MRS = 1
+MERGED_MRS = 2
+CREATE_TO_MERGE = 3  # sum of the create to merge times of the merged MRs
+COMMENTS = 4  # comments in created MRs
+COMMITS = 5
+LINES_ADDED = 6
+LINES_REMOVED = 7
+BUCKET_COLUMNS = 8
+
+# Windows as [start, end) day offsets, day 0 is today
+WINDOWS = {
+    "7": (0, 7),
+    "previous7": (7, 14),
+    "30": (0, 30),
+    "previous30": (30, 60),
+}
+
+# Days drawn in the charts
+CHART_DAYS = (7, 30)
+
+
+def parse_timestamp(value):
+    # MRs come as "...Z" and commits as "...+00:00", both are parsed to an aware datetime
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def day_offset(value, today):
+    # Number of days between today and the (UTC) day of the timestamp
+    return (today - parse_timestamp(value).astimezone(dt_timezone.utc).date()).days
+
+
+def day_offset_resolver(today):
+    # day_offset with a cache: the day of a UTC timestamp is its date prefix and the
+    # records of 60 days share 60 dates, only other time zones are parsed in full
+    offsets = {}
+
+    def resolve(value):
+        if value.endswith(("Z", "+00:00")):
+            date = value[:10]
+            offset = offsets.get(date)
+            if offset is None:
+                offset = offsets[date] = (today - date_type.fromisoformat(date)).days
+            return offset
+        return day_offset(value, today)
+
+    return resolve
+
+
+def activity_columns(projects, today):
+    # Walk the records of all the projects once, each timestamp is resolved exactly once.
+    # Returns for every bucket column the day indexes (project index * BUCKET_DAYS + day
+    # offset, offset 0 is today) and the values to add to the bucket of that day
+    columns = [([], []) for column in range(BUCKET_COLUMNS)]
+    created_days, created_values = columns[CREATED_MRS]
+    reviewed_days, reviewed_values = columns[REVIEWED_MRS]
+    merged_days, merged_values = columns[MERGED_MRS]
+    create_to_merge_days, create_to_merge_values = columns[CREATE_TO_MERGE]
+    comments_days, comments_values = columns[COMMENTS]
+    commits_days, commits_values = columns[COMMITS]
+    added_days, added_values = columns[LINES_ADDED]
+    removed_days, removed_values = columns[LINES_REMOVED]
+    day_offset_of = day_offset_resolver(today)
+
+    for project_index, (project, project_data) in enumerate(projects):
+        first_day = project_index * BUCKET_DAYS
+
+        for mr in project_data.get("created_mrs_data", []):
+            offset = day_offset_of(mr["created_at"])
+            if 0 <= offset < BUCKET_DAYS:
+                day = first_day + offset
+                created_days.append(day)
+                created_values.append(1)
+                comments_days.append(day)
+                comments_values.append(len(mr.get("comment_ids") or []))
+                if mr.get("create_to_merge") is not None:
+                    merged_days.append(day)
+                    merged_values.append(1)
+                    create_to_merge_days.append(day)
+                    create_to_merge_values.append(mr["create_to_merge"])
+
+        for mr in project_data.get("reviewed_mrs_data", []):
+            offset = day_offset_of(mr["created_at"])
+            if 0 <= offset < BUCKET_DAYS:
+                reviewed_days.append(first_day + offset)
+                reviewed_values.append(1)
+
+        for commit in project_data.get("created_commits_data", []):
+            offset = day_offset_of(commit["created_at"])
+            if 0 <= offset < BUCKET_DAYS:
+                day = first_day + offset
+                diff_data = commit.get("diff_data", [])
+                commits_days.append(day)
+                commits_values.append(1)
+                added_days.append(day)
+                added_values.append(sum(int(item["lines_added"]) for item in diff_data))
+                removed_days.append(day)
+                removed_values.append(
+                    sum(int(item["lines_removed"]) for item in diff_data)
+                )
+
+    return columns
+
+
+def window_totals(buckets, start, end):
+    # Column sums of the buckets of the days [start, end)
+    totals = [0] * BUCKET_COLUMNS
+    for bucket in buckets[start:end]:
+        for column, value in enumerate(bucket):
+            totals[column] += value
+    return totals
+
+
+def windows_totals(buckets):
+    return {
+        window: window_totals(buckets, start, end)
+        for window, (start, end) in WINDOWS.items()
+    }
+
+
+def python_activity(projects, today):
+    # Per project (buckets, {window: totals}) where buckets[offset][column] is the
+    # activity of a day, and the same for all the projects together
+    buckets = [
+        [[0] * BUCKET_COLUMNS for offset in range(BUCKET_DAYS)] for project in projects
+    ]
+    global_buckets = [[0] * BUCKET_COLUMNS for offset in range(BUCKET_DAYS)]
+    for column, (days, values) in enumerate(activity_columns(projects, today)):
+        for day, value in zip(days, values):
+            project_index, offset = divmod(day, BUCKET_DAYS)
+            buckets[project_index][offset][column] += value
+            global_buckets[offset][column] += value
+
+    activity = [
+        (project_buckets, windows_totals(project_buckets)) for project_buckets in buckets
+    ]
+    return activity, (global_buckets, windows_totals(global_buckets))
+
+
+def numpy_activity(projects, today):
+    # Same result as python_activity with the buckets of all the projects in one
+    # (projects, days, columns) array. Window totals are differences of a cumulative
+    # sum over the days and the global totals a sum over the projects axis
+    size = len(projects) * BUCKET_DAYS
+    activity = numpy.zeros((size, BUCKET_COLUMNS))
+    for column, (days, values) in enumerate(activity_columns(projects, today)):
+        activity[:, column] = numpy.bincount(
+            numpy.asarray(days, dtype=numpy.int64),
+            weights=numpy.asarray(values, dtype=numpy.float64),
+            minlength=size,
+        )
+    activity = activity.reshape(len(projects), BUCKET_DAYS, BUCKET_COLUMNS)
+
+    cumulative = numpy.zeros((len(projects), BUCKET_DAYS + 1, BUCKET_COLUMNS))
+    numpy.cumsum(activity, axis=1, out=cumulative[:, 1:])
+    totals = {
+        window: cumulative[:, end] - cumulative[:, start]
+        for window, (start, end) in WINDOWS.items()
+    }
+
+    # charts only need the last days of every project
+    chart_buckets = activity[:, : max(CHART_DAYS)].tolist()
+    project_totals = {window: array.tolist() for window, array in totals.items()}
+    project_activity = [
+        (
+            chart_buckets[project_index],
+            {
+                window: whole_totals(rows[project_index])
+                for window, rows in project_totals.items()
+            },
+        )
+        for project_index in range(len(projects))
+    ]
+    global_totals = {
+        window: whole_totals(array.sum(axis=0).tolist())
+        for window, array in totals.items()
+    }
+    return project_activity, (activity.sum(axis=0).tolist(), global_totals)
+
+
+def whole_totals(totals):
+    # numpy sums are floats, only the create to merge sum is not a whole number
+    return [
+        value if column == CREATE_TO_MERGE else int(value)
+        for column, value in enumerate(totals)
+    ]
+
+
+def use_numpy(project_count):
+    config = getattr(settings, "CODING_STATS_NUMPY", {})
+    return (
+        numpy is not None
+        and config.get("ENABLED", True)
+        and project_count >= config.get("MIN_PROJECTS", 20)
+    )
+
+
+def chart_series(buckets, column, days, sign=1):
+    # Values of the last `days` days, oldest first like the chart x axis
+    return [
+        sign * int(buckets[offset][column]) for offset in range(days - 1, -1, -1)
+    ]
+
+
+def chart_axis(today, days):
+    return [
+        (today - timedelta(days=offset)).strftime("%Y-%m-%d")
+        for offset in range(days - 1, -1, -1)
+    ]
+
+
+def create_to_merge(totals):
+    if not totals[MERGED_MRS]:
+        return 0
+    return totals[CREATE_TO_MERGE] / totals[MERGED_MRS]
+
+
+def window_counters(totals, window, active_projects):
+    # Counters of a window keyed the way the frontend reads them,
+    # "previous" windows get the previous_ prefix on every key
+    days = WINDOWS[window][1] - WINDOWS[window][0]
+    prefix = "previous_" if window.startswith("previous") else ""
+    return {
+        f"{prefix}active_projects{days}": active_projects,
+        f"{prefix}created_mrs_counter{days}": totals[CREATED_MRS],
+        f"{prefix}reviewed_mrs_counter{days}": totals[REVIEWED_MRS],
+        f"{prefix}create_to_merge{days}": create_to_merge(totals),
+        f"{prefix}comments_in_created_mrs{days}": totals[COMMENTS],
+        f"{prefix}created_commits{days}": totals[COMMITS],
+        f"{prefix}lines_added{days}": totals[LINES_ADDED],
+        f"{prefix}lines_removed{days}": totals[LINES_REMOVED],
+    }
+
+
+def is_active(totals):
+    # a project is active in a window when MRs were created or reviewed in it
+    return totals[CREATED_MRS] > 0 or totals[REVIEWED_MRS] > 0
+
+
+def chart_counters(buckets, days):
+    return {
+        f"mrs_created_last_{days}_days_yAxis": chart_series(buckets, CREATED_MRS, days),
+        f"mrs_reviewed_last_{days}_days_yAxis": chart_series(
+            buckets, REVIEWED_MRS, days
+        ),
+        f"commits_added_lines_last_{days}_days_yAxis": chart_series(
+            buckets, LINES_ADDED, days
+        ),
+        # removed lines are drawn below the axis
+        f"commits_removed_lines_last_{days}_days_yAxis": chart_series(
+            buckets, LINES_REMOVED, days, sign=-1
+        ),
+    }
+
+
+def aggregate_coding_stats(body, today=None):
+    # Recompute the per project counters (stored in the body) and the global counters.
+    # Every record is parsed once into day buckets, all the windows and charts are
+    # then read from the buckets instead of walking the records again per window.
+    # With numpy installed, bodies with many projects use the vectorized buckets
+    if today is None:
+        today = timezone.now().date()
+
+    projects = list(body.items())
+    if use_numpy(len(projects)):
+        activity, (global_buckets, global_totals) = numpy_activity(projects, today)
+    else:
+        activity, (global_buckets, global_totals) = python_activity(projects, today)
+
+    xAxes = {days: chart_axis(today, days) for days in CHART_DAYS}
+    active_projects = {window: 0 for window in WINDOWS}
+    active_projects_lists = {"7": [], "30": []}
+
+    for (project, project_data), (buckets, totals_by_window) in zip(
+        projects, activity
+    ):
+        counters = {}
+        for window, totals in totals_by_window.items():
+            active = int(is_active(totals))
+            active_projects[window] += active
+            counters[window] = window_counters(totals, window, active)
+
+            # the active projects lists only name the projects with created MRs
+            if window in active_projects_lists and totals[CREATED_MRS]:
+                active_projects_lists[window].append(
+                    {
+                        project: {
+                            "project_name": project_data.get("project_name"),
+                            "project_url": project_data.get("project_url"),
+                        }
+                    }
+                )
+
+        for days in CHART_DAYS:
+            counters[str(days)][f"charts_last_{days}_days_xAxis"] = xAxes[days]
+            counters[str(days)].update(chart_counters(buckets, days))
+
+        project_data["counters7"] = counters["7"]
+        project_data["counters30"] = counters["30"]
+        project_data["previous7"] = counters["previous7"]
+        project_data["previous30"] = counters["previous30"]
+
+    global_counters = {}
+    for window, (start, end) in WINDOWS.items():
+        days = end - start
+        prefix = "previous_" if window.startswith("previous") else ""
+        totals = global_totals[window]
+        counters = window_counters(totals, window, active_projects[window])
+        counters[f"{prefix}commits_frequency{days}"] = round(totals[COMMITS] / days, 1)
+        global_counters[window] = counters
+
+    for days in CHART_DAYS:
+        counters = global_counters[str(days)]
+        counters[f"active_projects{days}_list"] = active_projects_lists[str(days)]
+        counters[f"mrs_created_last_{days}_days_xAxis"] = xAxes[days]
+        counters[f"mrs_reviewed_last_{days}_days_xAxis"] = xAxes[days]
+        counters.update(chart_counters(global_buckets, days))
+
+    return {
+        "body": body,
+        "counters7": global_counters["7"],
+        "counters30": global_counters["30"],
+        "previous7": global_counters["previous7"],
+        "previous30": global_counters["previous30"],
+    }
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class TeamConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'team'
+
+    def ready(self):
+        from core.metrics import registry
+        from .metrics import gitlab_gauges
+
+        registry.register_collector(gitlab_gauges)
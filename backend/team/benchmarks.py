@@ -0,0 +1,308 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import transaction
+from django.utils import timezone
+from dashboard.models import Project
+from users.models import CustomUser
+from .activity_store import store_coding_activity
+from .aggregation import aggregate_coding_stats, numpy, parse_timestamp, use_numpy
+from .coding_stats import (
+    CODING_STATS_WINDOW_DAYS,
+    apply_coding_activity,
+    first_full_day,
+    structure_coding_activity,
+)
+from .gitlab_standin import generate_synthetic_fixtures
+from .models import Teammember, TeammemberCodingStats, TeammemberCodingStatsBody
+from .utils import diff_content_retention, parse_commit_diff
+
+# Benchmark of the coding stats pipeline on synthetic GitLab payloads. Every stage of
+# the create job (structuring, aggregation, persistence) and the incremental update is
+# timed separately, the results are a JSON serializable dict so runs can be compared.
+
+
+def fixtures_api_data(fixtures, user_id, with_content=None):
+    # The results the gitlab_* helpers of utils.py return for the fixtures, in the
+    # order fetch_coding_activity passes them to structure_coding_activity
+    if with_content is None:
+        with_content = diff_content_retention() != "counts"
+    created_mrs_data = {}
+    reviewed_mrs_data = {}
+    for mr in fixtures["merge_requests"]:
+        record = {
+            "project_id": mr["project_id"],
+            "iid": mr["iid"],
+            "created_at": mr["created_at"],
+            "merged_at": mr.get("merged_at"),
+        }
+        if mr["author"]["id"] == user_id:
+            if mr.get("merged_at"):
+                record["create_to_merge"] = round(
+                    (
+                        parse_timestamp(mr["merged_at"])
+                        - parse_timestamp(mr["created_at"])
+                    ).total_seconds(),
+                    0,
+                )
+            created_mrs_data[mr["id"]] = record
+        if any(reviewer["id"] == user_id for reviewer in mr["reviewers"]):
+            reviewed_mrs_data[mr["id"]] = record
+
+    project_ids = {
+        mr["project_id"]
+        for mrs_data in (created_mrs_data, reviewed_mrs_data)
+        for mr in mrs_data.values()
+    }
+    commits_created_data = {}
+    commits_diffs_data = {}
+    for project_id, commits in fixtures["commits"].items():
+        for commit in commits:
+            if commit["author_id"] != user_id:
+                continue
+            project_ids.add(int(project_id))
+            commits_created_data.setdefault(int(project_id), []).append(
+                {
+                    "commit_short_id": commit["short_id"],
+                    "created_at": commit["created_at"],
+                    "commit_web_url": commit["web_url"],
+                }
+            )
+            # line counts come with the listing unless the line content is kept
+            if with_content:
+                diff_data = parse_commit_diff(
+                    fixtures["diffs"][f"{project_id}:{commit['short_id']}"]
+                )
+            else:
+                diff_data = {
+                    "lines_added": commit["stats"]["additions"],
+                    "lines_removed": commit["stats"]["deletions"],
+                    "added_lines_content": [],
+                    "removed_lines_content": [],
+                }
+            commits_diffs_data.setdefault(int(project_id), []).append(
+                {"commit_short_id": commit["short_id"], "diff_data": diff_data}
+            )
+
+    mrs_projects_data = {
+        project_id: {
+            "project_name": fixtures["projects"][str(project_id)]["name"],
+            "project_url": fixtures["projects"][str(project_id)]["web_url"],
+        }
+        for project_id in project_ids
+    }
+
+    mrs_comments_data = {}
+    for mr in fixtures["merge_requests"]:
+        if mr["id"] in created_mrs_data or mr["id"] in reviewed_mrs_data:
+            notes = fixtures["notes"].get(f"{mr['project_id']}:{mr['iid']}", [])
+            mrs_comments_data[mr["id"]] = {
+                "comment_ids": [note["id"] for note in notes],
+                "comment_bodies": [note["body"] for note in notes],
+            }
+
+    return (
+        created_mrs_data,
+        reviewed_mrs_data,
+        mrs_projects_data,
+        commits_created_data,
+        commits_diffs_data,
+        mrs_comments_data,
+    )
+
+
+# Record lists of a project of the body
+BODY_RECORDS = ("created_mrs_data", "reviewed_mrs_data", "created_commits_data")
+
+
+def body_records(body):
+    return sum(
+        len(project_data[records_name])
+        for project_data in body.values()
+        for records_name in BODY_RECORDS
+    )
+
+
+def split_recent_activity(body, days):
+    # (older, recent) records of the body, recent are those of the last `days` days:
+    # the activity an incremental update brings in on top of the stored older records
+    since = (timezone.now() - timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%S")
+    older = {}
+    recent = {}
+    for project_id, project_data in body.items():
+        for part in (older, recent):
+            part[project_id] = {
+                "project_name": project_data["project_name"],
+                "project_url": project_data["project_url"],
+                **{records_name: [] for records_name in BODY_RECORDS},
+            }
+        for records_name in BODY_RECORDS:
+            for record in project_data[records_name]:
+                part = recent if record["created_at"] > since else older
+                part[project_id][records_name].append(dict(record))
+    return tuple(
+        {
+            project_id: project_data
+            for project_id, project_data in part.items()
+            if any(project_data[records_name] for records_name in BODY_RECORDS)
+        }
+        for part in (older, recent)
+    )
+
+
+def api_data_records(api_data):
+    # MRs and commits handed to structure_coding_activity
+    created_mrs_data, reviewed_mrs_data, _, commits_created_data = api_data[:4]
+    return (
+        len(created_mrs_data)
+        + len(reviewed_mrs_data)
+        + sum(len(commits) for commits in commits_created_data.values())
+    )
+
+
+class StageTimer:
+    # Wall time and (with trace_memory) the peak of memory allocated by each stage
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    def run(self, name, records, function, *args, **kwargs):
+        if self.trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - started
+            peak = None
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            self.stages.setdefault(name, []).append(
+                {"seconds": seconds, "records": records, "peak_memory_bytes": peak}
+            )
+
+
+def stage_summary(runs):
+    seconds = statistics.median(run["seconds"] for run in runs)
+    records = runs[0]["records"]
+    peaks = [run["peak_memory_bytes"] for run in runs if run["peak_memory_bytes"]]
+    return {
+        "seconds": round(seconds, 6),
+        "runs": [round(run["seconds"], 6) for run in runs],
+        "records": records,
+        "records_per_second": round(records / seconds, 1) if seconds else None,
+        "peak_memory_bytes": max(peaks) if peaks else None,
+    }
+
+
+def run_coding_stats_benchmark(
+    seed=0,
+    projects=200,
+    merge_requests=10000,
+    commits=100000,
+    notes_per_mr=3,
+    update_days=1,
+    repeat=1,
+    trace_memory=True,
+):
+    # Generate the fixtures once, then time the stages `repeat` times. Everything
+    # written to the database is rolled back at the end of each run. The benchmarked
+    # user authors every MR and commit so the body has the requested sizes
+    user_id = 1
+    generation_started = time.perf_counter()
+    fixtures = generate_synthetic_fixtures(
+        seed=seed,
+        user_ids=[user_id],
+        projects=projects,
+        merge_requests=merge_requests,
+        commits=commits,
+        notes_per_mr=notes_per_mr,
+        days=CODING_STATS_WINDOW_DAYS,
+        authors=[user_id],
+    )
+    generation_seconds = time.perf_counter() - generation_started
+
+    timer = StageTimer(trace_memory=trace_memory)
+    for run in range(repeat):
+        with transaction.atomic():
+            user = CustomUser.objects.create(
+                username=f"coding-stats-benchmark-{run}",
+                email=f"coding-stats-benchmark-{run}@example.com",
+            )
+            project = Project.objects.create(
+                project_owner=user, project_name="benchmark"
+            )
+            teammember = Teammember.objects.create(
+                created_by=user,
+                project=project,
+                tm_name="Benchmark",
+                tm_lname="Teammember",
+                tm_position="be_dev",
+            )
+
+            # from the GitLab helper results (MRs and commits) to the body, the helper
+            # results are built from the fixtures before the stage is timed
+            api_data = fixtures_api_data(fixtures, user_id)
+            body = timer.run(
+                "structuring",
+                api_data_records(api_data),
+                structure_coding_activity,
+                *api_data,
+            )
+
+            # the last update_days of activity are left for the incremental update
+            createBody, updateBody = split_recent_activity(body, update_days)
+            records = body_records(createBody)
+            stats_fields = timer.run(
+                "aggregation", records, aggregate_coding_stats, createBody
+            )
+
+            def persist():
+                store_coding_activity(
+                    teammember, createBody, first_full_day=first_full_day()
+                )
+                return TeammemberCodingStats.objects.create(
+                    teammember=teammember, latestUpdate=timezone.now(), **stats_fields
+                )
+
+            coding_stats = timer.run("persistence", records, persist)
+
+            timer.run(
+                "update",
+                body_records(updateBody),
+                apply_coding_activity,
+                coding_stats,
+                updateBody,
+            )
+            transaction.set_rollback(True)
+
+    storedBody = TeammemberCodingStatsBody.dump(body)
+    return {
+        "created_at": datetime.now(dt_timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": numpy.__version__ if numpy is not None else None,
+        "numpy_aggregation": use_numpy(len(body)),
+        "parameters": {
+            "seed": seed,
+            "projects": projects,
+            "merge_requests": merge_requests,
+            "commits": commits,
+            "notes_per_mr": notes_per_mr,
+            "update_days": update_days,
+            "repeat": repeat,
+            "trace_memory": trace_memory,
+            "diff_content_retention": diff_content_retention(),
+        },
+        "generation_seconds": round(generation_seconds, 6),
+        "body": {
+            "projects": len(body),
+            "records": body_records(body),
+            "json_bytes": len(json.dumps(body, separators=(",", ":"))),
+            "stored_bytes": len(storedBody["data"]),
+        },
+        "stages": {name: stage_summary(runs) for name, runs in timer.stages.items()},
+    }
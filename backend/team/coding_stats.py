@@ -0,0 +1,420 @@
+from datetime import datetime, timedelta
+from django.db import transaction
+from django.forms.models import model_to_dict
+from django.utils import timezone
+from .activity_store import expire_coding_activity_rows, store_coding_activity
+from .aggregation import aggregate_coding_stats
+from .timing import timed_stage
+from .models import TeamMemberGitIntegrationData, TeammemberCodingStats
+from .utils import (
+    gitlab_verification_api_call,
+    gitlab_merge_requests_api_call,
+    gitlab_project_api_call,
+    gitlab_commits_created_api_call,
+    gitlab_commits_diff_api_call,
+    gitlab_mrs_comments_api_call,
+)
+
+# The body keeps the records of this many days, the "previous30" counters need all of them
+CODING_STATS_WINDOW_DAYS = 60
+
+
+class CodingStatsError(Exception):
+    # Raised when coding stats can not be computed, the message is shown to the user
+    pass
+
+
+def check_gitlab_result(result):
+    # The GitLab helpers return an error string or {"success": False, ...} on failure
+    if isinstance(result, str):
+        raise CodingStatsError(result)
+    if isinstance(result, dict) and result.get("success") is False:
+        raise CodingStatsError(result.get("message"))
+
+
+def report_progress(progress, stage, percent):
+    if progress is not None:
+        progress(stage, percent)
+
+
+def iso_days_ago(days):
+    # Same "%Y-%m-%dT%H:%M:%SZ" format GitLab expects and the records are compared with
+    return (datetime.today() - timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def window_start():
+    return timezone.now() - timedelta(days=CODING_STATS_WINDOW_DAYS)
+
+
+def first_full_day():
+    # first (UTC) day entirely inside the fetched window
+    return window_start().date() + timedelta(days=1)
+
+
+def get_git_integration_data(teammember):
+    gitIntegrationData = TeamMemberGitIntegrationData.objects.filter(
+        teammember=teammember
+    ).first()
+    if not gitIntegrationData:
+        raise CodingStatsError(
+            "Git integration data not found for the specified team member."
+        )
+    return gitIntegrationData
+
+
+def fetch_coding_activity(
+    gitIntegrationData,
+    data_limitation_iso_format,
+    progress=None,
+    projects_list=(),
+    dateFilter="created_after",
+):
+    # Fetch the GitLab activity since data_limitation_iso_format and structure it per project:
+    # {project_id: {project_name, project_url, created_mrs_data, reviewed_mrs_data, created_commits_data}}
+    # Commits are looked up in the projects of the fetched MRs and in projects_list
+    apiCallsInput = {
+        "groupID": gitIntegrationData.teammemberGitGroupID,
+        "userID": gitIntegrationData.teammemberGitUserID,
+        "accessToken": gitIntegrationData.teammemberGitPersonalAccessToken,
+        "data_limitation": data_limitation_iso_format,
+        "dateFilter": dateFilter,
+    }
+
+    # Make created mrs api call with gitlab_merge_requests_api_call
+    apiCallsInput["requestType"] = "author_id"
+    with timed_stage("created_mrs"):
+        created_mrs_data = gitlab_merge_requests_api_call(apiCallsInput)
+    check_gitlab_result(created_mrs_data)
+    report_progress(progress, "created_mrs", 10)
+
+    # Make reviewed mrs api call with gitlab_merge_requests_api_call
+    apiCallsInput["requestType"] = "reviewer_id"
+    with timed_stage("reviewed_mrs"):
+        reviewed_mrs_data = gitlab_merge_requests_api_call(apiCallsInput)
+    check_gitlab_result(reviewed_mrs_data)
+    report_progress(progress, "reviewed_mrs", 20)
+    del apiCallsInput["requestType"]
+
+    # Make projects api call with gitlab_project_api_call
+    merged_project_ids = set(int(project_id) for project_id in projects_list)
+    for mr_id, mr_info in created_mrs_data.items():
+        project_id = mr_info.get("project_id")
+        if project_id:
+            merged_project_ids.add(project_id)  # Add to the set to avoid duplicates
+    for mr_id, mr_info in reviewed_mrs_data.items():
+        project_id = mr_info.get("project_id")
+        if project_id:
+            merged_project_ids.add(project_id)  # Add to the set to avoid duplicates
+
+    # Convert the set to a list and add it to api calls input
+    apiCallsInput["projects_list"] = list(merged_project_ids)
+
+    # Make Project api call
+    with timed_stage("projects"):
+        mrs_projects_data = gitlab_project_api_call(apiCallsInput)
+    check_gitlab_result(mrs_projects_data)
+    report_progress(progress, "projects", 30)
+
+    # Make commits created api call with gitlab_commits_created_api_call
+    with timed_stage("commits"):
+        commits_created_data = gitlab_commits_created_api_call(apiCallsInput)
+    check_gitlab_result(commits_created_data)
+    report_progress(progress, "commits", 45)
+    del apiCallsInput["projects_list"]
+
+    # Make commits difference api call with gitlab_commits_diff_api_call
+    apiCallsInput["commits_list"] = commits_created_data
+    with timed_stage("commit_diffs"):
+        commits_diffs_data = gitlab_commits_diff_api_call(apiCallsInput)
+    check_gitlab_result(commits_diffs_data)
+    report_progress(progress, "commit_diffs", 65)
+    del apiCallsInput["commits_list"]
+
+    # Fetch MRs comments api call with gitlab_mrs_comments_api_call
+    # Combine both dictionaries
+    combined_mrs_data = created_mrs_data.copy()  # Start with created_mrs_data
+    combined_mrs_data.update(reviewed_mrs_data)  # Merge in reviewed_mrs_data
+    apiCallsInput["mrs_data"] = combined_mrs_data
+    with timed_stage("mr_notes"):
+        mrs_comments_data = gitlab_mrs_comments_api_call(apiCallsInput)
+    check_gitlab_result(mrs_comments_data)
+    report_progress(progress, "mr_notes", 80)
+
+    with timed_stage("structuring"):
+        return structure_coding_activity(
+            created_mrs_data,
+            reviewed_mrs_data,
+            mrs_projects_data,
+            commits_created_data,
+            commits_diffs_data,
+            mrs_comments_data,
+        )
+
+
+def structure_coding_activity(
+    created_mrs_data,
+    reviewed_mrs_data,
+    mrs_projects_data,
+    commits_created_data,
+    commits_diffs_data,
+    mrs_comments_data,
+):
+    # Build the body from the results of the gitlab_* helpers of utils.py
+    body = {}
+
+    # Structure the data in a reasonable way
+    # Adding the project data to the body and initializing the groups of data to be provided later.
+    # Project ids are strings, the way they come back from the JSON field
+    for project_id, project_data in mrs_projects_data.items():
+        body[str(project_id)] = {
+            "project_name": project_data["project_name"],
+            "project_url": project_data["project_url"],
+            "created_mrs_data": [],
+            "reviewed_mrs_data": [],
+            "created_commits_data": [],
+        }
+
+    for mr_id, mr_data in created_mrs_data.items():
+        comment_data = mrs_comments_data.get(mr_id, {})
+        body[str(mr_data["project_id"])]["created_mrs_data"].append(
+            {
+                "mr_id": mr_id,
+                "iid": mr_data["iid"],
+                "created_at": mr_data["created_at"],
+                "merged_at": mr_data["merged_at"],
+                # only merged MRs have a create to merge time
+                "create_to_merge": mr_data.get("create_to_merge"),
+                "comment_ids": comment_data.get("comment_ids") or False,
+                "comment_bodies": comment_data.get("comment_bodies") or False,
+            }
+        )
+
+    for mr_id, mr_data in reviewed_mrs_data.items():
+        # comments of MRs that are both created and reviewed are kept on the created one
+        comment_data = {}
+        if mr_id not in created_mrs_data:
+            comment_data = mrs_comments_data.get(mr_id, {})
+        body[str(mr_data["project_id"])]["reviewed_mrs_data"].append(
+            {
+                "mr_id": mr_id,
+                "iid": mr_data["iid"],
+                "created_at": mr_data["created_at"],
+                "merged_at": mr_data["merged_at"],
+                "comment_ids": comment_data.get("comment_ids") or False,
+                "comment_bodies": comment_data.get("comment_bodies") or False,
+            }
+        )
+
+    # Add the Commit data to the 'created_commits_data' list for that project with its diff data
+    diffs_by_commit = {}
+    for project_id, commit_comments_data_list in commits_diffs_data.items():
+        for commit_comments_data in commit_comments_data_list:
+            diff_data = commit_comments_data["diff_data"]
+            diffs_by_commit.setdefault(
+                (str(project_id), commit_comments_data["commit_short_id"]), []
+            ).append(
+                {
+                    "lines_added": diff_data["lines_added"],
+                    "lines_removed": diff_data["lines_removed"],
+                    "added_lines_content": diff_data["added_lines_content"],
+                    "removed_lines_content": diff_data["removed_lines_content"],
+                }
+            )
+
+    for project_id, commit_data_list in commits_created_data.items():
+        project_id = str(project_id)
+        for commit_data in commit_data_list:
+            body[project_id]["created_commits_data"].append(
+                {
+                    "commit_short_id": commit_data["commit_short_id"],
+                    "created_at": commit_data["created_at"],
+                    "commit_web_url": commit_data["commit_web_url"],
+                    "diff_data": diffs_by_commit.get(
+                        (project_id, commit_data["commit_short_id"]), []
+                    ),
+                }
+            )
+
+    return body
+
+
+def merge_coding_activity(body, updateBody, keep_comments=False):
+    # Merge freshly fetched records into the stored body.
+    # Records are identified by mr_id / commit_short_id, a fetched record replaces the
+    # stored one (an MR may have been merged or commented on since), newest first.
+    # With keep_comments the comments of a replaced MR are added to the fetched ones,
+    # for records that only carry their new comments (webhook events)
+    record_keys = {
+        "created_mrs_data": "mr_id",
+        "reviewed_mrs_data": "mr_id",
+        "created_commits_data": "commit_short_id",
+    }
+    for project_id, project_data in updateBody.items():
+        project_id = str(project_id)
+        stored = body.setdefault(
+            project_id,
+            {"created_mrs_data": [], "reviewed_mrs_data": [], "created_commits_data": []},
+        )
+        stored["project_name"] = project_data["project_name"]
+        stored["project_url"] = project_data["project_url"]
+
+        for records_name, key in record_keys.items():
+            records = {
+                str(record[key]): record for record in stored.get(records_name, [])
+            }
+            for record in project_data[records_name]:
+                if keep_comments and str(record[key]) in records:
+                    record = merge_comments(records[str(record[key])], record)
+                records[str(record[key])] = record
+            stored[records_name] = sorted(
+                records.values(), key=lambda record: record["created_at"], reverse=True
+            )
+    return body
+
+
+def record_comments(record):
+    comment_ids = record.get("comment_ids") or []
+    comment_bodies = record.get("comment_bodies") or [""] * len(comment_ids)
+    return dict(zip(comment_ids, comment_bodies))
+
+
+def merge_comments(stored, record):
+    # the record with the comments of the stored one it does not have yet
+    comments = {**record_comments(stored), **record_comments(record)}
+    return {
+        **record,
+        "comment_ids": list(comments) or False,
+        "comment_bodies": list(comments.values()) or False,
+    }
+
+
+def expire_coding_activity(body, data_limitation_iso_format):
+    # Drop the records created before data_limitation_iso_format and the projects left empty
+    for project_id in list(body.keys()):
+        project_data = body[project_id]
+        for records_name in (
+            "created_mrs_data",
+            "reviewed_mrs_data",
+            "created_commits_data",
+        ):
+            project_data[records_name] = [
+                record
+                for record in project_data.get(records_name, [])
+                if record["created_at"] > data_limitation_iso_format
+            ]
+        if not (
+            project_data["created_mrs_data"]
+            or project_data["reviewed_mrs_data"]
+            or project_data["created_commits_data"]
+        ):
+            del body[project_id]
+    return body
+
+
+def build_coding_stats(teammember, progress=None):
+    # Fetch the last 60 days of GitLab activity of the teammember and aggregate it
+    # into the body and counters stored in TeammemberCodingStats
+    gitIntegrationData = get_git_integration_data(teammember)
+    body = fetch_coding_activity(
+        gitIntegrationData, iso_days_ago(CODING_STATS_WINDOW_DAYS), progress=progress
+    )
+    with timed_stage("store"):
+        store_coding_activity(teammember, body, first_full_day=first_full_day())
+        expire_coding_activity_rows(teammember, window_start())
+    report_progress(progress, "aggregation", 90)
+    with timed_stage("aggregation"):
+        return aggregate_coding_stats(body)
+
+
+def update_coding_stats(teammemberCodingStats, progress=None):
+    # Fetch the GitLab activity since the latest update, merge it into the stored body,
+    # drop what fell out of the 60 days window and recompute all the counters
+    teammember = teammemberCodingStats.teammember
+
+    # Verify Git integration data
+    gitIntegrationData = get_git_integration_data(teammember)
+    git_integration_dict = model_to_dict(gitIntegrationData)
+    with timed_stage("verification"):
+        integration_status = gitlab_verification_api_call(git_integration_dict)
+
+    if integration_status is False:
+        # integration got broken so change it's status in the teammember model
+        teammember.teammember_hasGitIntegration = False
+        teammember.save()
+
+        raise CodingStatsError("Git integration verification failed.")
+
+    if not teammemberCodingStats.has_stored_body:
+        return rebuild_coding_stats(teammemberCodingStats, progress=progress)
+
+    # activity happening while fetching is picked up again by the next update
+    fetchStarted = timezone.now()
+    data_limitation_iso_format = teammemberCodingStats.latestUpdate.strftime(
+        "%Y-%m-%dT%H:%M:%SZ"
+    )
+
+    # MRs updated since the latest update also bring in the ones merged or commented on
+    updateBody = fetch_coding_activity(
+        gitIntegrationData,
+        data_limitation_iso_format,
+        progress=progress,
+        projects_list=list(teammemberCodingStats.body.keys()),
+        dateFilter="updated_after",
+    )
+    report_progress(progress, "aggregation", 90)
+
+    return apply_coding_activity(
+        teammemberCodingStats, updateBody, latestUpdate=fetchStarted
+    )
+
+
+def rebuild_coding_stats(teammemberCodingStats, progress=None):
+    # Stats saved before the body got its own table have no stored body, merging the
+    # latest activity into an empty body would wipe their counters. The whole window
+    # is fetched again instead, like for new stats
+    fetchStarted = timezone.now()
+    stats_fields = build_coding_stats(
+        teammemberCodingStats.teammember, progress=progress
+    )
+    for field, value in stats_fields.items():
+        setattr(teammemberCodingStats, field, value)
+    teammemberCodingStats.latestUpdate = fetchStarted
+    with timed_stage("save"):
+        teammemberCodingStats.save()
+    return teammemberCodingStats
+
+
+def apply_coding_activity(
+    teammemberCodingStats, updateBody, latestUpdate=None, keep_comments=False
+):
+    # Write fetched records to the activity tables, merge them into the stored body and
+    # recompute all the counters. latestUpdate is only moved when it is given
+    teammember = teammemberCodingStats.teammember
+
+    with transaction.atomic():
+        # lock the row so two updates can not merge into the same body concurrently
+        teammemberCodingStats = TeammemberCodingStats.objects.select_for_update().get(
+            pk=teammemberCodingStats.pk
+        )
+        # only the fetched records are written to the activity tables
+        with timed_stage("store"):
+            store_coding_activity(
+                teammember, updateBody, first_full_day=first_full_day()
+            )
+            expire_coding_activity_rows(teammember, window_start())
+        with timed_stage("merge"):
+            body = merge_coding_activity(
+                teammemberCodingStats.body, updateBody, keep_comments=keep_comments
+            )
+            body = expire_coding_activity(body, iso_days_ago(CODING_STATS_WINDOW_DAYS))
+        with timed_stage("aggregation"):
+            stats_fields = aggregate_coding_stats(body)
+
+        for field, value in stats_fields.items():
+            setattr(teammemberCodingStats, field, value)
+        if latestUpdate is not None:
+            teammemberCodingStats.latestUpdate = latestUpdate
+        with timed_stage("save"):
+            teammemberCodingStats.save()
+
+    return teammemberCodingStats
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import zlib
+from django.conf import settings
+
+
+class CommitDiffCache:
+    # Persistent content-addressed cache for commit diffs.
+    # A diff never changes for a given (project_id, sha) so entries never expire,
+    # they are only evicted (least recently used first) when the cache grows over max_bytes
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = None  # computed lazily on first write
+        self._lock = threading.Lock()
+
+    def _path(self, project_id, sha):
+        key = hashlib.sha256(f"{project_id}:{sha}".encode()).hexdigest()
+        return os.path.join(self.directory, key[:2], f"{key}.json.z")
+
+    def get(self, project_id, sha):
+        path = self._path(project_id, sha)
+        try:
+            with open(path, "rb") as cache_file:
+                diff = json.loads(zlib.decompress(cache_file.read()))
+            # refresh the modification time so that LRU eviction keeps this entry
+            os.utime(path)
+        except (OSError, ValueError, zlib.error):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return diff
+
+    def set(self, project_id, sha, diff):
+        path = self._path(project_id, sha)
+        payload = zlib.compress(json.dumps(diff).encode())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # write to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(payload)
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_size()
+            else:
+                self._size += len(payload) - previous_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json.z"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def _disk_size(self):
+        return sum(size for mtime, size, path in self._entries())
+
+    def _evict(self):
+        # drop the least recently used entries until the cache is at 90% of its limit
+        target = self.max_bytes * 0.9
+        for mtime, size, path in sorted(self._entries()):
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._size -= size
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_size()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_commit_diff_cache = None
+_commit_diff_cache_lock = threading.Lock()
+
+
+def get_commit_diff_cache():
+    # Lazily build the process wide cache from settings.GITLAB_DIFF_CACHE,
+    # returns None when the cache is disabled
+    global _commit_diff_cache
+    config = getattr(settings, "GITLAB_DIFF_CACHE", {})
+    if not config.get("ENABLED", False):
+        return None
+    if _commit_diff_cache is None:
+        with _commit_diff_cache_lock:
+            if _commit_diff_cache is None:
+                _commit_diff_cache = CommitDiffCache(
+                    config["DIR"],
+                    max_bytes=config.get("MAX_BYTES", 256 * 1024 * 1024),
+                )
+    return _commit_diff_cache
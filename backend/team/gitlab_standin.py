@@ -0,0 +1,491 @@
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+# Offline stand-in for the part of the GitLab REST API used by team/utils.py.
+# It serves merge_requests, projects, commits, commit diffs, MR notes and group
+# members from a fixtures dict that is either recorded from a real GitLab
+# (record_fixtures) or generated (generate_synthetic_fixtures), with configurable
+# latency, pagination and rate limit headers.
+#
+# Fixtures format:
+# {
+#     "groups": {"<group_id>": [member, ...]},
+#     "merge_requests": [merge request, ...],
+#     "projects": {"<project_id>": project},
+#     "commits": {"<project_id>": [commit, ...]},
+#     "diffs": {"<project_id>:<commit short_id>": [file diff, ...]},
+#     "notes": {"<project_id>:<merge request iid>": [note, ...]},
+# }
+
+
+def _mr_timestamp(value):
+    # merge requests and notes use "2024-01-31T10:20:30.123Z"
+    return value.strftime("%Y-%m-%dT%H:%M:%S.") + f"{value.microsecond // 1000:03d}Z"
+
+
+def _commit_timestamp(value):
+    # commits use "2024-01-31T10:20:30.000+00:00"
+    return value.strftime("%Y-%m-%dT%H:%M:%S.") + f"{value.microsecond // 1000:03d}+00:00"
+
+
+def _parse_timestamp(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def generate_synthetic_fixtures(
+    seed=0,
+    user_ids=(1,),
+    group_id=1,
+    projects=10,
+    merge_requests=100,
+    commits=500,
+    notes_per_mr=3,
+    diff_files=3,
+    diff_lines=20,
+    days=60,
+    now=None,
+    authors=None,
+):
+    # Seeded generator, the same arguments always produce the same fixtures. MRs and
+    # commits are authored by one of `authors`, everyone (the users and 5 others) by
+    # default
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc)
+    user_ids = list(user_ids)
+    other_users = [max(user_ids) + i for i in range(1, 6)]
+    everyone = user_ids + other_users
+    authors = list(authors or everyone)
+
+    def random_moment():
+        return now - timedelta(seconds=rng.randint(0, days * 24 * 3600 - 1))
+
+    def random_sha():
+        return "%040x" % rng.getrandbits(160)
+
+    fixtures = {
+        "groups": {
+            str(group_id): [
+                {"id": user_id, "username": f"user{user_id}", "name": f"User {user_id}"}
+                for user_id in everyone
+            ]
+        },
+        "merge_requests": [],
+        "projects": {},
+        "commits": {},
+        "diffs": {},
+        "notes": {},
+    }
+
+    project_ids = [1000 + i for i in range(projects)]
+    for project_id in project_ids:
+        fixtures["projects"][str(project_id)] = {
+            "id": project_id,
+            "name": f"project-{project_id}",
+            "web_url": f"https://gitlab.example.com/group/project-{project_id}",
+        }
+        fixtures["commits"][str(project_id)] = []
+
+    note_id = 1
+    iids = {}
+    for mr_number in range(merge_requests):
+        project_id = rng.choice(project_ids)
+        iids[project_id] = iids.get(project_id, 0) + 1
+        created_at = random_moment()
+        merged_at = None
+        if rng.random() < 0.7:
+            merged_at = min(now, created_at + timedelta(seconds=rng.randint(600, 5 * 86400)))
+        author = rng.choice(authors)
+        reviewers = rng.sample([user for user in everyone if user != author], 2)
+        fixtures["merge_requests"].append(
+            {
+                "id": 500000 + mr_number,
+                "iid": iids[project_id],
+                "project_id": project_id,
+                "title": f"Merge request {mr_number}",
+                "author": {"id": author},
+                "reviewers": [{"id": reviewer} for reviewer in reviewers],
+                "created_at": _mr_timestamp(created_at),
+                "merged_at": _mr_timestamp(merged_at) if merged_at else None,
+                "updated_at": _mr_timestamp(merged_at or created_at),
+                "state": "merged" if merged_at else "opened",
+            }
+        )
+        notes = []
+        for i in range(rng.randint(0, notes_per_mr)):
+            notes.append(
+                {
+                    "id": note_id,
+                    "body": f"Review comment {note_id}",
+                    "author": {"id": rng.choice(everyone)},
+                    "created_at": _mr_timestamp(
+                        min(now, created_at + timedelta(minutes=rng.randint(1, 600)))
+                    ),
+                }
+            )
+            note_id += 1
+        fixtures["notes"][f"{project_id}:{iids[project_id]}"] = notes
+
+    for commit_number in range(commits):
+        project_id = rng.choice(project_ids)
+        sha = random_sha()
+        file_diffs = []
+        additions = deletions = 0
+        for file_number in range(rng.randint(1, diff_files)):
+            lines = []
+            for line_number in range(rng.randint(1, diff_lines)):
+                if rng.random() < 0.6:
+                    lines.append(f"+added line {line_number}")
+                    additions += 1
+                else:
+                    lines.append(f"-removed line {line_number}")
+                    deletions += 1
+            file_diffs.append(
+                {
+                    "old_path": f"src/file_{file_number}.py",
+                    "new_path": f"src/file_{file_number}.py",
+                    "diff": "@@ -1,1 +1,1 @@\n" + "\n".join(lines),
+                }
+            )
+        created_at = random_moment()
+        fixtures["commits"][str(project_id)].append(
+            {
+                "id": sha,
+                "short_id": sha[:8],
+                "title": f"Commit {commit_number}",
+                "author_id": rng.choice(authors),
+                "created_at": _commit_timestamp(created_at),
+                "web_url": f"https://gitlab.example.com/group/project-{project_id}/-/commit/{sha}",
+                "stats": {
+                    "additions": additions,
+                    "deletions": deletions,
+                    "total": additions + deletions,
+                },
+            }
+        )
+        fixtures["diffs"][f"{project_id}:{sha[:8]}"] = file_diffs
+
+    # GitLab lists newest first
+    fixtures["merge_requests"].sort(key=lambda mr: mr["created_at"], reverse=True)
+    for project_commits in fixtures["commits"].values():
+        project_commits.sort(key=lambda commit: commit["created_at"], reverse=True)
+    return fixtures
+
+
+def record_fixtures(api_url, accessToken, group_id, user_id, since):
+    # Record the fixtures of one member from a real GitLab so they can be replayed offline
+    from .utils import get_gitlab_client
+
+    client = get_gitlab_client()
+    api_url = api_url.rstrip("/")
+    fixtures = {
+        "groups": {},
+        "merge_requests": [],
+        "projects": {},
+        "commits": {},
+        "diffs": {},
+        "notes": {},
+    }
+
+    fixtures["groups"][str(group_id)] = list(
+        client.paginate(f"{api_url}/groups/{group_id}/members", accessToken=accessToken)
+    )
+
+    merge_requests = {}
+    for requestType in ("author_id", "reviewer_id"):
+        for record in client.paginate(
+            f"{api_url}/merge_requests",
+            accessToken=accessToken,
+            params={requestType: user_id, "created_after": since, "scope": "all"},
+        ):
+            merge_requests[record["id"]] = record
+    fixtures["merge_requests"] = list(merge_requests.values())
+
+    for record in fixtures["merge_requests"]:
+        project_id = record["project_id"]
+        fixtures["notes"][f"{project_id}:{record['iid']}"] = list(
+            client.paginate(
+                f"{api_url}/projects/{project_id}/merge_requests/{record['iid']}/notes",
+                accessToken=accessToken,
+            )
+        )
+        if str(project_id) in fixtures["projects"]:
+            continue
+        response = client.get(f"{api_url}/projects/{project_id}", accessToken=accessToken)
+        response.raise_for_status()
+        fixtures["projects"][str(project_id)] = response.json()
+
+        commits = list(
+            client.paginate(
+                f"{api_url}/projects/{project_id}/repository/commits",
+                accessToken=accessToken,
+                params={"since": since, "with_stats": "true"},
+            )
+        )
+        fixtures["commits"][str(project_id)] = commits
+        for commit in commits:
+            fixtures["diffs"][f"{project_id}:{commit['short_id']}"] = list(
+                client.paginate(
+                    f"{api_url}/projects/{project_id}/repository/commits/{commit['id']}/diff",
+                    accessToken=accessToken,
+                )
+            )
+    return fixtures
+
+
+class GitLabStandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        server_address,
+        fixtures,
+        latency=0.0,
+        jitter=0.0,
+        max_per_page=100,
+        rate_limit=None,
+        rate_limit_window=60,
+        prefix="/api/v4",
+    ):
+        super().__init__(server_address, GitLabStandInRequestHandler)
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.max_per_page = max_per_page
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.prefix = prefix.rstrip("/")
+        self.requests_served = 0
+        self._rate_windows = {}
+        self._lock = threading.Lock()
+        self._random = random.Random(0)
+
+        # diffs can be asked for by full sha or short id
+        self._diffs = {}
+        for key, file_diffs in fixtures.get("diffs", {}).items():
+            self._diffs[key] = file_diffs
+        for project_id, commits in fixtures.get("commits", {}).items():
+            for commit in commits:
+                short_key = f"{project_id}:{commit['short_id']}"
+                if short_key in self._diffs:
+                    self._diffs[f"{project_id}:{commit['id']}"] = self._diffs[short_key]
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self):
+        return f"{self.base_url}{self.prefix}"
+
+    def take_rate_limit(self, accessToken):
+        # Fixed window counter per access token, returns (allowed, headers)
+        if not self.rate_limit:
+            return True, {}
+        key = hashlib.sha256((accessToken or "").encode()).hexdigest()
+        now = time.time()
+        with self._lock:
+            window_start, count = self._rate_windows.get(key, (now, 0))
+            if now - window_start >= self.rate_limit_window:
+                window_start, count = now, 0
+            count += 1
+            self._rate_windows[key] = (window_start, count)
+        reset = window_start + self.rate_limit_window
+        headers = {
+            "RateLimit-Limit": str(self.rate_limit),
+            "RateLimit-Observed": str(count),
+            "RateLimit-Remaining": str(max(0, self.rate_limit - count)),
+            "RateLimit-Reset": str(int(math.ceil(reset))),
+        }
+        if count > self.rate_limit:
+            headers["Retry-After"] = str(max(1, int(math.ceil(reset - now))))
+            return False, headers
+        return True, headers
+
+    def delay(self):
+        if self.latency or self.jitter:
+            with self._lock:
+                jitter = self._random.uniform(-self.jitter, self.jitter)
+            time.sleep(max(0.0, self.latency + jitter))
+
+
+class GitLabStandInRequestHandler(BaseHTTPRequestHandler):
+    routes = [
+        (re.compile(r"^/groups/(?P<group_id>[^/]+)/members$"), "group_members"),
+        (re.compile(r"^/merge_requests$"), "merge_requests"),
+        (re.compile(r"^/projects/(?P<project_id>[^/]+)$"), "project"),
+        (
+            re.compile(r"^/projects/(?P<project_id>[^/]+)/repository/commits$"),
+            "commits",
+        ),
+        (
+            re.compile(
+                r"^/projects/(?P<project_id>[^/]+)/repository/commits/(?P<sha>[^/]+)/diff$"
+            ),
+            "commit_diff",
+        ),
+        (
+            re.compile(
+                r"^/projects/(?P<project_id>[^/]+)/merge_requests/(?P<iid>[^/]+)/notes$"
+            ),
+            "notes",
+        ),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server._lock:
+            server.requests_served += 1
+        server.delay()
+
+        allowed, rate_headers = server.take_rate_limit(self.headers.get("PRIVATE-TOKEN"))
+        if not allowed:
+            return self.send_json(429, {"message": "429 Too Many Requests"}, rate_headers)
+
+        parsed = urlparse(self.path)
+        if not parsed.path.startswith(server.prefix):
+            return self.send_json(404, {"message": "404 Not Found"}, rate_headers)
+        path = parsed.path[len(server.prefix) :].rstrip("/") or "/"
+        query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+
+        for pattern, name in self.routes:
+            match = pattern.match(path)
+            if match:
+                result = getattr(self, f"get_{name}")(query, **match.groupdict())
+                break
+        else:
+            result = None
+
+        if result is None:
+            return self.send_json(404, {"message": "404 Not Found"}, rate_headers)
+        if isinstance(result, list):
+            return self.send_page(parsed.path, query, result, rate_headers)
+        return self.send_json(200, result, rate_headers)
+
+    # endpoints
+
+    def get_group_members(self, query, group_id):
+        return self.server.fixtures.get("groups", {}).get(str(group_id))
+
+    def get_merge_requests(self, query):
+        records = self.server.fixtures.get("merge_requests", [])
+        created_after = _parse_timestamp(query.get("created_after"))
+        updated_after = _parse_timestamp(query.get("updated_after"))
+        author_id = query.get("author_id")
+        reviewer_id = query.get("reviewer_id")
+        result = []
+        for record in records:
+            if created_after and _parse_timestamp(record["created_at"]) < created_after:
+                continue
+            updated_at = record.get("updated_at") or record["created_at"]
+            if updated_after and _parse_timestamp(updated_at) < updated_after:
+                continue
+            if author_id and str(record.get("author", {}).get("id")) != author_id:
+                continue
+            if reviewer_id and reviewer_id not in [
+                str(reviewer.get("id")) for reviewer in record.get("reviewers", [])
+            ]:
+                continue
+            result.append(record)
+        return result
+
+    def get_project(self, query, project_id):
+        return self.server.fixtures.get("projects", {}).get(str(project_id))
+
+    def get_commits(self, query, project_id):
+        commits = self.server.fixtures.get("commits", {}).get(str(project_id))
+        if commits is None:
+            return None
+        since = _parse_timestamp(query.get("since"))
+        with_stats = query.get("with_stats") == "true"
+        result = []
+        for commit in commits:
+            if since and _parse_timestamp(commit["created_at"]) < since:
+                continue
+            if not with_stats and "stats" in commit:
+                commit = {key: value for key, value in commit.items() if key != "stats"}
+            result.append(commit)
+        return result
+
+    def get_commit_diff(self, query, project_id, sha):
+        return self.server._diffs.get(f"{project_id}:{sha}")
+
+    def get_notes(self, query, project_id, iid):
+        return self.server.fixtures.get("notes", {}).get(f"{project_id}:{iid}")
+
+    # responses
+
+    def send_page(self, path, query, records, headers):
+        # GitLab offset pagination, default 20 items and at most max_per_page per page
+        try:
+            per_page = int(query.get("per_page", 20))
+            page = int(query.get("page", 1))
+        except ValueError:
+            return self.send_json(400, {"message": "400 Bad request"}, headers)
+        per_page = max(1, min(per_page, self.server.max_per_page))
+        page = max(1, page)
+        total_pages = max(1, math.ceil(len(records) / per_page))
+        next_page = page + 1 if page < total_pages else ""
+        prev_page = page - 1 if page > 1 else ""
+
+        headers = dict(headers)
+        headers.update(
+            {
+                "X-Page": str(page),
+                "X-Per-Page": str(per_page),
+                "X-Next-Page": str(next_page),
+                "X-Prev-Page": str(prev_page),
+                "X-Total": str(len(records)),
+                "X-Total-Pages": str(total_pages),
+            }
+        )
+        links = []
+        for rel, target in (
+            ("prev", prev_page),
+            ("next", next_page),
+            ("first", 1),
+            ("last", total_pages),
+        ):
+            if target:
+                link_query = dict(query, page=target, per_page=per_page)
+                links.append(
+                    f'<{self.server.base_url}{path}?{urlencode(link_query)}>; rel="{rel}"'
+                )
+        headers["Link"] = ", ".join(links)
+
+        start = (page - 1) * per_page
+        return self.send_json(200, records[start : start + per_page], headers)
+
+    def send_json(self, status, payload, headers):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_standin_server(fixtures, host="127.0.0.1", port=0, **options):
+    # Start the stand-in in a background thread, port 0 picks a free port
+    server = GitLabStandInServer((host, port), fixtures, **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,175 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .coding_stats import CodingStatsError, build_coding_stats, update_coding_stats
+from .models import CodingStatsJob, Teammember, TeammemberCodingStats
+from .timing import StageTimings, timed_stage
+from .webhooks import apply_gitlab_webhook_activity
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_JOB_STATUSES = ["queued", "running"]
+
+
+def coding_stats_jobs_setting(name, default):
+    return getattr(settings, "CODING_STATS_JOBS", {}).get(name, default)
+
+
+def enqueue_coding_stats_job(user, teammember, kind, params=None, reuse=True):
+    # Queue a coding stats job, returns (job, created).
+    # A job of the same kind already waiting or running for the teammember is reused,
+    # unless reuse is False (webhook jobs each carry their own event)
+    job = None
+    if reuse:
+        job = (
+            CodingStatsJob.objects.filter(
+                teammember=teammember, kind=kind, status__in=ACTIVE_JOB_STATUSES
+            )
+            .order_by("-created_at")
+            .first()
+        )
+    if job:
+        return job, False
+
+    job = CodingStatsJob.objects.create(
+        created_by=user, teammember=teammember, kind=kind, params=params or {}
+    )
+
+    # without a worker process the job is run right away in the request
+    if not coding_stats_jobs_setting("RUN_IN_BACKGROUND", True) and claim_job(job):
+        run_coding_stats_job(job)
+    return job, True
+
+
+def coding_stats_staleness_setting(name, default):
+    return getattr(settings, "CODING_STATS_STALENESS", {}).get(name, default)
+
+
+def is_coding_stats_stale(latestUpdate):
+    if not coding_stats_staleness_setting("ENABLED", True):
+        return False
+    max_age = coding_stats_staleness_setting("MAX_AGE", 6 * 3600)
+    return latestUpdate < timezone.now() - timedelta(seconds=max_age)
+
+
+def refresh_stale_coding_stats(user, teammember_ids):
+    # Queue an update job for the teammembers of the user whose stats were served stale,
+    # returns the jobs. Reads of anonymous users or of other users' teammembers never
+    # queue jobs. A cache marker keeps every read of stale stats from checking the queue
+    if not coding_stats_jobs_setting("RUN_IN_BACKGROUND", True):
+        return []
+    if not user.is_authenticated or not teammember_ids:
+        return []
+    retry_after = coding_stats_staleness_setting("RETRY_AFTER", 5 * 60)
+
+    jobs = []
+    for teammember in Teammember.objects.filter(
+        pk__in=teammember_ids, created_by=user, teammember_hasGitIntegration=True
+    ):
+        if not cache.add(
+            f"team:coding-stats-refresh:{teammember.pk}", True, retry_after
+        ):
+            continue
+        job, created = enqueue_coding_stats_job(user, teammember, "update")
+        jobs.append(job)
+    return jobs
+
+
+def claim_job(job):
+    # Atomically move a queued job to running, False if another worker got it first
+    claimed = CodingStatsJob.objects.filter(pk=job.pk, status="queued").update(
+        status="running", started_at=timezone.now()
+    )
+    if claimed:
+        job.refresh_from_db()
+    return bool(claimed)
+
+
+def claim_next_job():
+    for job in CodingStatsJob.objects.filter(status="queued").order_by("created_at")[:10]:
+        if claim_job(job):
+            return job
+    return None
+
+
+def requeue_stale_jobs():
+    # Jobs left running by a worker that died are given back to the queue
+    timeout = coding_stats_jobs_setting("RUNNING_TIMEOUT", 3600)
+    return CodingStatsJob.objects.filter(
+        status="running",
+        started_at__lt=timezone.now() - timedelta(seconds=timeout),
+    ).update(status="queued", started_at=None, stage="", progress=0)
+
+
+def run_coding_stats_job(job):
+    def progress(stage, percent):
+        CodingStatsJob.objects.filter(pk=job.pk).update(stage=stage, progress=percent)
+
+    # time, GitLab requests and bytes of every stage, kept in the job result
+    timings = StageTimings()
+    try:
+        with timings.activate():
+            coding_stats = run_coding_stats_job_kind(job, progress)
+    except (CodingStatsError, TeammemberCodingStats.DoesNotExist) as error:
+        finish_job(
+            job, "failed", result={"timings": timings.as_dict()}, error=str(error)
+        )
+    except Exception as error:
+        logger.exception("Coding stats job %s failed", job.pk)
+        finish_job(
+            job,
+            "failed",
+            result={"timings": timings.as_dict()},
+            error=f"Unexpected error: {error}",
+        )
+    else:
+        finish_job(
+            job,
+            "done",
+            result={
+                "coding_stats": coding_stats.pk,
+                "latestUpdate": coding_stats.latestUpdate.isoformat(),
+                "timings": timings.as_dict(),
+            },
+        )
+    return job
+
+
+def run_coding_stats_job_kind(job, progress):
+    if job.kind == "create":
+        stats_fields = build_coding_stats(job.teammember, progress=progress)
+        latestUpdate = (
+            parse_datetime(job.params.get("latestUpdate") or "") or timezone.now()
+        )
+        with timed_stage("save"):
+            coding_stats, created = TeammemberCodingStats.objects.update_or_create(
+                teammember=job.teammember,
+                defaults={"latestUpdate": latestUpdate, **stats_fields},
+            )
+        return coding_stats
+    if job.kind == "webhook":
+        return apply_gitlab_webhook_activity(
+            TeammemberCodingStats.objects.get(teammember=job.teammember),
+            job.params.get("body") or {},
+        )
+    return update_coding_stats(
+        TeammemberCodingStats.objects.get(teammember=job.teammember),
+        progress=progress,
+    )
+
+
+def finish_job(job, status, result=None, error=None):
+    job.status = status
+    job.result = result or {}
+    job.error = error
+    job.finished_at = timezone.now()
+    update_fields = ["status", "result", "error", "finished_at"]
+    if status == "done":
+        # a failed job keeps the stage it stopped at
+        job.stage = "done"
+        job.progress = 100
+        update_fields += ["stage", "progress"]
+    job.save(update_fields=update_fields)
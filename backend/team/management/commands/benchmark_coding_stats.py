@@ -0,0 +1,55 @@
+import json
+from django.core.management.base import BaseCommand
+from team.benchmarks import run_coding_stats_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the coding stats pipeline (structuring, aggregation, persistence "
+        "and incremental update) on seeded synthetic GitLab data and print the "
+        "results as JSON. Database writes are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--projects", type=int, default=200)
+        parser.add_argument("--merge-requests", type=int, default=10000)
+        parser.add_argument("--commits", type=int, default=100000)
+        parser.add_argument("--notes-per-mr", type=int, default=3)
+        parser.add_argument(
+            "--update-days",
+            type=int,
+            default=1,
+            help="Days of activity applied by the incremental update stage",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=1,
+            help="Runs of every stage, the median time is reported",
+        )
+        parser.add_argument(
+            "--no-memory",
+            action="store_true",
+            help="Do not trace the peak memory, tracing slows the stages down",
+        )
+        parser.add_argument("--output", help="Write the JSON results to this file")
+
+    def handle(self, *args, **options):
+        results = run_coding_stats_benchmark(
+            seed=options["seed"],
+            projects=options["projects"],
+            merge_requests=options["merge_requests"],
+            commits=options["commits"],
+            notes_per_mr=options["notes_per_mr"],
+            update_days=options["update_days"],
+            repeat=options["repeat"],
+            trace_memory=not options["no_memory"],
+        )
+
+        if options["output"]:
+            with open(options["output"], "w") as output_file:
+                json.dump(results, output_file, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+        else:
+            self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,110 @@
+import json
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from team.gitlab_standin import (
+    GitLabStandInServer,
+    generate_synthetic_fixtures,
+    record_fixtures,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve an offline GitLab stand-in from recorded or synthetic fixtures. "
+        "Point settings.GITLAB_API_URL to the printed url to use it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8081)
+        parser.add_argument("--fixtures", help="JSON fixtures file to replay")
+        parser.add_argument(
+            "--dump",
+            help="Write the fixtures (synthetic or recorded) to this file and exit",
+        )
+
+        synthetic = parser.add_argument_group("synthetic fixtures")
+        synthetic.add_argument("--seed", type=int, default=0)
+        synthetic.add_argument("--user-ids", type=int, nargs="+", default=[1])
+        synthetic.add_argument("--group-id", type=int, default=1)
+        synthetic.add_argument("--projects", type=int, default=10)
+        synthetic.add_argument("--merge-requests", type=int, default=100)
+        synthetic.add_argument("--commits", type=int, default=500)
+        synthetic.add_argument("--notes-per-mr", type=int, default=3)
+        synthetic.add_argument("--days", type=int, default=60)
+
+        record = parser.add_argument_group("recording from a real GitLab")
+        record.add_argument("--record-from", help="GitLab API url to record from")
+        record.add_argument("--token", help="Personal access token used to record")
+        record.add_argument("--record-user-id")
+        record.add_argument("--record-group-id")
+
+        server = parser.add_argument_group("server behaviour")
+        server.add_argument("--latency-ms", type=float, default=0)
+        server.add_argument("--jitter-ms", type=float, default=0)
+        server.add_argument("--max-per-page", type=int, default=100)
+        server.add_argument(
+            "--rate-limit",
+            type=int,
+            default=None,
+            help="Requests allowed per access token and window, unlimited by default",
+        )
+        server.add_argument("--rate-limit-window", type=int, default=60)
+
+    def handle(self, *args, **options):
+        if options["record_from"]:
+            if not (
+                options["token"]
+                and options["record_user_id"]
+                and options["record_group_id"]
+            ):
+                raise CommandError(
+                    "--record-from needs --token, --record-user-id and --record-group-id"
+                )
+            since = (datetime.utcnow() - timedelta(days=options["days"])).strftime(
+                "%Y-%m-%dT%H:%M:%SZ"
+            )
+            fixtures = record_fixtures(
+                options["record_from"],
+                options["token"],
+                options["record_group_id"],
+                options["record_user_id"],
+                since,
+            )
+        elif options["fixtures"]:
+            with open(options["fixtures"]) as fixtures_file:
+                fixtures = json.load(fixtures_file)
+        else:
+            fixtures = generate_synthetic_fixtures(
+                seed=options["seed"],
+                user_ids=options["user_ids"],
+                group_id=options["group_id"],
+                projects=options["projects"],
+                merge_requests=options["merge_requests"],
+                commits=options["commits"],
+                notes_per_mr=options["notes_per_mr"],
+                days=options["days"],
+            )
+
+        if options["dump"]:
+            with open(options["dump"], "w") as dump_file:
+                json.dump(fixtures, dump_file)
+            self.stdout.write(f"Fixtures written to {options['dump']}")
+            return
+
+        server = GitLabStandInServer(
+            (options["host"], options["port"]),
+            fixtures,
+            latency=options["latency_ms"] / 1000,
+            jitter=options["jitter_ms"] / 1000,
+            max_per_page=options["max_per_page"],
+            rate_limit=options["rate_limit"],
+            rate_limit_window=options["rate_limit_window"],
+        )
+        self.stdout.write(f"GitLab stand-in serving at {server.api_url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
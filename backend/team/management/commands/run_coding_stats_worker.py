@@ -0,0 +1,55 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from team.jobs import (
+    claim_next_job,
+    coding_stats_jobs_setting,
+    requeue_stale_jobs,
+    run_coding_stats_job,
+)
+
+
+class Command(BaseCommand):
+    help = "Run the worker that processes queued coding stats jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Process the jobs currently queued and exit",
+        )
+        parser.add_argument(
+            "--max-jobs",
+            type=int,
+            default=None,
+            help="Exit after processing this many jobs",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=None,
+            help="Seconds to wait between polls of an empty queue",
+        )
+
+    def handle(self, *args, **options):
+        poll_interval = options["poll_interval"]
+        if poll_interval is None:
+            poll_interval = coding_stats_jobs_setting("POLL_INTERVAL", 2)
+        processed = 0
+
+        self.stdout.write("Coding stats worker started")
+        while options["max_jobs"] is None or processed < options["max_jobs"]:
+            close_old_connections()
+            requeue_stale_jobs()
+
+            job = claim_next_job()
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            self.stdout.write(f"Running job {job.pk} ({job.kind} {job.teammember_id})")
+            run_coding_stats_job(job)
+            self.stdout.write(f"Job {job.pk} {job.status}")
+            processed += 1
@@ -0,0 +1,101 @@
+import re
+from urllib.parse import urlparse
+from core.metrics import registry
+
+# GitLab API metrics of the process, see core.metrics. Requests are counted by endpoint
+# type, the type of a url is the first of these patterns its path matches
+GITLAB_ENDPOINTS = (
+    ("mr_notes", re.compile(r"/projects/[^/]+/merge_requests/[^/]+/notes$")),
+    ("commit_diff", re.compile(r"/projects/[^/]+/repository/commits/[^/]+/diff$")),
+    ("commits", re.compile(r"/projects/[^/]+/repository/commits$")),
+    ("merge_requests", re.compile(r"/merge_requests$")),
+    ("project", re.compile(r"/projects/[^/]+$")),
+    ("group_members", re.compile(r"/groups/[^/]+/members$")),
+)
+
+gitlab_requests = registry.counter(
+    "esemtials_gitlab_requests_total",
+    "GitLab API requests by endpoint type and status code.",
+    labels=("endpoint", "status"),
+)
+gitlab_request_duration = registry.histogram(
+    "esemtials_gitlab_request_duration_seconds",
+    "Latency of the GitLab API requests by endpoint type.",
+    labels=("endpoint",),
+)
+gitlab_request_failures = registry.counter(
+    "esemtials_gitlab_request_failures_total",
+    "GitLab API requests that failed (non 2xx status or no response) by endpoint type.",
+    labels=("endpoint", "reason"),
+)
+
+
+def gitlab_endpoint(url):
+    path = urlparse(url).path.rstrip("/")
+    for endpoint, pattern in GITLAB_ENDPOINTS:
+        if pattern.search(path):
+            return endpoint
+    return "other"
+
+
+def record_gitlab_request(url, seconds, response=None, error=None):
+    # One GitLab request, with its response or the exception raised instead of it
+    endpoint = gitlab_endpoint(url)
+    gitlab_request_duration.observe(seconds, endpoint=endpoint)
+    if response is None:
+        gitlab_requests.inc(endpoint=endpoint, status="error")
+        gitlab_request_failures.inc(endpoint=endpoint, reason=type(error).__name__)
+        return
+    gitlab_requests.inc(endpoint=endpoint, status=response.status_code)
+    if not 200 <= response.status_code < 300:
+        gitlab_request_failures.inc(endpoint=endpoint, reason=response.status_code)
+
+
+def gitlab_gauges():
+    # Collector of the rate limiter and diff cache state, read on every scrape
+    from .utils import get_commit_diff_cache, get_gitlab_rate_limiter
+
+    gauges = []
+    rate_limiter = get_gitlab_rate_limiter()
+    if rate_limiter is not None:
+        snapshot = rate_limiter.snapshot()
+        for name, help_text in (
+            ("queue_depth", "Requests waiting for the rate limiter by token."),
+            ("tokens", "Requests the rate limiter can send right away by token."),
+            ("blocked_for", "Seconds a token is blocked for after a 429."),
+            ("remaining", "RateLimit-Remaining of the latest response by token."),
+            ("throttled", "1 when GitLab throttled the token."),
+        ):
+            gauges.append(
+                (
+                    f"esemtials_gitlab_rate_limit_{name}",
+                    "gauge",
+                    help_text,
+                    [
+                        ({"token": token}, float(state[name]))
+                        for token, state in snapshot.items()
+                        if state[name] is not None
+                    ],
+                )
+            )
+
+    diff_cache = get_commit_diff_cache()
+    if diff_cache is not None:
+        stats = diff_cache.stats()
+        for name, kind, help_text in (
+            ("hits", "counter", "Commit diffs read from the diff cache."),
+            ("misses", "counter", "Commit diffs missing from the diff cache."),
+            ("evictions", "counter", "Commit diffs evicted from the diff cache."),
+            ("size_bytes", "gauge", "Size of the diff cache on disk."),
+            ("max_bytes", "gauge", "Maximum size of the diff cache."),
+        ):
+            suffix = "_total" if kind == "counter" else ""
+            gauges.append(
+                (
+                    f"esemtials_gitlab_diff_cache_{name}{suffix}",
+                    kind,
+                    help_text,
+                    [({}, stats[name])],
+                )
+            )
+    return gauges
@@ -1,7 +1,13 @@
-from django.db import models
+import json
+import zlib
+from django.db import models, transaction
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from users.models import CustomUser
+from .stats_cache import invalidate_coding_stats_cache
+
+# zlib level of the stored coding stats bodies, 6 is the zlib default
+CODING_STATS_BODY_COMPRESSION_LEVEL = 6
 
 TM_POSITION = [
     ("sm", "Scrum Master"),
@@ -55,6 +61,10 @@ class Teammember(models.Model):
     teammember_hasBoardIntegration = models.BooleanField(null=True, blank=True)
     teammember_hasCalendarIntegration = models.BooleanField(null=True, blank=True)
 
+    class Meta:
+        # the team member list and its cursor pages, ordered by last name
+        indexes = [models.Index(fields=["created_by", "tm_lname", "id"])]
+
     def __str__(self):
         return f"{self.tm_name} {self.tm_lname}"
 
@@ -73,6 +83,10 @@ class TeamMemberComment(models.Model):
     commentContent = models.TextField(max_length=1024, null=False, blank=False)
     updateDate = models.DateTimeField(null=False)
 
+    class Meta:
+        # the comments of a team member, newest first
+        indexes = [models.Index(fields=["created_by", "teammember", "id"])]
+
 
 class TeamMemberGitIntegrationData(models.Model):
     created_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE, default=None)
@@ -83,11 +97,17 @@ class TeamMemberGitIntegrationData(models.Model):
         max_length=64, choices=TM_GIT_HOSTINGS, blank=False, null=False
     )
     teammemberGitGroupID = models.TextField(max_length=64, null=True, blank=True)
-    teammemberGitUserID = models.TextField(max_length=64, null=True, blank=True)
+    # GitLab webhook events are matched to the teammembers by this id
+    teammemberGitUserID = models.TextField(
+        max_length=64, null=True, blank=True, db_index=True
+    )
     teammemberGitPersonalAccessToken = models.TextField(
         max_length=64, null=True, blank=True
     )
 
+    class Meta:
+        indexes = [models.Index(fields=["created_by", "id"])]
+
 
 # Signal to set `teammember_hasGitIntegration` to True when TeamMemberGitIntegrationData is created
 @receiver(post_save, sender=TeamMemberGitIntegrationData)
@@ -112,8 +132,276 @@ class TeammemberCodingStats(models.Model):
         Teammember, on_delete=models.CASCADE, default=None, unique=True
     )
     latestUpdate = models.DateTimeField(null=False)
-    body = models.JSONField(default=dict)
     counters7 = models.JSONField(default=dict)
     counters30 = models.JSONField(default=dict)
     previous7 = models.JSONField(default=dict)
     previous30 = models.JSONField(default=dict)
+    # set by every save, the cached detail of another process is outdated once it moved
+    updated = models.DateTimeField(auto_now=True)
+
+    # The body (the GitLab records behind the counters) is stored compressed in
+    # TeammemberCodingStatsBody, it is only read when accessed and written on save when set
+    @property
+    def body(self):
+        if not hasattr(self, "_body"):
+            storedBody = None
+            if self.pk:
+                storedBody = TeammemberCodingStatsBody.objects.filter(
+                    coding_stats_id=self.pk
+                ).first()
+            self._body = storedBody.load() if storedBody else {}
+        return self._body
+
+    @property
+    def has_stored_body(self):
+        # stats saved before the body got its own table have no body row
+        return bool(self.pk) and (
+            TeammemberCodingStatsBody.objects.filter(coding_stats_id=self.pk).exists()
+        )
+
+    @body.setter
+    def body(self, value):
+        self._body = value
+        self._body_changed = True
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if getattr(self, "_body_changed", False):
+            TeammemberCodingStatsBody.objects.update_or_create(
+                coding_stats=self, defaults=TeammemberCodingStatsBody.dump(self._body)
+            )
+            self._body_changed = False
+
+
+# Drop the cached coding stats detail response when the stats change
+@receiver(post_save, sender=TeammemberCodingStats)
+@receiver(post_delete, sender=TeammemberCodingStats)
+def invalidate_coding_stats_cache_on_change(sender, instance, **kwargs):
+    invalidate_coding_stats_cache(instance.teammember_id)
+
+
+class TeammemberCodingStatsBody(models.Model):
+    # zlib compressed JSON of the coding stats body, one row per TeammemberCodingStats
+    coding_stats = models.OneToOneField(
+        TeammemberCodingStats,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stored_body",
+    )
+    data = models.BinaryField()
+    # size of the uncompressed JSON in bytes
+    size = models.PositiveIntegerField(default=0)
+
+    @staticmethod
+    def dump(body):
+        raw = json.dumps(body, separators=(",", ":")).encode()
+        return {
+            "data": zlib.compress(raw, CODING_STATS_BODY_COMPRESSION_LEVEL),
+            "size": len(raw),
+        }
+
+    def load(self):
+        return json.loads(zlib.decompress(self.data))
+
+
+JOB_KINDS = [
+    ("create", "Create coding stats"),
+    ("update", "Update coding stats"),
+    ("webhook", "Apply a GitLab webhook event"),
+]
+
+JOB_STATUSES = [
+    ("queued", "Queued"),
+    ("running", "Running"),
+    ("done", "Done"),
+    ("failed", "Failed"),
+]
+
+
+class CodingStatsJob(models.Model):
+    created_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    teammember = models.ForeignKey(Teammember, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=16, choices=JOB_KINDS)
+    status = models.CharField(max_length=16, choices=JOB_STATUSES, default="queued")
+    stage = models.CharField(max_length=64, blank=True, default="")
+    progress = models.PositiveSmallIntegerField(default=0)
+    params = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(default=dict, blank=True)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["teammember", "status"]),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.teammember_id} {self.status}"
+
+
+# GitLab activity of the teammembers, one row per ingested GitLab record.
+# Rows are written with bulk upserts on the GitLab ids so an update only touches
+# the records it fetched
+
+
+class GitLabProject(models.Model):
+    project_id = models.PositiveBigIntegerField(unique=True)
+    name = models.CharField(max_length=255)
+    web_url = models.URLField(max_length=512)
+
+    def __str__(self):
+        return self.name
+
+
+class GitLabMergeRequest(models.Model):
+    teammember = models.ForeignKey(
+        Teammember, on_delete=models.CASCADE, related_name="gitlab_merge_requests"
+    )
+    mr_id = models.PositiveBigIntegerField()
+    project_id = models.PositiveBigIntegerField()
+    iid = models.PositiveIntegerField()
+    created_at = models.DateTimeField()
+    merged_at = models.DateTimeField(null=True, blank=True)
+    # seconds between creation and merge, only for merged MRs created by the teammember
+    create_to_merge = models.FloatField(null=True, blank=True)
+    is_author = models.BooleanField(default=False)
+    is_reviewer = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["teammember", "mr_id"], name="unique_teammember_merge_request"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["teammember", "created_at"]),
+            models.Index(fields=["project_id", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"!{self.iid} ({self.project_id})"
+
+
+class GitLabMergeRequestNote(models.Model):
+    merge_request = models.ForeignKey(
+        GitLabMergeRequest, on_delete=models.CASCADE, related_name="notes"
+    )
+    note_id = models.PositiveBigIntegerField()
+    body = models.TextField(blank=True, default="")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["merge_request", "note_id"],
+                name="unique_merge_request_note",
+            )
+        ]
+
+
+class GitLabCommit(models.Model):
+    teammember = models.ForeignKey(
+        Teammember, on_delete=models.CASCADE, related_name="gitlab_commits"
+    )
+    project_id = models.PositiveBigIntegerField()
+    short_id = models.CharField(max_length=64)
+    web_url = models.URLField(max_length=512, blank=True, default="")
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["teammember", "project_id", "short_id"],
+                name="unique_teammember_commit",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["teammember", "created_at"]),
+            models.Index(fields=["project_id", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.short_id} ({self.project_id})"
+
+
+class GitLabCommitDiffStat(models.Model):
+    commit = models.OneToOneField(
+        GitLabCommit, on_delete=models.CASCADE, related_name="diff_stat"
+    )
+    lines_added = models.PositiveIntegerField(default=0)
+    lines_removed = models.PositiveIntegerField(default=0)
+    # only filled when settings.GITLAB_DIFF_CONTENT_RETENTION keeps the line content
+    added_lines_content = models.JSONField(default=list, blank=True)
+    removed_lines_content = models.JSONField(default=list, blank=True)
+
+
+class CodingActivityDailyRollup(models.Model):
+    # Activity of a teammember in a project on a (UTC) day, maintained on ingestion
+    # so window counters are sums over a few rows instead of scans over every record
+    teammember = models.ForeignKey(
+        Teammember, on_delete=models.CASCADE, related_name="coding_activity_days"
+    )
+    project_id = models.PositiveBigIntegerField()
+    day = models.DateField()
+    created_mrs = models.PositiveIntegerField(default=0)
+    reviewed_mrs = models.PositiveIntegerField(default=0)
+    merged_mrs = models.PositiveIntegerField(default=0)
+    # summed over the merged MRs, divided by merged_mrs for the average
+    create_to_merge_seconds = models.FloatField(default=0)
+    comments = models.PositiveIntegerField(default=0)
+    commits = models.PositiveIntegerField(default=0)
+    lines_added = models.PositiveIntegerField(default=0)
+    lines_removed = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["teammember", "project_id", "day"],
+                name="unique_teammember_project_day",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["teammember", "day"]),
+            models.Index(fields=["project_id", "day"]),
+        ]
+
+
+class ProjectCodingStats(models.Model):
+    # Coding stats of all the teammembers of a dashboard project, refreshed whenever the
+    # stats of one of them change so the team overview is a single row read
+    project = models.OneToOneField(
+        "dashboard.Project", on_delete=models.CASCADE, related_name="coding_stats"
+    )
+    teammembers = models.PositiveIntegerField(default=0)
+    counters7 = models.JSONField(default=dict)
+    counters30 = models.JSONField(default=dict)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.project} coding stats"
+
+
+# Refresh the project coding stats once the transaction saving the teammember stats
+# is committed, the project may be gone by then when it is the one being deleted
+def refresh_project_stats_on_commit(project_id):
+    from .project_stats import refresh_project_coding_stats
+
+    transaction.on_commit(lambda: refresh_project_coding_stats(project_id))
+
+
+@receiver(post_save, sender=TeammemberCodingStats)
+def refresh_project_stats_on_save(sender, instance, **kwargs):
+    refresh_project_stats_on_commit(instance.teammember.project_id)
+
+
+@receiver(post_delete, sender=TeammemberCodingStats)
+def refresh_project_stats_on_delete(sender, instance, **kwargs):
+    project_id = (
+        Teammember.objects.filter(pk=instance.teammember_id)
+        .values_list("project_id", flat=True)
+        .first()
+    )
+    if project_id:
+        refresh_project_stats_on_commit(project_id)
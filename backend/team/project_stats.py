@@ -0,0 +1,69 @@
+from datetime import timedelta
+from statistics import median
+from django.db.models import Count, Sum
+from django.utils import timezone
+from dashboard.models import Project
+from .activity_store import day_start
+from .models import (
+    CodingActivityDailyRollup,
+    GitLabMergeRequest,
+    ProjectCodingStats,
+    TeammemberCodingStats,
+)
+
+# Windows of the project counters in days, today included like the teammember counters
+PROJECT_WINDOWS = (7, 30)
+
+
+def project_window_counters(project, days, today):
+    # Totals of the teammembers of the project over the last `days` days, summed from the
+    # daily rollups, and the median create to merge time of the MRs they created
+    first_day = today - timedelta(days=days - 1)
+    totals = CodingActivityDailyRollup.objects.filter(
+        teammember__project=project, day__gte=first_day
+    ).aggregate(
+        created_mrs=Sum("created_mrs"),
+        reviewed_mrs=Sum("reviewed_mrs"),
+        merged_mrs=Sum("merged_mrs"),
+        comments=Sum("comments"),
+        commits=Sum("commits"),
+        lines_added=Sum("lines_added"),
+        lines_removed=Sum("lines_removed"),
+        active_teammembers=Count("teammember", distinct=True),
+    )
+    counters = {name: value or 0 for name, value in totals.items()}
+
+    create_to_merge = GitLabMergeRequest.objects.filter(
+        teammember__project=project,
+        is_author=True,
+        create_to_merge__isnull=False,
+        created_at__gte=day_start(first_day),
+    ).values_list("create_to_merge", flat=True)
+    create_to_merge = list(create_to_merge)
+    counters["create_to_merge_median"] = (
+        median(create_to_merge) if create_to_merge else 0
+    )
+    return counters
+
+
+def refresh_project_coding_stats(project_id):
+    # Recompute the ProjectCodingStats row of the project, returns None when the project
+    # does not exist anymore
+    project = Project.objects.filter(pk=project_id).first()
+    if project is None:
+        return None
+
+    today = timezone.now().date()
+    projectCodingStats, created = ProjectCodingStats.objects.update_or_create(
+        project=project,
+        defaults={
+            "teammembers": TeammemberCodingStats.objects.filter(
+                teammember__project=project
+            ).count(),
+            **{
+                f"counters{days}": project_window_counters(project, days, today)
+                for days in PROJECT_WINDOWS
+            },
+        },
+    )
+    return projectCodingStats
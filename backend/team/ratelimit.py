@@ -0,0 +1,172 @@
+import hashlib
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+def token_key(accessToken):
+    # Never keep raw access tokens around, buckets are keyed by a short hash
+    if not accessToken:
+        return "anonymous"
+    return hashlib.sha256(accessToken.encode()).hexdigest()[:12]
+
+
+class _TokenState:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.queue_depth = 0
+        self.throttled = 0  # consecutive 429 responses
+        self.remaining = None
+        self.limit = None
+
+
+class GitLabRateLimiter:
+    # Token bucket scheduler keyed by GitLab access token.
+    # Every request takes one token from the bucket of its access token, the bucket
+    # refills at `rate` requests per second up to `burst`. The RateLimit-* and
+    # Retry-After headers of every response slow the bucket down or block it
+    # completely until GitLab allows new requests again.
+    def __init__(self, rate=25, burst=50, max_backoff=60):
+        # a bucket that never refills or never holds a whole token would block forever
+        if rate <= 0 or burst < 1:
+            raise ValueError("The rate must be positive and the burst at least 1.")
+        self.rate = rate
+        self.burst = burst
+        self.max_backoff = max_backoff
+        self._states = {}
+        self._condition = threading.Condition()
+
+    def _state(self, key):
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _TokenState(self.rate, self.burst)
+        return state
+
+    def _refill(self, state, now):
+        state.tokens = min(
+            float(self.burst), state.tokens + (now - state.updated) * state.rate
+        )
+        state.updated = now
+
+    def acquire(self, accessToken):
+        # Block the calling thread until a request may be sent with this token
+        key = token_key(accessToken)
+        with self._condition:
+            state = self._state(key)
+            state.queue_depth += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(state, now)
+                    if now < state.blocked_until:
+                        wait = state.blocked_until - now
+                    elif state.tokens >= 1:
+                        state.tokens -= 1
+                        return
+                    else:
+                        wait = (1 - state.tokens) / state.rate
+                    self._condition.wait(timeout=wait)
+            finally:
+                state.queue_depth -= 1
+
+    def observe(self, accessToken, response):
+        # Adjust pacing for this token from the response rate limit headers
+        key = token_key(accessToken)
+        headers = response.headers
+        remaining = _int_header(headers, "RateLimit-Remaining")
+        limit = _int_header(headers, "RateLimit-Limit")
+        reset_in = _reset_in(headers.get("RateLimit-Reset"))
+        retry_after = _retry_after(headers.get("Retry-After"))
+
+        with self._condition:
+            state = self._state(key)
+            now = time.monotonic()
+            state.remaining = remaining
+            state.limit = limit
+
+            if response.status_code == 429:
+                state.throttled += 1
+                # prefer what GitLab tells us, otherwise back off exponentially
+                delay = retry_after or reset_in or 2 ** (state.throttled - 1)
+                state.blocked_until = max(
+                    state.blocked_until, now + min(delay, self.max_backoff)
+                )
+                state.tokens = 0.0
+            else:
+                state.throttled = 0
+                if remaining is not None and remaining <= 0 and reset_in:
+                    # quota exhausted, wait for the reset
+                    state.blocked_until = max(
+                        state.blocked_until, now + min(reset_in, self.max_backoff)
+                    )
+                    state.tokens = 0.0
+                elif remaining is not None and reset_in:
+                    # spread the remaining quota evenly until the reset
+                    state.rate = max(min(self.rate, remaining / reset_in), 0.1)
+                else:
+                    state.rate = self.rate
+
+            self._condition.notify_all()
+
+    def retry_after(self, accessToken):
+        # Seconds until the token is allowed to send again, 0 when not blocked
+        with self._condition:
+            state = self._states.get(token_key(accessToken))
+            if state is None:
+                return 0
+            return max(0.0, state.blocked_until - time.monotonic())
+
+    def queue_depth(self, accessToken):
+        # Number of requests currently waiting for this token
+        with self._condition:
+            state = self._states.get(token_key(accessToken))
+            return state.queue_depth if state else 0
+
+    def snapshot(self):
+        # Per token state, used to see which tokens are throttled
+        with self._condition:
+            now = time.monotonic()
+            return {
+                key: {
+                    "queue_depth": state.queue_depth,
+                    "rate": round(state.rate, 2),
+                    "tokens": round(min(self.burst, state.tokens), 2),
+                    "blocked_for": round(max(0.0, state.blocked_until - now), 2),
+                    "remaining": state.remaining,
+                    "limit": state.limit,
+                    "throttled": state.throttled,
+                }
+                for key, state in self._states.items()
+            }
+
+
+def _int_header(headers, name):
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+def _reset_in(value):
+    # RateLimit-Reset is a unix timestamp in GitLab responses
+    try:
+        return max(0.0, float(value) - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from time import timezone
 from .models import (
@@ -5,6 +6,8 @@ from .models import (
     TeamMemberComment,
     TeamMemberGitIntegrationData,
     TeammemberCodingStats,
+    ProjectCodingStats,
+    CodingStatsJob,
 )
 
 
@@ -46,6 +49,60 @@ class TeamMemberGitIntegrationDataSerializer(serializers.ModelSerializer):
 
 
 class TeammemberCodingStatsSerializer(serializers.ModelSerializer):
+    # the body is not serialized, it is stored apart and only read by the stats updates
     class Meta:
         model = TeammemberCodingStats
+        fields = [
+            "id",
+            "teammember",
+            "latestUpdate",
+            "counters7",
+            "counters30",
+            "previous7",
+            "previous30",
+        ]
+
+
+class ProjectCodingStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProjectCodingStats
         fields = "__all__"
+
+
+class CodingStatsRangeQuerySerializer(serializers.Serializer):
+    # Query parameters of the coding stats range endpoint
+    start = serializers.DateField()
+    end = serializers.DateField()
+    granularity = serializers.ChoiceField(
+        choices=["day", "week", "month"], default="day"
+    )
+    compare = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if data["start"] > data["end"]:
+            raise serializers.ValidationError("start must be before end.")
+        max_days = settings.CODING_STATS_ROLLUP_RETENTION_DAYS
+        if (data["end"] - data["start"]).days >= max_days:
+            raise serializers.ValidationError(
+                f"The range can not be longer than {max_days} days."
+            )
+        return data
+
+
+class CodingStatsJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CodingStatsJob
+        fields = [
+            "id",
+            "teammember",
+            "kind",
+            "status",
+            "stage",
+            "progress",
+            "result",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
@@ -0,0 +1,44 @@
+import hashlib
+import json
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+
+def coding_stats_cache_setting(name, default):
+    return getattr(settings, "CODING_STATS_CACHE", {}).get(name, default)
+
+
+def coding_stats_cache_key(teammember_id):
+    return f"team:coding-stats-detail:{teammember_id}"
+
+
+def response_etag(data):
+    # Strong ETag of the serialized data, the same stats always give the same tag
+    content = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+    return '"%s"' % hashlib.sha256(content.encode()).hexdigest()[:32]
+
+
+def get_cached_coding_stats(teammember_id, version, load):
+    # (data, etag) of the coding stats detail of the teammember, `load` returns the
+    # serialized data and is only called when the cache has no entry for `version`
+    # (the `updated` time of the stats). The worker saves the stats in another process,
+    # its invalidation does not reach the cache of the web server with a local backend
+    if not coding_stats_cache_setting("ENABLED", True):
+        data = load()
+        return data, response_etag(data)
+
+    key = coding_stats_cache_key(teammember_id)
+    entry = cache.get(key)
+    if entry is None or entry.get("version") != version:
+        data = load()
+        entry = {"version": version, "data": data, "etag": response_etag(data)}
+        cache.set(key, entry, coding_stats_cache_setting("TIMEOUT", 24 * 3600))
+    return entry["data"], entry["etag"]
+
+
+def invalidate_coding_stats_cache(teammember_id):
+    # dropped once committed, a read in the meantime could cache the old stats again
+    key = coding_stats_cache_key(teammember_id)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -1,3 +1,886 @@
-from django.test import TestCase
+import copy
+import json
+import os
+import random
+import tempfile
+import time
+import zlib
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from dashboard.models import Project
+from users.models import CustomUser
+from .aggregation import aggregate_coding_stats, numpy
+from .coding_stats import merge_coding_activity, update_coding_stats
+from .diff_cache import CommitDiffCache, get_commit_diff_cache
+from .jobs import claim_job, enqueue_coding_stats_job
+from .models import (
+    CodingStatsJob,
+    TeamMemberGitIntegrationData,
+    Teammember,
+    TeammemberCodingStats,
+    TeammemberCodingStatsBody,
+)
+from .ratelimit import GitLabRateLimiter
+from .stats_cache import coding_stats_cache_key
+from .utils import GitLabClient, get_gitlab_rate_limiter
 
-# Create your tests here.
+# Fixed "today" of the aggregation, the records are placed relative to it
+TODAY = date(2024, 3, 31)
+WINDOW_KEYS = ("counters7", "counters30", "previous7", "previous30")
+RECORDS_NAMES = ("created_mrs_data", "reviewed_mrs_data", "created_commits_data")
+
+
+def moment(days_ago, hour=12):
+    return datetime(
+        TODAY.year, TODAY.month, TODAY.day, hour, tzinfo=dt_timezone.utc
+    ) - timedelta(days=days_ago)
+
+
+def merge_request(mr_id, days_ago, hour=12, create_to_merge=None, comments=0):
+    # MR record of the body, timestamps in the "...Z" format of the MR API
+    created_at = moment(days_ago, hour)
+    merged_at = None
+    if create_to_merge is not None:
+        merged_at = created_at + timedelta(seconds=create_to_merge)
+    comment_ids = [mr_id * 100 + number for number in range(comments)]
+    comment_bodies = [f"comment {comment_id}" for comment_id in comment_ids]
+    return {
+        "mr_id": mr_id,
+        "iid": mr_id,
+        "created_at": created_at.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+        "merged_at": merged_at and merged_at.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+        "comment_ids": comment_ids or False,
+        "comment_bodies": comment_bodies or False,
+        "create_to_merge": create_to_merge,
+    }
+
+
+def commit(short_id, created_at, lines_added, lines_removed):
+    # commit record of the body, timestamps in the "...+00:00" format of the commits API
+    return {
+        "commit_short_id": short_id,
+        "created_at": created_at,
+        "commit_web_url": f"https://gitlab.example.com/-/commit/{short_id}",
+        "diff_data": [
+            {
+                "lines_added": lines_added,
+                "lines_removed": lines_removed,
+                "added_lines_content": [],
+                "removed_lines_content": [],
+            }
+        ],
+    }
+
+
+def project(project_id, created_mrs=(), reviewed_mrs=(), commits=()):
+    return {
+        "project_name": f"project-{project_id}",
+        "project_url": f"https://gitlab.example.com/group/project-{project_id}",
+        "created_mrs_data": list(created_mrs),
+        "reviewed_mrs_data": list(reviewed_mrs),
+        "created_commits_data": list(commits),
+    }
+
+
+def random_body(seed, projects):
+    # Seeded body with records spread over the 60 days of the windows
+    rng = random.Random(seed)
+    body = {}
+    mr_id = 1
+    for project_id in range(1, projects + 1):
+        created_mrs = []
+        reviewed_mrs = []
+        for number in range(rng.randint(0, 12)):
+            records = created_mrs if rng.random() < 0.6 else reviewed_mrs
+            create_to_merge = rng.choice([None, rng.randint(600, 5 * 86400)])
+            records.append(
+                merge_request(
+                    mr_id,
+                    rng.randint(0, 59),
+                    hour=rng.randint(0, 23),
+                    create_to_merge=create_to_merge,
+                    comments=rng.randint(0, 3),
+                )
+            )
+            mr_id += 1
+        commits = [
+            commit(
+                f"{project_id:04d}{number:04d}",
+                moment(rng.randint(0, 59), rng.randint(0, 23)).isoformat(),
+                rng.randint(0, 200),
+                rng.randint(0, 100),
+            )
+            for number in range(rng.randint(0, 15))
+        ]
+        body[str(project_id)] = project(project_id, created_mrs, reviewed_mrs, commits)
+    return body
+
+
+def aggregate(body):
+    return aggregate_coding_stats(copy.deepcopy(body), today=TODAY)
+
+
+class AggregateCodingStatsTests(SimpleTestCase):
+    def test_windows_are_calendar_days_in_utc(self):
+        body = {
+            "1": project(
+                1,
+                created_mrs=[
+                    merge_request(1, 6, hour=23),  # last day of the 7 days
+                    merge_request(2, 7, hour=0),  # first day of the previous 7
+                    merge_request(3, 60),  # outside of every window
+                ],
+                commits=[
+                    # 01:00 on the 25th in UTC+2 is the 24th in UTC, 7 days ago
+                    commit("a1", "2024-03-25T01:00:00+02:00", 10, 4),
+                    commit("a2", "2024-03-31T00:30:00+00:00", 3, 1),
+                ],
+            )
+        }
+        stats = aggregate(body)
+
+        self.assertEqual(stats["counters7"]["created_mrs_counter7"], 1)
+        self.assertEqual(stats["previous7"]["previous_created_mrs_counter7"], 1)
+        self.assertEqual(stats["counters30"]["created_mrs_counter30"], 2)
+        self.assertEqual(stats["previous30"]["previous_created_mrs_counter30"], 0)
+        self.assertEqual(stats["counters7"]["created_commits7"], 1)
+        self.assertEqual(stats["counters7"]["lines_added7"], 3)
+        self.assertEqual(stats["previous7"]["previous_lines_added7"], 10)
+        self.assertEqual(
+            stats["counters7"]["mrs_created_last_7_days_xAxis"],
+            [f"2024-03-{day}" for day in range(25, 32)],
+        )
+
+    def test_create_to_merge_is_the_mean_over_merged_mrs(self):
+        body = {
+            "1": project(
+                1,
+                created_mrs=[
+                    merge_request(1, 1, create_to_merge=3600),
+                    merge_request(2, 2, create_to_merge=7200),
+                    merge_request(3, 3),  # still open, not part of the mean
+                ],
+            ),
+            "2": project(2, created_mrs=[merge_request(4, 4, create_to_merge=12600)]),
+        }
+        stats = aggregate(body)
+
+        self.assertEqual(stats["counters7"]["create_to_merge7"], 7800)
+        self.assertEqual(stats["body"]["1"]["counters7"]["create_to_merge7"], 5400)
+        self.assertEqual(stats["counters7"]["active_projects7"], 2)
+
+    def test_window_counters_match_the_chart_series(self):
+        stats = aggregate(random_body(seed=1, projects=6))
+        for counters in [stats, *stats["body"].values()]:
+            for days in (7, 30):
+                window = counters[f"counters{days}"]
+                self.assertEqual(
+                    window[f"created_mrs_counter{days}"],
+                    sum(window[f"mrs_created_last_{days}_days_yAxis"]),
+                )
+                self.assertEqual(
+                    window[f"reviewed_mrs_counter{days}"],
+                    sum(window[f"mrs_reviewed_last_{days}_days_yAxis"]),
+                )
+                self.assertEqual(
+                    window[f"lines_added{days}"],
+                    sum(window[f"commits_added_lines_last_{days}_days_yAxis"]),
+                )
+                self.assertEqual(
+                    window[f"lines_removed{days}"],
+                    -sum(window[f"commits_removed_lines_last_{days}_days_yAxis"]),
+                )
+                self.assertEqual(
+                    len(window[f"mrs_created_last_{days}_days_yAxis"]), days
+                )
+
+    @skipUnless(numpy is not None, "numpy is not installed")
+    def test_numpy_and_python_paths_give_the_same_stats(self):
+        body = random_body(seed=2, projects=25)
+        with override_settings(CODING_STATS_NUMPY={"ENABLED": False}):
+            python_stats = aggregate(body)
+        with override_settings(
+            CODING_STATS_NUMPY={"ENABLED": True, "MIN_PROJECTS": 1}
+        ):
+            numpy_stats = aggregate(body)
+
+        self.assertEqual(numpy_stats, python_stats)
+
+
+def split_body(body, since):
+    # (stored, fetched) bodies, fetched holds the records created after `since`
+    stored = {}
+    fetched = {}
+    for project_id, project_data in body.items():
+        for part, keep in (
+            (stored, lambda record: record["created_at"] <= since),
+            (fetched, lambda record: record["created_at"] > since),
+        ):
+            records = {
+                records_name: [
+                    copy.deepcopy(record)
+                    for record in project_data[records_name]
+                    if keep(record)
+                ]
+                for records_name in RECORDS_NAMES
+            }
+            if any(records.values()):
+                part[project_id] = {**project(project_id), **records}
+    return stored, fetched
+
+
+class MergeCodingActivityTests(SimpleTestCase):
+    def test_update_then_aggregate_equals_a_fresh_create(self):
+        body = random_body(seed=3, projects=8)
+        # a project that only shows up in the update
+        body["9"] = project(9, created_mrs=[merge_request(900, 1, create_to_merge=60)])
+        stored, fetched = split_body(body, moment(3, 0).strftime("%Y-%m-%dT%H:%M:%S"))
+        # an MR stored while open and merged since, the update brings it in again
+        merged = merge_request(901, 20, create_to_merge=7200, comments=2)
+        body["1"]["created_mrs_data"].append(merged)
+        stored.setdefault("1", project(1))["created_mrs_data"].append(
+            merge_request(901, 20)
+        )
+        fetched.setdefault("1", project(1))["created_mrs_data"].append(merged)
+
+        updated = aggregate(merge_coding_activity(stored, fetched))
+        fresh = aggregate(body)
+
+        for window in WINDOW_KEYS:
+            self.assertEqual(updated[window], fresh[window])
+        self.assertEqual(set(updated["body"]), set(fresh["body"]))
+        for project_id, project_data in fresh["body"].items():
+            for window in WINDOW_KEYS:
+                self.assertEqual(
+                    updated["body"][project_id][window], project_data[window]
+                )
+            for records_name in RECORDS_NAMES:
+                self.assertCountEqual(
+                    updated["body"][project_id][records_name],
+                    project_data[records_name],
+                )
+
+    def test_keep_comments_adds_the_new_comments_to_the_stored_ones(self):
+        stored = {"1": project(1, created_mrs=[merge_request(1, 2, comments=2)])}
+        event = merge_request(1, 2, create_to_merge=600)
+        event["comment_ids"] = [999]
+        event["comment_bodies"] = ["new comment"]
+        body = merge_coding_activity(
+            stored, {"1": project(1, created_mrs=[event])}, keep_comments=True
+        )
+
+        record = body["1"]["created_mrs_data"][0]
+        self.assertEqual(record["comment_ids"], [100, 101, 999])
+        self.assertEqual(record["create_to_merge"], 600)
+        self.assertEqual(
+            aggregate(body)["counters7"]["comments_in_created_mrs7"], 3
+        )
+
+
+def create_teammember(email="owner@example.com", gitUserID="42"):
+    # team member with a GitLab integration, in a project of a new user
+    user = CustomUser.objects.create_user(email=email, username=email, password="pw")
+    teammember = Teammember.objects.create(
+        created_by=user,
+        project=Project.objects.create(project_owner=user, project_name="project"),
+        tm_name="Ada",
+        tm_lname="Lovelace",
+        tm_position="be_dev",
+    )
+    TeamMemberGitIntegrationData.objects.create(
+        created_by=user,
+        teammember=teammember,
+        teammemberGitHosting="GitLab",
+        teammemberGitGroupID="7",
+        teammemberGitUserID=gitUserID,
+        teammemberGitPersonalAccessToken="token",
+    )
+    teammember.refresh_from_db()
+    return teammember
+
+
+def recent_activity(*days_ago):
+    # fetched body with an MR created each of days_ago before the real today
+    today = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+    return {
+        "1": project(
+            1,
+            created_mrs=[
+                {
+                    **merge_request(number, 0),
+                    "created_at": (today - timedelta(days=days)).strftime(
+                        "%Y-%m-%dT%H:%M:%S.000Z"
+                    ),
+                }
+                for number, days in enumerate(days_ago, start=1)
+            ],
+        )
+    }
+
+
+class UpdateCodingStatsTests(TestCase):
+    def test_stats_without_a_stored_body_are_rebuilt(self):
+        teammember = create_teammember()
+        # stats saved before the body got its own table: counters but no body row
+        stats = TeammemberCodingStats.objects.create(
+            teammember=teammember,
+            latestUpdate=timezone.now() - timedelta(hours=1),
+            counters30={"created_mrs_counter30": 5},
+        )
+        self.assertFalse(stats.has_stored_body)
+
+        with mock.patch(
+            "team.coding_stats.gitlab_verification_api_call", return_value=True
+        ), mock.patch(
+            "team.coding_stats.fetch_coding_activity",
+            return_value=recent_activity(1, 10, 20),
+        ) as fetch:
+            update_coding_stats(stats)
+
+        # the whole window is fetched again, not only the latest activity
+        self.assertNotEqual(fetch.call_args.kwargs.get("dateFilter"), "updated_after")
+        stats = TeammemberCodingStats.objects.get(pk=stats.pk)
+        self.assertEqual(stats.counters30["created_mrs_counter30"], 3)
+        self.assertEqual(len(stats.body["1"]["created_mrs_data"]), 3)
+        self.assertTrue(
+            TeammemberCodingStatsBody.objects.filter(coding_stats=stats).exists()
+        )
+
+
+def gitlab_moment(days_ago):
+    # a moment of the webhook payloads, in the "...Z" format GitLab sends
+    moment = timezone.now() - timedelta(days=days_ago)
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def webhook_project():
+    return {"id": 5, "name": "api", "web_url": "https://gitlab.example.com/group/api"}
+
+
+def webhook_merge_request(merged=False):
+    return {
+        "id": 300,
+        "iid": 3,
+        "author_id": 42,
+        "created_at": gitlab_moment(2),
+        "merged_at": None,
+        "updated_at": gitlab_moment(1),
+        "state": "merged" if merged else "opened",
+    }
+
+
+@override_settings(
+    GITLAB_WEBHOOK={"SECRET_TOKEN": "secret"},
+    CODING_STATS_JOBS={"RUN_IN_BACKGROUND": False},
+)
+class GitLabWebhookTests(TestCase):
+    def setUp(self):
+        self.author = create_teammember("author@example.com", gitUserID="42")
+        self.reviewer = create_teammember("reviewer@example.com", gitUserID="43")
+        for teammember in (self.author, self.reviewer):
+            stats = TeammemberCodingStats(
+                teammember=teammember, latestUpdate=timezone.now()
+            )
+            stats.body = {}
+            stats.save()
+
+    def deliver(self, event, payload, token="secret"):
+        return self.client.post(
+            reverse("gitlab-webhook"),
+            payload,
+            content_type="application/json",
+            HTTP_X_GITLAB_TOKEN=token,
+            HTTP_X_GITLAB_EVENT=event,
+        )
+
+    def body(self, teammember):
+        return TeammemberCodingStats.objects.get(teammember=teammember).body["5"]
+
+    def test_deliveries_without_the_secret_token_are_rejected(self):
+        payload = {
+            "project": webhook_project(),
+            "object_attributes": webhook_merge_request(),
+        }
+        for token in ("wrong", ""):
+            response = self.deliver("Merge Request Hook", payload, token=token)
+            self.assertEqual(response.status_code, 403)
+        self.assertFalse(CodingStatsJob.objects.exists())
+
+    def test_merge_request_event_adds_the_mr_to_its_author_and_reviewers(self):
+        response = self.deliver(
+            "Merge Request Hook",
+            {
+                "project": webhook_project(),
+                "object_attributes": webhook_merge_request(merged=True),
+                "reviewers": [{"id": 43}],
+            },
+        )
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(response.data["jobs"]), 2)
+        created = self.body(self.author)["created_mrs_data"]
+        self.assertEqual([record["mr_id"] for record in created], [300])
+        # merged without a merged_at, the last update is the merge
+        self.assertEqual(created[0]["create_to_merge"], 86400)
+        reviewed = self.body(self.reviewer)["reviewed_mrs_data"]
+        self.assertEqual([record["iid"] for record in reviewed], [3])
+        self.assertEqual(self.body(self.reviewer)["created_mrs_data"], [])
+
+    def test_note_event_adds_the_comment_to_the_mr_of_its_author(self):
+        response = self.deliver(
+            "Note Hook",
+            {
+                "project": webhook_project(),
+                "object_attributes": {
+                    "id": 7001,
+                    "noteable_type": "MergeRequest",
+                    "note": "Looks good",
+                },
+                "merge_request": webhook_merge_request(),
+            },
+        )
+
+        self.assertEqual(response.status_code, 202)
+        record = self.body(self.author)["created_mrs_data"][0]
+        self.assertEqual(record["comment_ids"], [7001])
+        self.assertEqual(record["comment_bodies"], ["Looks good"])
+
+    def test_push_event_adds_the_commits_of_the_pusher(self):
+        commits = [
+            {
+                "id": "a1b2c3d4e5f6",
+                "timestamp": gitlab_moment(1),
+                "url": "https://gitlab.example.com/group/api/-/commit/a1b2c3d4",
+                "author": {"email": "author@example.com"},
+            },
+            {
+                # pushed along, but authored by someone else
+                "id": "ffffffff0000",
+                "timestamp": gitlab_moment(1),
+                "author": {"email": "other@example.com"},
+            },
+        ]
+        diffs = {
+            "5": [
+                {
+                    "commit_short_id": "a1b2c3d4",
+                    "diff_data": {
+                        "lines_added": 12,
+                        "lines_removed": 3,
+                        "added_lines_content": [],
+                        "removed_lines_content": [],
+                    },
+                }
+            ]
+        }
+        with mock.patch(
+            "team.webhooks.gitlab_commits_diff_api_call", return_value=diffs
+        ) as fetch_diffs:
+            response = self.deliver(
+                "Push Hook",
+                {
+                    "project": webhook_project(),
+                    "user_id": 42,
+                    "user_email": "author@example.com",
+                    "commits": commits,
+                },
+            )
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(
+            fetch_diffs.call_args.args[0]["commits_list"], {"5": ["a1b2c3d4"]}
+        )
+        created = self.body(self.author)["created_commits_data"]
+        self.assertEqual(
+            [commit["commit_short_id"] for commit in created], ["a1b2c3d4"]
+        )
+        self.assertEqual(created[0]["diff_data"][0]["lines_added"], 12)
+
+    def test_events_missing_the_fields_of_the_records_are_rejected(self):
+        mergeRequest = webhook_merge_request()
+        del mergeRequest["iid"]
+        response = self.deliver(
+            "Merge Request Hook",
+            {"project": webhook_project(), "object_attributes": mergeRequest},
+        )
+        self.assertEqual(response.status_code, 400)
+
+        response = self.deliver(
+            "Push Hook",
+            {
+                "project": webhook_project(),
+                "user_id": 42,
+                "commits": [{"id": "a1b2c3d4e5f6"}],
+            },
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CodingStatsJob.objects.exists())
+
+
+class CodingStatsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teammember = create_teammember()
+        self.stats = TeammemberCodingStats.objects.create(
+            teammember=self.teammember,
+            latestUpdate=timezone.now(),
+            counters7={"created_mrs_counter7": 1},
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.teammember.created_by)
+        self.url = reverse(
+            "teammember-coding-stats-detail", args=[self.teammember.pk]
+        )
+
+    def test_matching_etag_gets_a_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_stats_saved_by_another_process_get_a_new_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        # an update of the worker, its invalidation does not reach this cache
+        TeammemberCodingStats.objects.filter(pk=self.stats.pk).update(
+            counters7={"created_mrs_counter7": 2},
+            updated=timezone.now() + timedelta(seconds=1),
+        )
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.data["counters7"], {"created_mrs_counter7": 2})
+
+    def test_saving_the_stats_drops_the_cached_entry(self):
+        self.client.get(self.url)
+        key = coding_stats_cache_key(self.teammember.pk)
+        self.assertIsNotNone(cache.get(key))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stats.counters7 = {"created_mrs_counter7": 3}
+            self.stats.save()
+
+        self.assertIsNone(cache.get(key))
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["counters7"], {"created_mrs_counter7": 3})
+
+    @override_settings(CODING_STATS_STALENESS={"MAX_AGE": 3600})
+    def test_stale_stats_get_a_stale_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        TeammemberCodingStats.objects.filter(pk=self.stats.pk).update(
+            latestUpdate=timezone.now() - timedelta(hours=2)
+        )
+
+        response = self.client.get(self.url)
+        self.assertTrue(response.data["stale"])
+        self.assertTrue(response["ETag"].endswith('-stale"'))
+        # the same stats, served stale, are not a match of the fresh tag
+        self.assertEqual(response["ETag"], etag[:-1] + '-stale"')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CODING_STATS_STALENESS={"MAX_AGE": 3600, "RETRY_AFTER": 300})
+class CodingStatsAccessTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teammember = create_teammember("owner@example.com")
+        self.other = create_teammember("other@example.com")
+        for teammember in (self.teammember, self.other):
+            TeammemberCodingStats.objects.create(
+                teammember=teammember,
+                latestUpdate=timezone.now() - timedelta(hours=2),
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.teammember.created_by)
+
+    def detail(self, teammember):
+        return self.client.get(
+            reverse("teammember-coding-stats-detail", args=[teammember.pk])
+        )
+
+    def list_stats(self, *teammembers):
+        return self.client.get(
+            reverse("teammember-coding-stats-list"),
+            {"ids": [teammember.pk for teammember in teammembers]},
+        )
+
+    def test_stats_of_other_users_teammembers_are_not_served(self):
+        self.assertEqual(self.detail(self.other).status_code, 404)
+        response = self.list_stats(self.teammember, self.other)
+        self.assertEqual(
+            [stats["teammember"] for stats in response.data], [self.teammember.pk]
+        )
+
+        self.client.force_authenticate(None)
+        self.assertIn(self.detail(self.teammember).status_code, (401, 403))
+        self.assertIn(self.list_stats(self.teammember).status_code, (401, 403))
+        # only the owner's stale read queued an update
+        self.assertEqual(
+            list(CodingStatsJob.objects.values_list("teammember_id", flat=True)),
+            [self.teammember.pk],
+        )
+
+    def test_stale_reads_queue_a_single_update_job(self):
+        for read in range(3):
+            self.assertTrue(self.detail(self.teammember).data["stale"])
+        self.assertTrue(self.list_stats(self.teammember).data[0]["stale"])
+
+        jobs = CodingStatsJob.objects.all()
+        self.assertEqual(
+            [(job.teammember_id, job.kind) for job in jobs],
+            [(self.teammember.pk, "update")],
+        )
+        # the marker holds back the reads, not the queue: a finished job does not
+        # get a follow-up before RETRY_AFTER
+        jobs.update(status="done")
+        self.detail(self.teammember)
+        self.assertEqual(CodingStatsJob.objects.count(), 1)
+
+
+def gitlab_stand_in(activity, verified=True):
+    # the GitLab calls of the coding stats, the fetch returns the activity
+    return (
+        mock.patch(
+            "team.coding_stats.gitlab_verification_api_call", return_value=verified
+        ),
+        mock.patch("team.coding_stats.fetch_coding_activity", return_value=activity),
+    )
+
+
+class CodingStatsJobTests(TestCase):
+    def setUp(self):
+        self.teammember = create_teammember()
+        self.client = APIClient()
+        self.client.force_authenticate(self.teammember.created_by)
+
+    def create_stats(self):
+        stats = TeammemberCodingStats(
+            teammember=self.teammember,
+            latestUpdate=timezone.now() - timedelta(hours=1),
+        )
+        stats.body = {}
+        stats.save()
+        return stats
+
+    def run_worker(self, activity, verified=True):
+        verification, fetch = gitlab_stand_in(activity, verified)
+        with verification, fetch:
+            call_command("run_coding_stats_worker", "--once", stdout=StringIO())
+
+    def test_update_job_is_run_by_the_worker(self):
+        self.create_stats()
+        response = self.client.put(
+            reverse("teammember-coding-stats-update", args=[self.teammember.pk])
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["status"], "queued")
+        self.assertEqual(
+            response["Location"],
+            reverse("teammember-coding-stats-job", args=[response.data["id"]]),
+        )
+
+        self.run_worker(recent_activity(1, 2))
+
+        response = self.client.get(response["Location"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], "done")
+        self.assertEqual(response.data["progress"], 100)
+        stats = TeammemberCodingStats.objects.get(teammember=self.teammember)
+        self.assertEqual(response.data["result"]["coding_stats"], stats.pk)
+        self.assertEqual(stats.counters7["created_mrs_counter7"], 2)
+
+    def test_create_job_is_reused_while_it_waits(self):
+        url = reverse("teammember-coding-stats-create")
+        data = {"teammember": self.teammember.pk, "latestUpdate": timezone.now()}
+        first = self.client.post(url, data, format="json")
+        second = self.client.post(url, data, format="json")
+
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(
+            first["Location"],
+            reverse("teammember-coding-stats-job", args=[first.data["id"]]),
+        )
+        self.assertEqual(second.data["id"], first.data["id"])
+
+        self.run_worker(recent_activity(3))
+        stats = TeammemberCodingStats.objects.get(teammember=self.teammember)
+        self.assertEqual(stats.counters7["created_mrs_counter7"], 1)
+
+    def test_a_job_is_claimed_by_one_worker(self):
+        job, created = enqueue_coding_stats_job(
+            self.teammember.created_by, self.teammember, "update"
+        )
+        self.assertTrue(claim_job(job))
+        self.assertEqual(job.status, "running")
+        self.assertIsNotNone(job.started_at)
+        self.assertFalse(claim_job(CodingStatsJob.objects.get(pk=job.pk)))
+
+    def test_failed_job_keeps_its_error(self):
+        self.create_stats()
+        job, created = enqueue_coding_stats_job(
+            self.teammember.created_by, self.teammember, "update"
+        )
+        self.run_worker(recent_activity(1), verified=False)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+        self.assertEqual(job.error, "Git integration verification failed.")
+        self.assertIsNotNone(job.finished_at)
+        self.teammember.refresh_from_db()
+        self.assertFalse(self.teammember.teammember_hasGitIntegration)
+
+    @override_settings(CODING_STATS_JOBS={"RUN_IN_BACKGROUND": False})
+    def test_jobs_run_in_the_request_without_a_worker(self):
+        self.create_stats()
+        verification, fetch = gitlab_stand_in(recent_activity(1))
+        with verification, fetch:
+            response = self.client.put(
+                reverse("teammember-coding-stats-update", args=[self.teammember.pk])
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], "done")
+        self.assertNotIn("Location", response)
+        self.assertFalse(CodingStatsJob.objects.filter(status="queued").exists())
+
+
+def gitlab_response(status_code=200, **headers):
+    return SimpleNamespace(
+        status_code=status_code,
+        headers={name.replace("_", "-"): value for name, value in headers.items()},
+    )
+
+
+class GitLabRateLimiterTests(SimpleTestCase):
+    def timed_acquire(self, limiter, accessToken):
+        started = time.monotonic()
+        limiter.acquire(accessToken)
+        return time.monotonic() - started
+
+    def test_a_rate_of_zero_disables_the_limiter(self):
+        with self.assertRaises(ValueError):
+            GitLabRateLimiter(rate=0)
+        with mock.patch("team.utils._gitlab_rate_limiter", None), override_settings(
+            GITLAB_RATE_LIMIT={"ENABLED": True, "RATE": 0}
+        ):
+            self.assertIsNone(get_gitlab_rate_limiter())
+
+    def test_requests_wait_once_the_bucket_is_empty(self):
+        limiter = GitLabRateLimiter(rate=20, burst=2)
+        self.assertLess(self.timed_acquire(limiter, "token"), 0.02)
+        self.assertLess(self.timed_acquire(limiter, "token"), 0.02)
+        # an empty bucket gets its next token 1 / rate seconds later
+        self.assertGreater(self.timed_acquire(limiter, "token"), 0.03)
+        # every access token has its own bucket
+        self.assertLess(self.timed_acquire(limiter, "other"), 0.02)
+
+    def test_throttled_requests_wait_for_retry_after(self):
+        limiter = GitLabRateLimiter(rate=100, burst=10)
+        limiter.observe("token", gitlab_response(429, Retry_After="0.2"))
+        self.assertGreater(limiter.retry_after("token"), 0.1)
+        self.assertGreater(self.timed_acquire(limiter, "token"), 0.15)
+        self.assertEqual(limiter.retry_after("other"), 0)
+
+    def test_throttled_requests_without_retry_after_back_off_exponentially(self):
+        limiter = GitLabRateLimiter(rate=100, burst=10, max_backoff=3)
+        backoffs = []
+        for throttled in range(4):
+            limiter.observe("token", gitlab_response(429))
+            backoffs.append(round(limiter.retry_after("token")))
+        self.assertEqual(backoffs, [1, 2, 3, 3])
+        limiter.observe("token", gitlab_response(200))
+        (state,) = limiter.snapshot().values()
+        self.assertEqual(state["throttled"], 0)
+
+    def test_client_retries_throttled_requests(self):
+        client = GitLabClient(
+            rate_limiter=GitLabRateLimiter(rate=100, burst=10), max_retries=2
+        )
+        responses = [gitlab_response(429, Retry_After="0.05"), gitlab_response(200)]
+        with mock.patch.object(client, "send", side_effect=responses) as send:
+            response = client.get("https://gitlab.example.com/api/v4/user", "token")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(send.call_count, 2)
+
+
+def commit_diff(size=256):
+    # a diff of the commit diffs API, random lines compress about the same
+    return [{"diff": os.urandom(size).hex(), "new_path": "app.py"}]
+
+
+class CommitDiffCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_entries_are_stored_compressed(self):
+        cache = CommitDiffCache(self.directory)
+        diff = commit_diff()
+        cache.set(5, "a1b2c3d4", diff)
+
+        self.assertEqual(cache.get(5, "a1b2c3d4"), diff)
+        self.assertIsNone(cache.get(5, "ffffffff"))
+        self.assertIsNone(cache.get(6, "a1b2c3d4"))
+        with open(cache._path(5, "a1b2c3d4"), "rb") as cache_file:
+            self.assertEqual(json.loads(zlib.decompress(cache_file.read())), diff)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+
+    def test_corrupted_entries_are_misses(self):
+        cache = CommitDiffCache(self.directory)
+        cache.set(5, "a1b2c3d4", commit_diff())
+        with open(cache._path(5, "a1b2c3d4"), "wb") as cache_file:
+            cache_file.write(b"not zlib")
+        self.assertIsNone(cache.get(5, "a1b2c3d4"))
+
+    def test_least_recently_used_entries_are_evicted_past_the_limit(self):
+        cache = CommitDiffCache(self.directory, max_bytes=10**9)
+        shas = [f"{number:08x}" for number in range(6)]
+        diffs = {sha: commit_diff() for sha in shas}
+        written = time.time() - 1000
+        for number, sha in enumerate(shas):
+            cache.set(5, sha, diffs[sha])
+            # one second apart, oldest first
+            os.utime(cache._path(5, sha), (written + number, written + number))
+        # a read makes the second oldest entry the most recently used
+        cache.get(5, shas[1])
+
+        kept = [shas[1], shas[3], shas[4], shas[5]]
+        keptSize = sum(os.path.getsize(cache._path(5, sha)) for sha in kept)
+        # eviction stops at 90% of the limit, just above what is kept
+        cache.max_bytes = keptSize * 10 / 9 + 1
+        cache.set(5, shas[5], diffs[shas[5]])
+
+        self.assertIsNone(cache.get(5, shas[0]))
+        self.assertIsNone(cache.get(5, shas[2]))
+        for sha in kept:
+            self.assertEqual(cache.get(5, sha), diffs[sha])
+        stats = cache.stats()
+        self.assertEqual(stats["evictions"], 2)
+        self.assertEqual(stats["size_bytes"], keptSize)
+
+    def test_disabled_cache_is_not_built(self):
+        with mock.patch("team.diff_cache._commit_diff_cache", None):
+            with override_settings(GITLAB_DIFF_CACHE={"ENABLED": False}):
+                self.assertIsNone(get_commit_diff_cache())
+            with override_settings(
+                GITLAB_DIFF_CACHE={"ENABLED": True, "DIR": self.directory}
+            ):
+                cache = get_commit_diff_cache()
+                self.assertEqual(cache.directory, self.directory)
+                self.assertIs(get_commit_diff_cache(), cache)
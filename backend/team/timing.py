@@ -0,0 +1,81 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Per stage timings of a coding stats run. The job activates a StageTimings, the steps of
+# the pipeline run inside timed_stage(name) and the GitLab client reports every response
+# to the active timings. gitlab_fetch_concurrently copies the context to its threads so
+# the requests made in parallel are counted too
+_active_timings = contextvars.ContextVar("coding_stats_timings", default=None)
+
+
+class StageTimings:
+    def __init__(self):
+        self.stages = {}
+        self.current = None
+        self.lock = threading.Lock()
+
+    def get_stage(self, name):
+        return self.stages.setdefault(
+            name, {"elapsed_ms": 0.0, "requests": 0, "bytes": 0}
+        )
+
+    @contextmanager
+    def activate(self):
+        token = _active_timings.set(self)
+        try:
+            yield self
+        finally:
+            _active_timings.reset(token)
+
+    @contextmanager
+    def stage(self, name):
+        previous = self.current
+        self.current = self.get_stage(name)
+        started = time.perf_counter()
+        try:
+            yield self.current
+        finally:
+            self.current["elapsed_ms"] += (time.perf_counter() - started) * 1000
+            self.current = previous
+
+    def record_response(self, response):
+        # requests made outside of a stage are counted under "other"
+        with self.lock:
+            stage = self.current or self.get_stage("other")
+            stage["requests"] += 1
+            stage["bytes"] += len(response.content or b"")
+
+    def as_dict(self):
+        stages = {
+            name: {**stage, "elapsed_ms": round(stage["elapsed_ms"], 1)}
+            for name, stage in self.stages.items()
+        }
+        elapsed_ms = sum(stage["elapsed_ms"] for stage in stages.values())
+        stages["total"] = {
+            "elapsed_ms": round(elapsed_ms, 1),
+            "requests": sum(stage["requests"] for stage in stages.values()),
+            "bytes": sum(stage["bytes"] for stage in stages.values()),
+        }
+        return stages
+
+
+def timed_stage(name):
+    timings = _active_timings.get()
+    return timings.stage(name) if timings is not None else nullcontext()
+
+
+def record_gitlab_response(response):
+    timings = _active_timings.get()
+    if timings is not None:
+        timings.record_response(response)
+
+
+def server_timing_header(timings):
+    # Server-Timing value of stored timings (StageTimings.as_dict)
+    return ", ".join(
+        f'{name};dur={stage["elapsed_ms"]};'
+        f'desc="{stage["requests"]} requests, {stage["bytes"]} bytes"'
+        for name, stage in timings.items()
+    )
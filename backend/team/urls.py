@@ -8,11 +8,16 @@ from .views import (
     TeamMemberGitIntegrationDataListAPIView,
     TeamMemberGitIntegrationDataUpdateAPIView,
     TeamMemberGitIntegrationDataDeleteAPIView,
+    GitLabRateLimitStatusAPIView,
     TeammemberCodingStatsCreateAPIView,
     TeammemberCodingStatsListAPIView,
     TeammemberCodingStatsDetailAPIView,
     TeammemberCodingStatsUpdateAPIView,
     TeammemberCodingStatsDeleteAPIView,
+    TeammemberCodingStatsRangeAPIView,
+    ProjectCodingStatsDetailAPIView,
+    CodingStatsJobDetailAPIView,
+    GitLabWebhookAPIView,
 )
 
 router = DefaultRouter()
@@ -47,6 +52,11 @@ urlpatterns = [
         TeamMemberGitIntegrationDataDeleteAPIView.as_view(),
         name="teammember-gitintegration-delete",
     ),
+    path(
+        "gitlab-rate-limits/",
+        GitLabRateLimitStatusAPIView.as_view(),
+        name="gitlab-rate-limits",
+    ),
     # TeammemberCodingStats URLs
     path(
         "teammember-coding-stats/create/",
@@ -73,6 +83,26 @@ urlpatterns = [
         TeammemberCodingStatsDeleteAPIView.as_view(),
         name="teammember-coding-stats-delete",
     ),
+    path(
+        "teammember-coding-stats/<int:teammember_id>/range/",
+        TeammemberCodingStatsRangeAPIView.as_view(),
+        name="teammember-coding-stats-range",
+    ),
+    path(
+        "teammember-coding-stats/jobs/<int:pk>/",
+        CodingStatsJobDetailAPIView.as_view(),
+        name="teammember-coding-stats-job",
+    ),
+    path(
+        "project-coding-stats/<int:project_id>/",
+        ProjectCodingStatsDetailAPIView.as_view(),
+        name="project-coding-stats-detail",
+    ),
+    path(
+        "gitlab-webhook/",
+        GitLabWebhookAPIView.as_view(),
+        name="gitlab-webhook",
+    ),
 ]
 
 # Append router URLs (for the viewsets)
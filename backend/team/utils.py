@@ -1,5 +1,195 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from datetime import datetime
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from .diff_cache import get_commit_diff_cache
+from .metrics import record_gitlab_request
+from .ratelimit import GitLabRateLimiter
+from .timing import record_gitlab_response
+
+
+class GitLabAPIError(requests.exceptions.HTTPError):
+    # Raised while paginating when GitLab answers with a non 2xx status code
+    def __init__(self, response):
+        self.status_code = response.status_code
+        super().__init__(
+            f"GitLab API call failed with status code: {response.status_code}, response: {response.text}",
+            response=response,
+        )
+
+
+class GitLabClient:
+    # Owns one keep-alive requests.Session so that every GitLab call made during
+    # a stats refresh reuses pooled TCP+TLS connections instead of opening new ones
+    def __init__(
+        self,
+        pool_connections=10,
+        pool_maxsize=10,
+        pool_block=False,
+        headers=None,
+        timeout=30,
+        per_page=100,
+        max_pages=None,
+        max_items=None,
+        rate_limiter=None,
+        max_retries=3,
+    ):
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.per_page = per_page
+        self.max_pages = max_pages
+        self.max_items = max_items
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+
+        # pool_connections - number of hosts kept in the pool
+        # pool_maxsize - number of connections kept alive per host
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, accessToken=None, **kwargs):
+        headers = dict(kwargs.pop("headers", None) or {})
+        if accessToken:
+            headers["PRIVATE-TOKEN"] = accessToken
+        kwargs.setdefault("timeout", self.timeout)
+        if self.rate_limiter is None:
+            return self.send(url, headers, **kwargs)
+
+        # pace requests per access token and retry the ones GitLab throttled
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(accessToken)
+            response = self.send(url, headers, **kwargs)
+            self.rate_limiter.observe(accessToken, response)
+            if response.status_code != 429:
+                break
+        return response
+
+    def send(self, url, headers, **kwargs):
+        # one request, reported to the job stage timings and the process metrics
+        started = time.perf_counter()
+        try:
+            response = self.session.get(url, headers=headers, **kwargs)
+        except requests.exceptions.RequestException as error:
+            record_gitlab_request(url, time.perf_counter() - started, error=error)
+            raise
+        record_gitlab_request(url, time.perf_counter() - started, response=response)
+        record_gitlab_response(response)
+        return response
+
+    def paginate(
+        self,
+        url,
+        accessToken=None,
+        params=None,
+        per_page=None,
+        max_pages=None,
+        max_items=None,
+    ):
+        # Lazily yield the records of a GitLab list endpoint page by page,
+        # following X-Next-Page (or the Link rel="next" header as a fallback).
+        # max_pages / max_items put an optional hard cap on a single call.
+        params = dict(params or {})
+        params["per_page"] = per_page or self.per_page
+        max_pages = max_pages if max_pages is not None else self.max_pages
+        max_items = max_items if max_items is not None else self.max_items
+
+        pages = 0
+        items = 0
+        while url:
+            response = self.get(url, accessToken=accessToken, params=params)
+            if not (response.status_code >= 200 and response.status_code < 300):
+                raise GitLabAPIError(response)
+            pages += 1
+
+            for record in response.json():
+                yield record
+                items += 1
+                if max_items is not None and items >= max_items:
+                    return
+
+            if max_pages is not None and pages >= max_pages:
+                return
+
+            next_page = response.headers.get("X-Next-Page")
+            if next_page and params is not None:
+                params["page"] = next_page
+            elif "next" in response.links:
+                # the Link url already carries every query parameter
+                url = response.links["next"]["url"]
+                params = None
+            else:
+                url = None
+
+    def close(self):
+        self.session.close()
+
+
+_gitlab_client = None
+_gitlab_client_lock = threading.Lock()
+
+
+_gitlab_rate_limiter = None
+
+
+def get_gitlab_rate_limiter():
+    # Lazily build the process wide per token scheduler from settings.GITLAB_RATE_LIMIT,
+    # returns None when rate limiting is disabled or its RATE is 0
+    global _gitlab_rate_limiter
+    config = getattr(settings, "GITLAB_RATE_LIMIT", {})
+    if not config.get("ENABLED", False) or not config.get("RATE", 25):
+        return None
+    if _gitlab_rate_limiter is None:
+        _gitlab_rate_limiter = GitLabRateLimiter(
+            rate=config.get("RATE", 25),
+            burst=config.get("BURST", 50),
+            max_backoff=config.get("MAX_BACKOFF", 60),
+        )
+    return _gitlab_rate_limiter
+
+
+def get_gitlab_client():
+    # Lazily build the process wide client from settings.GITLAB_CLIENT
+    global _gitlab_client
+    if _gitlab_client is None:
+        with _gitlab_client_lock:
+            if _gitlab_client is None:
+                config = getattr(settings, "GITLAB_CLIENT", {})
+                _gitlab_client = GitLabClient(
+                    pool_connections=config.get("POOL_CONNECTIONS", 10),
+                    pool_maxsize=config.get("POOL_MAXSIZE", 10),
+                    pool_block=config.get("POOL_BLOCK", False),
+                    headers=config.get("HEADERS"),
+                    timeout=config.get("TIMEOUT", 30),
+                    per_page=config.get("PER_PAGE", 100),
+                    max_pages=config.get("MAX_PAGES"),
+                    max_items=config.get("MAX_ITEMS"),
+                    rate_limiter=get_gitlab_rate_limiter(),
+                    max_retries=getattr(settings, "GITLAB_RATE_LIMIT", {}).get(
+                        "MAX_RETRIES", 3
+                    ),
+                )
+    return _gitlab_client
+
+
+def gitlab_api_url():
+    # Base url of the GitLab REST API, point it to a stand-in server to work offline
+    return getattr(settings, "GITLAB_API_URL", "https://gitlab.com/api/v4").rstrip("/")
+
+
+def commit_stats_source():
+    # "listing" - line counts come in bulk from the commits listing (with_stats=true)
+    # "diff" - every commit diff is downloaded and parsed
+    return getattr(settings, "GITLAB_COMMIT_STATS_SOURCE", "listing")
 
 
 def gitlab_verification_api_call(data):
@@ -9,18 +199,14 @@ def gitlab_verification_api_call(data):
     accessToken = data.get("teammemberGitPersonalAccessToken")
 
     # provide api needed info
-    url = f"https://gitlab.com/api/v4/groups/{groupID}/members"
-    headers = {"PRIVATE-TOKEN": accessToken, "Content-Type": "application/json"}
+    url = f"{gitlab_api_url()}/groups/{groupID}/members"
 
-    # make API call
+    # make API call, walking the members pages only until the user is found
     try:
-        response = requests.get(url, headers=headers)
-        if response.status_code >= 200 and response.status_code < 300:
-            members = response.json()
-            member_ids = [member["id"] for member in members]
-            return str(userID) in map(str, member_ids)
-        else:
-            return False
+        members = get_gitlab_client().paginate(url, accessToken=accessToken)
+        return any(str(member["id"]) == str(userID) for member in members)
+    except GitLabAPIError:
+        return False
     except requests.exceptions.RequestException as error:
         # Handle any errors that occur during the request
         return error
@@ -33,53 +219,72 @@ def gitlab_merge_requests_api_call(data):
     userID = data.get("userID")
     accessToken = data.get("accessToken")
     data_limitation = data.get("data_limitation")
+    # incremental updates ask for the MRs updated since the latest update instead
+    dateFilter = data.get("dateFilter", "created_after")
 
     # provide api needed info
-    url = f"https://gitlab.com/api/v4/merge_requests?{requestType}={userID}&created_after={data_limitation}"
-    headers = {"PRIVATE-TOKEN": accessToken, "Content-Type": "application/json"}
+    url = f"{gitlab_api_url()}/merge_requests?{requestType}={userID}&{dateFilter}={data_limitation}"
 
     # make API call with basic error handling
     try:
-        response = requests.get(url, headers=headers)
-        if response.status_code >= 200 and response.status_code < 300:
-            data = response.json()
-            # Create a dictionary to store the MR data with MR ID as the key
-
-            mr_data_dict = {
-                record["id"]: {
-                    "project_id": record["project_id"],
-                    "iid": record["iid"],
-                    "created_at": record["created_at"],
-                    "merged_at": record.get("merged_at"),
-                    # Add create_to_merge if requesttype is author_id and merged_at is available
-                    **(
-                        {
-                            "create_to_merge": round(
-                                (
-                                    datetime.fromisoformat(
-                                        record["merged_at"].replace("Z", "+00:00")
-                                    )
-                                    - datetime.fromisoformat(
-                                        record["created_at"].replace("Z", "+00:00")
-                                    )
-                                ).total_seconds(),
-                                0,  # provide no numbers after comma
-                            )
-                        }
-                        if requestType == "author_id" and record.get("merged_at")
-                        else {}
-                    ),
-                }
-                for record in data
+        data = get_gitlab_client().paginate(url, accessToken=accessToken)
+        # Create a dictionary to store the MR data with MR ID as the key
+
+        mr_data_dict = {
+            record["id"]: {
+                "project_id": record["project_id"],
+                "iid": record["iid"],
+                "created_at": record["created_at"],
+                "merged_at": record.get("merged_at"),
+                # Add create_to_merge if requesttype is author_id and merged_at is available
+                **(
+                    {
+                        "create_to_merge": round(
+                            (
+                                datetime.fromisoformat(
+                                    record["merged_at"].replace("Z", "+00:00")
+                                )
+                                - datetime.fromisoformat(
+                                    record["created_at"].replace("Z", "+00:00")
+                                )
+                            ).total_seconds(),
+                            0,  # provide no numbers after comma
+                        )
+                    }
+                    if requestType == "author_id" and record.get("merged_at")
+                    else {}
+                ),
             }
-            return mr_data_dict
-        else:
-            return f"GitLab API call failed with status code: {response.status_code}, response: {response.text}"
+            for record in data
+        }
+        return mr_data_dict
+    except GitLabAPIError as e:
+        return str(e)
     except requests.exceptions.RequestException as e:
         # Handle any errors that occur during the request
         return {"success": False, "message": str(e)}
 
 
+def gitlab_fetch_concurrently(fetch, items, max_workers=None):
+    # Run fetch(item) for every item on a bounded thread pool and return the
+    # results in the same order as items, so callers can keep their result shapes
+    items = list(items)
+    if not items:
+        return []
+    if max_workers is None:
+        max_workers = getattr(settings, "GITLAB_CLIENT", {}).get("MAX_WORKERS", 8)
+    max_workers = max(1, min(max_workers, len(items)))
+    if max_workers == 1:
+        return [fetch(item) for item in items]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # every item runs in a copy of the caller's context (see timing.py)
+        futures = [
+            executor.submit(contextvars.copy_context().run, fetch, item)
+            for item in items
+        ]
+        return [future.result() for future in futures]
+
+
 def gitlab_project_api_call(data):
     # To make the api call you need to provide projects_list
     # get needed data to the variables
@@ -88,30 +293,34 @@ def gitlab_project_api_call(data):
 
     project_data_dict = {}
 
-    for project in projects_list:
+    def fetch_project(project):
         # provide api needed info
-        url = f"https://gitlab.com/api/v4/projects/{project}"
-        headers = {
-            "PRIVATE-TOKEN": accessToken,
-            "Content-Type": "application/json",
-        }
+        url = f"{gitlab_api_url()}/projects/{project}"
 
-        # make API call with basic error handling
+        # make API call with basic error handling, returns (project_data, error)
         try:
-            response = requests.get(url, headers=headers)
+            response = get_gitlab_client().get(url, accessToken=accessToken)
             if response.status_code >= 200 and response.status_code < 300:
                 data = response.json()
                 # Get the needed data
-                project_id = project
-                project_data_dict[project_id] = {
+                return {
                     "project_name": data["name"],
                     "project_url": data["web_url"],
-                }
+                }, None
             else:
-                return f"Project GitLab API call failed with status code: {response.status_code}, response: {response.text}"
+                return (
+                    None,
+                    f"Project GitLab API call failed with status code: {response.status_code}, response: {response.text}",
+                )
         except requests.exceptions.RequestException as e:
             # Handle any errors that occur during the request
-            return {"success": False, "message": str(e)}
+            return None, {"success": False, "message": str(e)}
+
+    results = gitlab_fetch_concurrently(fetch_project, projects_list)
+    for project, (project_data, error) in zip(projects_list, results):
+        if error is not None:
+            return error
+        project_data_dict[project] = project_data
     return project_data_dict
 
 
@@ -119,113 +328,193 @@ def gitlab_commits_created_api_call(data):
     # To make the api call you need to provide projects_list
     # get needed data to the variables
     projects_list = data.get("projects_list")
-    userID = data.get("teammemberGitUserID")
+    userID = data.get("userID") or data.get("teammemberGitUserID")
     accessToken = data.get("accessToken")
     data_limitation = data.get("data_limitation")
+    with_stats = commit_stats_source() == "listing"
 
     created_commits_data_dict = {}
 
-    for project in projects_list:
+    def fetch_project_commits(project):
         # provide api needed info
-        url = f"https://gitlab.com/api/v4/projects/{project}/repository/commits?author_id={userID}&created_after={data_limitation}"
-        headers = {
-            "PRIVATE-TOKEN": accessToken,
-            "Content-Type": "application/json",
-        }
+        # GitLab filters the commits listing by "since", keep it bounded to the same window
+        url = f"{gitlab_api_url()}/projects/{project}/repository/commits?author_id={userID}&created_after={data_limitation}&since={data_limitation}"
+        if with_stats:
+            # get the line counts of every commit in bulk with the listing
+            url += "&with_stats=true"
 
-        # make API call with basic error handling
+        # make API call with basic error handling, returns (commits_list, error)
         try:
-            response = requests.get(url, headers=headers)
-            if response.status_code >= 200 and response.status_code < 300:
-                commits = response.json()
-                # Initialize the list of commits for the project if not already present
-                if project not in created_commits_data_dict:
-                    created_commits_data_dict[project] = []
-                # Get the needed data for each commit
-                # Iterate over each commit and extract relevant details
-                for commit in commits:
-                    commit_info = {
-                        "commit_short_id": commit.get("short_id"),
-                        "created_at": commit.get("created_at"),
-                        "commit_web_url": commit.get("web_url"),
-                    }
-                    # Append each commit's data to the list for the respective project
-                    created_commits_data_dict[project].append(commit_info)
-            else:
-                return f"GitLab API call failed with status code: {response.status_code}, response: {response.text}"
+            commits = get_gitlab_client().paginate(url, accessToken=accessToken)
+            # Get the needed data for each commit
+            return [
+                {
+                    "commit_short_id": commit.get("short_id"),
+                    "created_at": commit.get("created_at"),
+                    "commit_web_url": commit.get("web_url"),
+                    **(
+                        {
+                            "lines_added": commit["stats"].get("additions", 0),
+                            "lines_removed": commit["stats"].get("deletions", 0),
+                        }
+                        if with_stats and commit.get("stats")
+                        else {}
+                    ),
+                }
+                for commit in commits
+            ], None
+        except GitLabAPIError as e:
+            return None, str(e)
         except requests.exceptions.RequestException as e:
             # Handle any errors that occur during the request
-            return {"success": False, "message": str(e)}
+            return None, {"success": False, "message": str(e)}
+
+    results = gitlab_fetch_concurrently(fetch_project_commits, projects_list)
+    for project, (commits_list, error) in zip(projects_list, results):
+        if error is not None:
+            return error
+        # Append each commit's data to the list for the respective project
+        created_commits_data_dict.setdefault(project, []).extend(commits_list)
     return created_commits_data_dict
 
 
+def diff_content_retention():
+    # "counts" - keep only the number of added / removed lines
+    # "first_n" - keep the first GITLAB_DIFF_CONTENT_MAX_LINES lines of each kind
+    # "full" - keep the content of every added / removed line
+    return getattr(settings, "GITLAB_DIFF_CONTENT_RETENTION", "counts")
+
+
+def parse_commit_diff(data, retention=None, max_lines=None):
+    if retention is None:
+        retention = diff_content_retention()
+    if retention == "counts":
+        max_lines = 0
+    elif retention == "first_n":
+        if max_lines is None:
+            max_lines = getattr(settings, "GITLAB_DIFF_CONTENT_MAX_LINES", 20)
+    else:
+        max_lines = None
+
+    # Variables to track lines added and removed
+    lines_added = 0
+    lines_removed = 0
+    added_lines_content = []
+    removed_lines_content = []
+    # Get the needed data for each changed file of the commit
+    for file_diff in data:
+        diff_text = file_diff["diff"]
+        # Split the diff into lines and count added and removed lines,
+        # the line content is only kept as far as the retention mode allows
+        for line in diff_text.splitlines():
+            if line.startswith("+") and not line.startswith("+++"):
+                if max_lines is None or lines_added < max_lines:
+                    added_lines_content.append(line[1:].strip())
+                lines_added += 1
+            elif line.startswith("-") and not line.startswith("---"):
+                if max_lines is None or lines_removed < max_lines:
+                    removed_lines_content.append(line[1:].strip())
+                lines_removed += 1
+
+    return {
+        "lines_added": lines_added,
+        "lines_removed": lines_removed,
+        "added_lines_content": added_lines_content,
+        "removed_lines_content": removed_lines_content,
+    }
+
+
 def gitlab_commits_diff_api_call(data):
     # To make the api call you need to provide projects_list
     # get needed data to the variables
     created_commits_data_dict = data
     accessToken = data.get("accessToken")
 
+    # the diff itself is only downloaded when the line content is needed,
+    # otherwise the line counts read with the commits listing are used
+    need_content = (
+        data.get("with_content", diff_content_retention() != "counts")
+        or commit_stats_source() == "diff"
+    )
+
     commits_diff_data_dict = {}
 
+    # Flatten the commits of all projects, keeping their order
+    commits_in_order = []
     for project_id, commits_list in created_commits_data_dict["commits_list"].items():
         for commit in commits_list:
+            listing_stats = None
             if isinstance(commit, dict):
                 commit_short_id = commit["commit_short_id"]
+                if not need_content and "lines_added" in commit:
+                    listing_stats = {
+                        "lines_added": commit["lines_added"],
+                        "lines_removed": commit["lines_removed"],
+                        "added_lines_content": [],
+                        "removed_lines_content": [],
+                    }
             else:
                 # Handle case where commit is a string
                 commit_short_id = commit
-            # provide api needed info
-            url = f"https://gitlab.com/api/v4/projects/{project_id}/repository/commits/{commit_short_id}/diff"
-            headers = {
-                "PRIVATE-TOKEN": accessToken,
-                "Content-Type": "application/json",
-            }
+            commits_in_order.append((project_id, commit_short_id, listing_stats))
 
-            # make API call with basic error handling
-            try:
-                response = requests.get(url, headers=headers)
-                if response.status_code >= 200 and response.status_code < 300:
-                    data = response.json()
-                    # Variables to track lines added and removed
-                    lines_added = 0
-                    lines_removed = 0
-                    added_lines_content = []
-                    removed_lines_content = []
-                    # Get the needed data for each commit
-                    for file_diff in data:
-                        diff_text = file_diff["diff"]
-                        # Split the diff into lines and count added and removed lines
-                        for line in diff_text.splitlines():
-                            if line.startswith("+") and not line.startswith("+++"):
-                                lines_added += 1
-                                added_lines_content.append(line[1:].strip())
-                            elif line.startswith("-") and not line.startswith("---"):
-                                lines_removed += 1
-                                removed_lines_content.append(line[1:].strip())
-
-                    commit_diff_info = {
-                        "lines_added": lines_added,
-                        "lines_removed": lines_removed,
-                        "added_lines_content": added_lines_content,
-                        "removed_lines_content": removed_lines_content,
-                    }
+    # Only the commits without listing stats become independent diff requests
+    commits_to_fetch = [
+        (project_id, commit_short_id)
+        for project_id, commit_short_id, listing_stats in commits_in_order
+        if listing_stats is None
+    ]
 
-                    # Append the diff data to the project's commits
-                    if project_id not in commits_diff_data_dict:
-                        commits_diff_data_dict[project_id] = []
+    diff_cache = get_commit_diff_cache()
 
-                    commits_diff_data_dict[project_id].append(
-                        {
-                            "commit_short_id": commit_short_id,
-                            "diff_data": commit_diff_info,
-                        }
-                    )
+    def fetch_commit_diff(project_commit):
+        project_id, commit_short_id = project_commit
+        # provide api needed info
+        url = f"{gitlab_api_url()}/projects/{project_id}/repository/commits/{commit_short_id}/diff"
 
-                else:
-                    return f"Failed to fetch diff for commit {commit_short_id} in project {project_id}"
-            except requests.exceptions.RequestException as e:
-                # Handle any errors that occur during the request
-                return {"success": False, "message": str(e)}
+        # a diff never changes for a given commit so check the local cache first
+        if diff_cache is not None:
+            data = diff_cache.get(project_id, commit_short_id)
+            if data is not None:
+                return parse_commit_diff(data), None
+
+        # make API call with basic error handling, returns (commit_diff_info, error)
+        try:
+            response = get_gitlab_client().get(url, accessToken=accessToken)
+            if response.status_code >= 200 and response.status_code < 300:
+                data = response.json()
+                if diff_cache is not None:
+                    diff_cache.set(project_id, commit_short_id, data)
+                return parse_commit_diff(data), None
+            else:
+                return (
+                    None,
+                    f"Failed to fetch diff for commit {commit_short_id} in project {project_id}",
+                )
+        except requests.exceptions.RequestException as e:
+            # Handle any errors that occur during the request
+            return None, {"success": False, "message": str(e)}
+
+    results = dict(
+        zip(
+            commits_to_fetch,
+            gitlab_fetch_concurrently(fetch_commit_diff, commits_to_fetch),
+        )
+    )
+    for project_id, commit_short_id, listing_stats in commits_in_order:
+        if listing_stats is not None:
+            commit_diff_info = listing_stats
+        else:
+            commit_diff_info, error = results[(project_id, commit_short_id)]
+            if error is not None:
+                return error
+        # Append the diff data to the project's commits
+        commits_diff_data_dict.setdefault(project_id, []).append(
+            {
+                "commit_short_id": commit_short_id,
+                "diff_data": commit_diff_info,
+            }
+        )
     return commits_diff_data_dict
 
 
@@ -238,36 +527,37 @@ def gitlab_mrs_comments_api_call(data):
     data_limitation = data.get("data_limitation")
     mrs_comments_data_dict = {}
 
-    for mr_id, mr in mrs_data.items():
+    def fetch_mr_comments(mr):
         mr_iid = mr["iid"]
         project_id = mr["project_id"]
 
         # provide api needed info
-        url = f"https://gitlab.com/api/v4/projects/{project_id}/merge_requests/{mr_iid}/notes?created_after={data_limitation}"
-        headers = {
-            "PRIVATE-TOKEN": accessToken,
-            "Content-Type": "application/json",
-        }
+        url = f"{gitlab_api_url()}/projects/{project_id}/merge_requests/{mr_iid}/notes?created_after={data_limitation}"
 
-        # make API call with basic error handling
+        # make API call with basic error handling, returns (comments_data, error)
         try:
-            response = requests.get(url, headers=headers)
-            if response.status_code >= 200 and response.status_code < 300:
-                data = response.json()
-                # Initialize lists to store comment IDs and bodies for this MR
-                comment_ids = []
-                comment_bodies = []
-                # Get the needed data for each commit
-                for record in data:
-                    comment_ids.append(record["id"])
-                    comment_bodies.append(record["body"])
-                mrs_comments_data_dict[mr_id] = {
-                    "comment_ids": comment_ids,
-                    "comment_bodies": comment_bodies,
-                }
-            else:
-                return f"GitLab API call failed with status code: {response.status_code}, response: {response.text}"
+            comment_ids = []
+            comment_bodies = []
+            # Get the comment IDs and bodies for this MR
+            for record in get_gitlab_client().paginate(url, accessToken=accessToken):
+                comment_ids.append(record["id"])
+                comment_bodies.append(record["body"])
+            return {
+                "comment_ids": comment_ids,
+                "comment_bodies": comment_bodies,
+            }, None
+        except GitLabAPIError as e:
+            return None, str(e)
         except requests.exceptions.RequestException as e:
             # Handle any errors that occur during the rMRequest
-            return {"success": False, "message": str(e)}
+            return None, {"success": False, "message": str(e)}
+
+    mr_ids = list(mrs_data.keys())
+    results = gitlab_fetch_concurrently(
+        fetch_mr_comments, [mrs_data[mr_id] for mr_id in mr_ids]
+    )
+    for mr_id, (comments_data, error) in zip(mr_ids, results):
+        if error is not None:
+            return error
+        mrs_comments_data_dict[mr_id] = comments_data
     return mrs_comments_data_dict
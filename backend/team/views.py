@@ -1,21 +1,29 @@
 import requests
-from datetime import datetime, timedelta
+from datetime import timedelta
+from django.conf import settings
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.http import parse_etags
+from core.pagination import OptInCursorPagination
 from .models import (
     Teammember,
     TeamMemberComment,
     TeamMemberGitIntegrationData,
     TeammemberCodingStats,
+    ProjectCodingStats,
+    CodingStatsJob,
 )
-from django.forms.models import model_to_dict
 from .serializers import (
     TeammemberSerializer,
     TeamMemberCommentSerializer,
     TeamMemberGitIntegrationDataSerializer,
     TeammemberCodingStatsSerializer,
+    CodingStatsRangeQuerySerializer,
+    ProjectCodingStatsSerializer,
+    CodingStatsJobSerializer,
 )
 from rest_framework import viewsets, permissions, response, status
-from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
 
 from rest_framework.generics import (
     CreateAPIView,
@@ -24,29 +32,50 @@ from rest_framework.generics import (
     RetrieveAPIView,
     DestroyAPIView,
 )
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.views import APIView
 from .utils import (
+    get_gitlab_rate_limiter,
     gitlab_verification_api_call,
-    gitlab_merge_requests_api_call,
-    gitlab_project_api_call,
-    gitlab_commits_created_api_call,
-    gitlab_commits_diff_api_call,
-    gitlab_mrs_comments_api_call,
+)
+from .jobs import (
+    ACTIVE_JOB_STATUSES,
+    enqueue_coding_stats_job,
+    is_coding_stats_stale,
+    refresh_stale_coding_stats,
+)
+from .activity_store import coding_activity_range
+from .stats_cache import get_cached_coding_stats
+from .timing import server_timing_header
+from .webhooks import (
+    GITLAB_WEBHOOK_EVENTS,
+    GitLabWebhookPayloadError,
+    gitlab_webhook_activity,
+    gitlab_webhook_integrations,
+    gitlab_webhook_token_valid,
 )
 
 
 class TeammemberViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = TeammemberSerializer
+    pagination_class = OptInCursorPagination
+    cursor_ordering = ("tm_lname", "id")
 
     def get_queryset(self):
         # Filter queryset to only include team members created by the authenticated user
         user = self.request.user
-        return Teammember.objects.filter(created_by=user).order_by("tm_lname")
+        return Teammember.objects.filter(created_by=user).order_by(
+            *self.cursor_ordering
+        )
 
     def list(self, request, *args, **kwargs):
-        # List all team members for the authenticated user
+        # List the team members of the authenticated user, a page of them when asked
         queryset = self.get_queryset()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.serializer_class(page, many=True)
+            return self.get_paginated_response(serializer.data)
         serializer = self.serializer_class(queryset, many=True)
         return response.Response(serializer.data)
 
@@ -90,11 +119,15 @@ class TeammemberViewSet(viewsets.ModelViewSet):
 class TeammemberCommentViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = TeamMemberCommentSerializer
+    pagination_class = OptInCursorPagination
+    cursor_ordering = ("-id",)
 
     def get_queryset(self):
         # Filter queryset to only include comments created by the authenticated user
         user = self.request.user
-        return TeamMemberComment.objects.filter(created_by=user).order_by("-id")
+        return TeamMemberComment.objects.filter(created_by=user).order_by(
+            *self.cursor_ordering
+        )
 
     def list(self, request, *args, **kwargs):
         # Get the 'id' parameter from the query parameters
@@ -119,6 +152,10 @@ class TeammemberCommentViewSet(viewsets.ModelViewSet):
         if not queryset.exists():
             raise NotFound(detail="No comments found for the specified teammember id.")
 
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.serializer_class(page, many=True)
+            return self.get_paginated_response(serializer.data)
         serializer = self.serializer_class(queryset, many=True)
         return response.Response(serializer.data)
 
@@ -204,11 +241,13 @@ class TeamMemberGitIntegrationDataDetailAPIView(RetrieveAPIView):
 class TeamMemberGitIntegrationDataListAPIView(ListAPIView):
     serializer_class = TeamMemberGitIntegrationDataSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OptInCursorPagination
+    cursor_ordering = ("-pk",)
 
     def get_queryset(self):
         user = self.request.user
         return TeamMemberGitIntegrationData.objects.filter(created_by=user).order_by(
-            "-pk"
+            *self.cursor_ordering
         )
 
 
@@ -240,44 +279,91 @@ class TeamMemberGitIntegrationDataDeleteAPIView(DestroyAPIView):
     permission_classes = [IsAuthenticated]
 
 
+class GitLabRateLimitStatusAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        # Per access token queue depth and pacing of the GitLab request scheduler
+        rate_limiter = get_gitlab_rate_limiter()
+        if rate_limiter is None:
+            return response.Response({"enabled": False, "tokens": {}})
+        return response.Response({"enabled": True, "tokens": rate_limiter.snapshot()})
+
+
+# Counter groups the coding stats list can return, picked with ?fields=
+CODING_STATS_LIST_FIELDS = ["counters7", "counters30", "previous7", "previous30"]
+CODING_STATS_LIST_DEFAULT_FIELDS = ["counters7", "counters30"]
+
+
 class TeammemberCodingStatsListAPIView(ListAPIView):
     serializer_class = TeammemberCodingStatsSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_fields(self):
+        # ?fields=counters7,previous7 (or repeated fields=), counters7 and counters30 by default
+        fields = [
+            field
+            for value in self.request.query_params.getlist("fields")
+            for field in value.split(",")
+            if field
+        ]
+        unknownFields = [
+            field for field in fields if field not in CODING_STATS_LIST_FIELDS
+        ]
+        if unknownFields:
+            raise ValidationError(
+                {"fields": f"Unknown fields: {', '.join(unknownFields)}."}
+            )
+        return fields or CODING_STATS_LIST_DEFAULT_FIELDS
 
     def get_queryset(self):
         # Get the list of team member IDs from the request query parameters
         teammember_ids = self.request.query_params.getlist("ids")
+        if not all(teammember_id.isdigit() for teammember_id in teammember_ids):
+            raise ValidationError({"ids": "Team member ids must be integers."})
 
-        # Filter the queryset based on the provided IDs
+        # Filter the queryset based on the provided IDs, of the user's teammembers only
         if teammember_ids:
             return TeammemberCodingStats.objects.filter(
-                teammember_id__in=teammember_ids
+                teammember_id__in=teammember_ids,
+                teammember__created_by=self.request.user,
             )
         return (
             TeammemberCodingStats.objects.none()
         )  # Return an empty queryset if no IDs are provided
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-
-        # Create a custom response to include only the required fields
-        response_data = [
-            {
-                "teammember": coding_stat.teammember.id,  # Assuming you want the team member ID
-                "counters7": coding_stat.counters7,
-                "counters30": coding_stat.counters30,
-            }
-            for coding_stat in queryset
-        ]
+        # Only the requested counter columns are read, in a single query
+        fields = self.get_fields()
+        rows = self.get_queryset().values("teammember_id", "latestUpdate", *fields)
+
+        response_data = []
+        staleTeammembers = []
+        for row in rows:
+            stale = is_coding_stats_stale(row.pop("latestUpdate"))
+            if stale:
+                staleTeammembers.append(row["teammember_id"])
+            response_data.append(
+                {"teammember": row.pop("teammember_id"), **row, "stale": stale}
+            )
+
+        # stale stats are returned as they are, update jobs refresh them in the background
+        refresh_stale_coding_stats(request.user, staleTeammembers)
 
         return response.Response(response_data, status=status.HTTP_200_OK)
 
-    # example: http://127.0.0.1:8000/team/teammember-coding-stats/?ids=8&ids=9
+    # example: http://127.0.0.1:8000/team/teammember-coding-stats/?ids=8&ids=9&fields=counters7,previous7
 
 
 class TeammemberCodingStatsDetailAPIView(RetrieveAPIView):
-    queryset = TeammemberCodingStats.objects.all()
     serializer_class = TeammemberCodingStatsSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        # Only the stats of the teammembers of the authenticated user
+        return TeammemberCodingStats.objects.filter(
+            teammember__created_by=self.request.user
+        )
 
     def get_object(self):
         # Get the team member ID from the URL parameters
@@ -285,7 +371,7 @@ class TeammemberCodingStatsDetailAPIView(RetrieveAPIView):
 
         # Retrieve the CodingStats instance based on the teammember ID
         try:
-            return TeammemberCodingStats.objects.get(teammember_id=teammember_id)
+            return self.get_queryset().get(teammember_id=teammember_id)
         except TeammemberCodingStats.DoesNotExist:
             # Handle the case where the team member coding stats do not exist
             raise NotFound(
@@ -293,1113 +379,99 @@ class TeammemberCodingStatsDetailAPIView(RetrieveAPIView):
             )
 
     def retrieve(self, request, *args, **kwargs):
-        # Call the superclass retrieve method to get the object
-        coding_stats = self.get_object()
-        serializer = self.get_serializer(coding_stats)
-
-        # Remove the `body` field from the serialized data
-        data = serializer.data
-        data.pop("body", None)
-
-        # Return the serialized data
-        return response.Response(data, status=status.HTTP_200_OK)
-
-
-class TeammemberCodingStatsCreateAPIView(CreateAPIView):
-    queryset = TeammemberCodingStats.objects.all()
-    serializer_class = TeammemberCodingStatsSerializer
-    permission_classes = [permissions.IsAuthenticated]
-
-    def perform_create(self, serializer):
-        user = self.request.user
-        body = {}
-        teammember_id = self.request.data.get("teammember")
-        # get related teammember integration data and define what
-        teammember = get_object_or_404(Teammember, pk=teammember_id, created_by=user)
-        gitIntegrationData = TeamMemberGitIntegrationData.objects.filter(
-            teammember=teammember
-        ).first()
-
-        # set date limes to 30 days ago and convert to needed format
-        data_limitation30 = str(datetime.today() - timedelta(days=30))
-        dt_object30 = datetime.strptime(data_limitation30, "%Y-%m-%d %H:%M:%S.%f")
-        data_limitation_iso_format30 = dt_object30.strftime("%Y-%m-%dT%H:%M:%SZ")
-
-        # set date limes to 60 days ago and convert to needed format
-        data_limitation60 = str(datetime.today() - timedelta(days=60))
-        dt_object60 = datetime.strptime(data_limitation60, "%Y-%m-%d %H:%M:%S.%f")
-        data_limitation_iso_format60 = dt_object60.strftime("%Y-%m-%dT%H:%M:%SZ")
-
-        # set date limes to 7 days ago and convert to needed format
-        data_limitation7 = str(datetime.today() - timedelta(days=7))
-        dt_object7 = datetime.strptime(data_limitation7, "%Y-%m-%d %H:%M:%S.%f")
-        data_limitation7_iso_format = dt_object7.strftime("%Y-%m-%dT%H:%M:%SZ")
-
-        # set date limes to 14 days ago and convert to needed format
-        data_limitation14 = str(datetime.today() - timedelta(days=14))
-        dt_object14 = datetime.strptime(data_limitation14, "%Y-%m-%d %H:%M:%S.%f")
-        data_limitation14_iso_format = dt_object14.strftime("%Y-%m-%dT%H:%M:%SZ")
-
-        # Add the 'data_limitation_iso_format' to the dictionary to use in api calls
-        if gitIntegrationData:
-            # Prepare the apiCallsInput
-            apiCallsInput = {
-                "groupID": gitIntegrationData.teammemberGitGroupID,
-                "userID": gitIntegrationData.teammemberGitUserID,
-                "accessToken": gitIntegrationData.teammemberGitPersonalAccessToken,
-                "data_limitation": data_limitation_iso_format60,
-            }
-
-        # Make created mrs api call with gitlab_merge_requests_api_call
-        apiCallsInput["requestType"] = "author_id"
-        created_mrs_data = gitlab_merge_requests_api_call(apiCallsInput)
-
-        # Make reviewed mrs api call with gitlab_merge_requests_api_call
-        apiCallsInput["requestType"] = "reviewer_id"
-        reviewed_mrs_data = gitlab_merge_requests_api_call(apiCallsInput)
-        del apiCallsInput["requestType"]
-
-        # 3. Extract MR IDs and prepare the list for mrs_list
-        mrs_ids = set()  # Use a set to avoid duplicate IDs
-
-        # Add created MRs IDs to the set
-        for mr_id in created_mrs_data.keys():
-            mrs_ids.add(mr_id)
-
-        # Convert the set to a list and add to apiCallsInput
-        apiCallsInput["mrs_list"] = list(mrs_ids)
-
-        # Make projects api call with gitlab_project_api_call
-        merged_project_ids = set()
-        for mr_id, mr_info in created_mrs_data.items():
-            project_id = mr_info.get("project_id")
-            if project_id:
-                merged_project_ids.add(project_id)  # Add to the set to avoid duplicates
-        for mr_id, mr_info in reviewed_mrs_data.items():
-            project_id = mr_info.get("project_id")
-            if project_id:
-                merged_project_ids.add(project_id)  # Add to the set to avoid duplicates
-
-        # Convert the set to a list and add it to api calls input
-        merged_project_ids_list = list(merged_project_ids)
-        apiCallsInput["projects_list"] = merged_project_ids_list
-
-        # Make Project api call
-        mrs_projects_data = gitlab_project_api_call(apiCallsInput)
-        del apiCallsInput["mrs_list"]
-
-        # Make commits created api call with gitlab_commits_created_api_call
-        commits_created_data = gitlab_commits_created_api_call(apiCallsInput)
-        del apiCallsInput["projects_list"]
-
-        # Make commits difference api call with gitlab_commits_diff_api_call
-        # apiCallsInput["commits_list"] = created_commits_data_dict
-        apiCallsInput["commits_list"] = commits_created_data
-        commits_diffs_data = gitlab_commits_diff_api_call(apiCallsInput)
-        del apiCallsInput["commits_list"]
-
-        # Fetch MRs comments api call with gitlab_commits_diff_api_call
-        # Combine both dictionaries
-        combined_mrs_data = created_mrs_data.copy()  # Start with created_mrs_data
-        combined_mrs_data.update(reviewed_mrs_data)  # Merge in reviewed_mrs_data
-        apiCallsInput["mrs_data"] = combined_mrs_data
-        mrs_comments_data = gitlab_mrs_comments_api_call(apiCallsInput)
-
-        # Structure the data in a reasonable way
-        # Adding the project data to the body and initializing the groups of data to be provided later
-        for project_id, project_data in mrs_projects_data.items():
-            body[project_id] = {
-                "project_name": project_data["project_name"],
-                "project_url": project_data["project_url"],
-                "created_mrs_data": [],
-                "reviewed_mrs_data": [],
-                "created_commits_data": [],
-            }
-
-        # Before adding MRs data - merge the comments and the MRs info into one variable
-        for mr_id, comment_data in mrs_comments_data.items():
-            # Check if the MR ID exists in the created_mrs_data
-            if mr_id in created_mrs_data:
-                # Add the comment data to the respective MR in created_mrs_data
-                created_mrs_data[mr_id]["comment_ids"] = comment_data["comment_ids"]
-                created_mrs_data[mr_id]["comment_bodies"] = comment_data[
-                    "comment_bodies"
-                ]
-
-        for mr_id, comment_data in mrs_comments_data.items():
-            # Check if the MR ID exists in the reviewed_mrs_data
-            if mr_id in reviewed_mrs_data and mr_id not in created_mrs_data:
-                # Add the comment data to the respective MR in reviewed_mrs_data
-                reviewed_mrs_data[mr_id]["comment_ids"] = comment_data["comment_ids"]
-                reviewed_mrs_data[mr_id]["comment_bodies"] = comment_data[
-                    "comment_bodies"
-                ]
-
-        # Add the MR data to the 'created_mrs_data' list for that project
-        # initialise variable for mrs chart created at data and counting the timeframes
-        today = datetime.now()
-        last_7_days = today - timedelta(days=7)
-        last_30_days = today - timedelta(days=30)
-        previous_7_days = today - timedelta(days=14)
-        previous_30_days = today - timedelta(days=60)
-
-        # Initialize the specified time sets
-        mrs_created_last_7_days_data = {}
-        mrs_created_last_30_days_data = {}
-        mrs_reviewed_last_7_days_data = {}
-        mrs_reviewed_last_30_days_data = {}
-        mrs_created_previous_7_days_data = {}
-        mrs_created_previous_30_days_data = {}
-        mrs_reviewed_previous_7_days_data = {}
-        mrs_reviewed_previous_30_days_data = {}
-        mr_created_chart_data = {}
-
-        for i in range(30):
-            date = today - timedelta(days=i)  # Subtract i days from today
-            date_str = date.strftime("%Y-%m-%d")  # Format the date as "YYYY-MM-DD"
-            mr_created_chart_data[date_str] = 0  # Initialize with value 0
-
-        # Reverse the dictionary to have the latest date as the last item
-        mr_created_chart_data = dict(reversed(list(mr_created_chart_data.items())))
-
-        for mr_id, mr_data in created_mrs_data.items():
-            project_id = mr_data["project_id"]
-
-            # check if there are comments for the mr
-            if not mr_data.get("comment_ids"):
-                mr_data["comment_ids"] = False
-            if not mr_data.get("comment_bodies"):
-                mr_data["comment_bodies"] = False
-
-            # Check if the project_id exists in the body
-            body[project_id]["created_mrs_data"].append(
-                {
-                    "mr_id": mr_id,
-                    "iid": mr_data["iid"],
-                    "created_at": mr_data["created_at"],
-                    "merged_at": mr_data["merged_at"],
-                    "create_to_merge": mr_data["create_to_merge"],
-                    "comment_ids": mr_data["comment_ids"],
-                    "comment_bodies": mr_data["comment_bodies"],
-                }
+        # Serialized stats come from the cache, only their `updated` time is read to
+        # check the entry is current. Clients sending the ETag they have get a 304
+        teammember_id = self.kwargs.get("teammember_id")
+        row = (
+            self.get_queryset()
+            .filter(teammember_id=teammember_id)
+            .values("updated", "latestUpdate")
+            .first()
+        )
+        if row is None:
+            raise NotFound(
+                detail="Coding stats not found for the specified team member."
             )
+        data, etag = get_cached_coding_stats(
+            teammember_id,
+            row["updated"].isoformat(),
+            lambda: dict(self.get_serializer(self.get_object()).data),
+        )
 
-            # Generate data for MRs chart - created MRs
-            created_at_simplified = datetime.strptime(
-                mr_data["created_at"], "%Y-%m-%dT%H:%M:%S.%fZ"
-            ).strftime("%Y-%m-%d")
-
-            if created_at_simplified in mr_created_chart_data:
-                mr_created_chart_data[created_at_simplified] += 1
-
-        # Add the MR data to the 'reviewed_mrs_data' list for that project
-        # initialise variable for mrs chart reviewed at data
-        mr_reviewed_chart_data = {}
-
-        for i in range(30):
-            date = today - timedelta(days=i)  # Subtract i days from today
-            date_str = date.strftime("%Y-%m-%d")  # Format the date as "YYYY-MM-DD"
-            mr_reviewed_chart_data[date_str] = 0  # Initialize with value 0
-
-        # Reverse the dictionary to have the latest date as the last item
-        mr_reviewed_chart_data = dict(reversed(list(mr_reviewed_chart_data.items())))
-
-        for mr_id, mr_data in reviewed_mrs_data.items():
-            project_id = mr_data["project_id"]
-
-            # Check if there are comments for the mr
-            if not mr_data.get("comment_ids"):
-                mr_data["comment_ids"] = False
-            if not mr_data.get("comment_bodies"):
-                mr_data["comment_bodies"] = False
-
-            # Check if the project_id exists in the body
-            body[project_id]["reviewed_mrs_data"].append(
-                {
-                    "mr_id": mr_id,
-                    "iid": mr_data["iid"],
-                    "created_at": mr_data["created_at"],
-                    "merged_at": mr_data["merged_at"],
-                    "comment_ids": mr_data["comment_ids"],
-                    "comment_bodies": mr_data["comment_bodies"],
-                }
+        # stale stats are served right away while an update job refreshes them,
+        # the flag is part of the ETag so clients see it change
+        stale = is_coding_stats_stale(row["latestUpdate"])
+        if stale:
+            refresh_stale_coding_stats(request.user, [teammember_id])
+            etag = etag[:-1] + '-stale"'
+        data = {**data, "stale": stale}
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+        ifNoneMatch = parse_etags(request.headers.get("If-None-Match", ""))
+        if etag in ifNoneMatch or "*" in ifNoneMatch:
+            return response.Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers=headers
             )
 
-            # Generate data for MRs chart - created MRs
-            created_at_simplified = datetime.strptime(
-                mr_data["created_at"], "%Y-%m-%dT%H:%M:%S.%fZ"
-            ).strftime("%Y-%m-%d")
-
-            if created_at_simplified in mr_reviewed_chart_data:
-                mr_reviewed_chart_data[created_at_simplified] += 1
-
-        for date_str, value in mr_created_chart_data.items():
-            date = datetime.strptime(date_str, "%Y-%m-%d")  # Convert string to datetime
-            if date >= last_7_days:
-                mrs_created_last_7_days_data[date_str] = value  # Add to 7 days set
-            if date <= last_7_days and date >= previous_7_days:
-                mrs_created_previous_7_days_data[date_str] = value
-            if date >= last_30_days:
-                mrs_created_last_30_days_data[date_str] = value  # Add to 30 days set
-            if date <= last_30_days and date >= previous_30_days:
-                mrs_created_previous_30_days_data[date_str] = value
-
-        for date_str, value in mr_reviewed_chart_data.items():
-            date = datetime.strptime(date_str, "%Y-%m-%d")  # Convert string to datetime
-            if date >= last_7_days:
-                mrs_reviewed_last_7_days_data[date_str] = value  # Add to 7 days set
-            if date <= last_7_days and date >= previous_7_days:
-                mrs_reviewed_previous_7_days_data[date_str] = value
-            if date >= last_30_days:
-                mrs_reviewed_last_30_days_data[date_str] = value  # Add to 30 days set
-            if date <= last_30_days and date >= previous_30_days:
-                mrs_reviewed_previous_30_days_data[date_str] = value
-
-        # Convert to lists to easly render the chart
-        last_7_days_xAxis = list(mrs_created_last_7_days_data.keys())
-        mrs_created_last_7_days_yAxis = list(mrs_created_last_7_days_data.values())
-        last_30_days_xAxis = list(mrs_created_last_30_days_data.keys())
-        mrs_created_last_30_days_yAxis = list(mrs_created_last_30_days_data.values())
-        mrs_reviewed_last_7_days_yAxis = list(mrs_reviewed_last_7_days_data.values())
-        mrs_reviewed_last_30_days_yAxis = list(mrs_reviewed_last_30_days_data.values())
-
-        # Add the Commit data to the 'created_commits_data' list for that project and initialize diff data
-        for project_id, commit_data_list in commits_created_data.items():
-            # Ensure the project ID exists in the body
-            if project_id not in body:
-                body[project_id] = {"created_commits_data": []}
-
-            for commit_data in commit_data_list:
-                body[project_id]["created_commits_data"].append(
-                    {
-                        "commit_short_id": commit_data["commit_short_id"],
-                        "created_at": commit_data["created_at"],
-                        "commit_web_url": commit_data["commit_web_url"],
-                        "diff_data": [],  # Initialize as an empty list
-                    }
-                )
-
-        # Add the commit diff data
-        for project_id, commit_comments_data_list in commits_diffs_data.items():
-            for commit_comments_data in commit_comments_data_list:
-                # Find the correct commit in the body's created_commits_data list
-                for commit in body[project_id]["created_commits_data"]:
-                    if (
-                        commit["commit_short_id"]
-                        == commit_comments_data["commit_short_id"]
-                    ):
-                        # Access 'diff_data' from commit_comments_data
-                        diff_data = commit_comments_data["diff_data"]
-
-                        # Append diff data to the respective commit's diff_data list
-                        commit["diff_data"].append(
-                            {
-                                "lines_added": diff_data["lines_added"],
-                                "lines_removed": diff_data["lines_removed"],
-                                "added_lines_content": diff_data["added_lines_content"],
-                                "removed_lines_content": diff_data[
-                                    "removed_lines_content"
-                                ],
-                            }
-                        )
-
-        active_projects30_list = []
-        active_projects7_list = []
-        # Loop through each project to get number of projects
-        for project, project_data in body.items():
-            # initialize the stats
-            active_projects30 = created_mrs_counter30 = reviewed_mrs_counter30 = (
-                create_to_merge30
-            ) = create_to_merge30sum = comments_in_created_mrs30 = created_commits30 = (
-                lines_added30
-            ) = lines_removed30 = 0
-
-            previous_active_projects30 = previous_created_mrs_counter30 = (
-                previous_reviewed_mrs_counter30
-            ) = previous_create_to_merge30 = previous_create_to_merge30sum = (
-                previous_comments_in_created_mrs30
-            ) = previous_created_commits30 = previous_lines_added30 = (
-                previous_lines_removed30
-            ) = 0
-
-            active_projects7 = created_mrs_counter7 = reviewed_mrs_counter7 = (
-                create_to_merge7
-            ) = create_to_merge7sum = comments_in_created_mrs7 = created_commits7 = (
-                lines_added7
-            ) = lines_removed7 = 0
-
-            previous_active_projects7 = previous_created_mrs_counter7 = (
-                previous_reviewed_mrs_counter7
-            ) = previous_create_to_merge7 = previous_create_to_merge7sum = (
-                previous_comments_in_created_mrs7
-            ) = previous_created_commits7 = previous_lines_added7 = (
-                previous_lines_removed7
-            ) = 0
-
-            # Loop through each MR created to count active projects
-            for created_mr in project_data["created_mrs_data"]:
-                if created_mr["created_at"] > data_limitation7_iso_format:
-                    create_to_merge7sum += created_mr["create_to_merge"]
-                    create_to_merge30sum += created_mr["create_to_merge"]
-                    created_mrs_counter7 += 1
-                    created_mrs_counter30 += 1
-
-                    # generate project set of data
-                    temp_project_name = mrs_projects_data[project]["project_name"]
-                    temp_project_url = mrs_projects_data[project]["project_url"]
-                    project_info = {
-                        project: {
-                            "project_name": temp_project_name,
-                            "project_url": temp_project_url,
-                        }
-                    }
-
-                    if project_info not in active_projects7_list:
-                        active_projects7_list.append(project_info)
-                    if project_info not in active_projects30_list:
-                        active_projects30_list.append(project_info)
-
-                    for comment in created_mr["comment_ids"]:
-                        comments_in_created_mrs7 += 1
-                        comments_in_created_mrs30 += 1
-
-                if (
-                    data_limitation7_iso_format
-                    > created_mr["created_at"]
-                    > data_limitation_iso_format30
-                ):
-                    # generate project set of data
-                    temp_project_name = mrs_projects_data[project]["project_name"]
-                    temp_project_url = mrs_projects_data[project]["project_url"]
-                    project_info = {
-                        project: {
-                            "project_name": temp_project_name,
-                            "project_url": temp_project_url,
-                        }
-                    }
-
-                    create_to_merge30sum += created_mr["create_to_merge"]
-                    if project_info not in active_projects30_list:
-                        active_projects30_list.append(project_info)
-                    created_mrs_counter30 += 1
-                    for comment in created_mr["comment_ids"]:
-                        comments_in_created_mrs30 += 1
-                if (
-                    data_limitation7_iso_format
-                    > created_mr["created_at"]
-                    > data_limitation14_iso_format
-                ):
-                    previous_created_mrs_counter7 += 1
-                    previous_create_to_merge7sum += created_mr["create_to_merge"]
-                    for comment in created_mr["comment_ids"]:
-                        previous_comments_in_created_mrs7 += 1
-
-                if (
-                    data_limitation_iso_format30
-                    > created_mr["created_at"]
-                    > data_limitation_iso_format60
-                ):
-                    previous_create_to_merge30sum += created_mr["create_to_merge"]
-                    previous_created_mrs_counter30 += 1
-                    for comment in created_mr["comment_ids"]:
-                        previous_comments_in_created_mrs30 += 1
-
-                if created_mrs_counter30 == 0:
-                    create_to_merge30 = 0
-                else:
-                    create_to_merge30 = create_to_merge30sum / created_mrs_counter30
-
-                if previous_created_mrs_counter30 == 0:
-                    previous_create_to_merge30 = 0
-                else:
-                    previous_create_to_merge30 = (
-                        previous_created_mrs_counter30 / previous_created_mrs_counter30
-                    )
-
-                if created_mrs_counter7 == 0:
-                    create_to_merge7 = 0
-                else:
-                    create_to_merge7 = create_to_merge7sum / created_mrs_counter7
-
-                if previous_created_mrs_counter7 == 0:
-                    previous_create_to_merge7 = 0
-                else:
-                    previous_create_to_merge7 = (
-                        previous_create_to_merge7sum / previous_created_mrs_counter7
-                    )
-
-            # Loop through each MR reviewed
-            for reviewed_mr in project_data["reviewed_mrs_data"]:
-                if reviewed_mr["created_at"] > data_limitation7_iso_format:
-                    reviewed_mrs_counter7 += 1
-                    reviewed_mrs_counter30 += 1
-                elif (
-                    data_limitation7_iso_format
-                    > reviewed_mr["created_at"]
-                    > data_limitation_iso_format30
-                ):
-                    reviewed_mrs_counter30 += 1
-
-                if (
-                    data_limitation7_iso_format
-                    > reviewed_mr["created_at"]
-                    > data_limitation14_iso_format
-                ):
-                    previous_reviewed_mrs_counter7 += 1
-                elif (
-                    data_limitation_iso_format30
-                    > reviewed_mr["created_at"]
-                    > data_limitation_iso_format60
-                ):
-                    previous_reviewed_mrs_counter30 += 1
-
-            # If there were MRs created or reviewed - count as an active project
-            if created_mrs_counter7 > 0 or reviewed_mrs_counter7 > 0:
-                active_projects7 += 1
-            if created_mrs_counter30 > 0 or reviewed_mrs_counter30 > 0:
-                active_projects30 += 1
-            if previous_created_mrs_counter7 > 0 or previous_reviewed_mrs_counter7 > 0:
-                previous_active_projects7 += 1
-            if (
-                previous_created_mrs_counter30 > 0
-                or previous_reviewed_mrs_counter30 > 0
-            ):
-                previous_active_projects30 += 1
-
-            # Initialise the commit chart data
-            commit_chart_data = {
-                (today - timedelta(days=i)).strftime("%Y-%m-%d"): [0, 0]
-                for i in range(30)
-            }
+        # Return the serialized data, the body is not part of it
+        return response.Response(data, status=status.HTTP_200_OK, headers=headers)
 
-            # Reverse the dictionary to have the latest date as the last item
-            commit_chart_data = dict(reversed(list(commit_chart_data.items())))
-            commits_added_lines_last_30_days_yAxis = []
-            commits_removed_lines_last_30_days_yAxis = []
-            commits_added_lines_last_7_days_yAxis = []
-            commits_removed_lines_last_7_days_yAxis = []
-
-            # Loop through each Commit created
-            for commit in project_data["created_commits_data"]:
-                if commit["created_at"] > data_limitation7_iso_format:
-                    created_commits7 += 1
-                    created_commits30 += 1
-
-                    # provide simmplified date for commits
-                    commit_created_at_simplified = datetime.strptime(
-                        commit["created_at"].replace("+00:00", "Z"),
-                        "%Y-%m-%dT%H:%M:%S.%fZ",
-                    ).strftime("%Y-%m-%d")
-
-                    for diff_item in commit["diff_data"]:
-                        commit_chart_data[commit_created_at_simplified][0] += int(
-                            diff_item["lines_added"]
-                        )
-                        commit_chart_data[commit_created_at_simplified][1] -= int(
-                            diff_item["lines_removed"]
-                        )
-                        lines_added7 += int(diff_item["lines_added"])
-                        lines_added30 += int(diff_item["lines_added"])
-                        lines_removed7 += int(diff_item["lines_removed"])
-                        lines_removed30 += int(diff_item["lines_removed"])
-
-                elif (
-                    data_limitation7_iso_format
-                    > commit["created_at"]
-                    > data_limitation_iso_format30
-                ):
-                    created_commits30 += 1
-                    # provide simmplified date for commits
-                    commit_created_at_simplified = datetime.strptime(
-                        commit["created_at"].replace("+00:00", "Z"),
-                        "%Y-%m-%dT%H:%M:%S.%fZ",
-                    ).strftime("%Y-%m-%d")
-
-                    for diff_item in commit["diff_data"]:
-                        commit_chart_data[commit_created_at_simplified][0] += int(
-                            diff_item["lines_added"]
-                        )
-                        commit_chart_data[commit_created_at_simplified][1] -= int(
-                            diff_item["lines_removed"]
-                        )
-                        lines_added30 += int(diff_item["lines_added"])
-                        lines_removed30 += int(diff_item["lines_removed"])
-
-                if (
-                    data_limitation7_iso_format
-                    > commit["created_at"]
-                    > data_limitation14_iso_format
-                ):
-                    previous_created_commits7 += 1
-
-                    # provide simmplified date for commits
-                    commit_created_at_simplified = datetime.strptime(
-                        commit["created_at"].replace("+00:00", "Z"),
-                        "%Y-%m-%dT%H:%M:%S.%fZ",
-                    ).strftime("%Y-%m-%d")
-
-                    for diff_item in commit["diff_data"]:
-                        previous_lines_added7 += int(diff_item["lines_added"])
-                        previous_lines_removed7 += int(diff_item["lines_removed"])
-
-                elif (
-                    data_limitation_iso_format30
-                    > commit["created_at"]
-                    > data_limitation_iso_format60
-                ):
-                    previous_created_commits30 += 1
-                    # provide simmplified date for commits
-                    commit_created_at_simplified = datetime.strptime(
-                        commit["created_at"].replace("+00:00", "Z"),
-                        "%Y-%m-%dT%H:%M:%S.%fZ",
-                    ).strftime("%Y-%m-%d")
-
-                    for diff_item in commit["diff_data"]:
-                        previous_lines_added30 += int(diff_item["lines_added"])
-                        previous_lines_removed30 += int(diff_item["lines_removed"])
-
-            for daily_data in commit_chart_data.values():
-                commits_added_lines_last_30_days_yAxis.append(int(daily_data[0]))
-                commits_removed_lines_last_30_days_yAxis.append(int(daily_data[1]))
-
-            commits_added_lines_last_7_days_yAxis = (
-                commits_added_lines_last_30_days_yAxis[-7:]
-            )
-            commits_removed_lines_last_7_days_yAxis = (
-                commits_removed_lines_last_30_days_yAxis[-7:]
-            )
 
-            body[project]["counters7"] = {
-                "active_projects7": active_projects7,
-                "created_mrs_counter7": created_mrs_counter7,
-                "reviewed_mrs_counter7": reviewed_mrs_counter7,
-                "create_to_merge7": create_to_merge7,
-                "comments_in_created_mrs7": comments_in_created_mrs7,
-                "created_commits7": created_commits7,
-                "lines_added7": lines_added7,
-                "lines_removed7": lines_removed7,
-                "charts_last_7_days_xAxis": last_7_days_xAxis,
-                "mrs_created_last_7_days_yAxis": mrs_created_last_7_days_yAxis,
-                "mrs_reviewed_last_7_days_yAxis": mrs_reviewed_last_7_days_yAxis,
-                "commits_added_lines_last_7_days_yAxis": commits_added_lines_last_7_days_yAxis,
-                "commits_removed_lines_last_7_days_yAxis": commits_removed_lines_last_7_days_yAxis,
-            }
+def coding_stats_job_headers(job):
+    # Server-Timing with the stage timings of a finished job
+    timings = (job.result or {}).get("timings")
+    if timings and getattr(settings, "CODING_STATS_TIMINGS", {}).get(
+        "SERVER_TIMING", True
+    ):
+        return {"Server-Timing": server_timing_header(timings)}
+    return {}
 
-            body[project]["counters30"] = {
-                "active_projects30": active_projects30,
-                "created_mrs_counter30": created_mrs_counter30,
-                "reviewed_mrs_counter30": reviewed_mrs_counter30,
-                "create_to_merge30": create_to_merge30,
-                "comments_in_created_mrs30": comments_in_created_mrs30,
-                "created_commits30": created_commits30,
-                "lines_added30": lines_added30,
-                "lines_removed30": lines_removed30,
-                "charts_last_30_days_xAxis": last_30_days_xAxis,
-                "mrs_created_last_30_days_yAxis": mrs_created_last_30_days_yAxis,
-                "mrs_reviewed_last_30_days_yAxis": mrs_reviewed_last_30_days_yAxis,
-                "commits_added_lines_last_30_days_yAxis": commits_added_lines_last_30_days_yAxis,
-                "commits_removed_lines_last_30_days_yAxis": commits_removed_lines_last_30_days_yAxis,
-            }
 
-            body[project]["previous30"] = {
-                "previous_active_projects30": previous_active_projects30,
-                "previous_created_mrs_counter30": previous_created_mrs_counter30,
-                "previous_reviewed_mrs_counter30": previous_reviewed_mrs_counter30,
-                "previous_create_to_merge30": previous_create_to_merge30,
-                "previous_comments_in_created_mrs30": previous_comments_in_created_mrs30,
-                "previous_created_commits30": previous_created_commits30,
-                "previous_lines_added30": previous_lines_added30,
-                "previous_lines_removed30": previous_lines_removed30,
-            }
+def coding_stats_job_response(job):
+    # 202 with the job while it is waiting or running, its final state otherwise
+    data = CodingStatsJobSerializer(job).data
+    job_url = reverse("teammember-coding-stats-job", kwargs={"pk": job.pk})
+    if job.status in ACTIVE_JOB_STATUSES:
+        return response.Response(
+            data, status=status.HTTP_202_ACCEPTED, headers={"Location": job_url}
+        )
+    return response.Response(
+        data, status=status.HTTP_200_OK, headers=coding_stats_job_headers(job)
+    )
 
-            body[project]["previous7"] = {
-                "previous_active_projects7": previous_active_projects7,
-                "previous_created_mrs_counter7": previous_created_mrs_counter7,
-                "previous_reviewed_mrs_counter7": previous_reviewed_mrs_counter7,
-                "previous_create_to_merge7": previous_create_to_merge7,
-                "previous_comments_in_created_mrs7": previous_comments_in_created_mrs7,
-                "previous_created_commits7": previous_created_commits7,
-                "previous_lines_added7": previous_lines_added7,
-                "previous_lines_removed7": previous_lines_removed7,
-            }
 
-        # global counters
-
-        global_active_projects7 = 0
-        global_created_mrs_counter7 = 0
-        global_reviewed_mrs_counter7 = 0
-        global_create_to_merge7 = 0
-        global_comments_in_created_mrs7 = 0
-        global_created_commits7 = 0
-        global_lines_added7 = 0
-        global_lines_removed7 = 0
-        global_mrs_created_last_7_days_xAxis = []
-        global_mrs_reviewed_last_7_days_xAxis = []
-        global_mrs_created_last_7_days_yAxis = []
-        global_mrs_reviewed_last_7_days_yAxis = []
-        tmp_commits_added_lines_last_7_days_yAxis = [0, 0, 0, 0, 0, 0, 0]
-        tmp_commits_removed_lines_last_7_days_yAxis = [0, 0, 0, 0, 0, 0, 0]
-
-        global_previous_active_projects7 = 0
-        global_previous_created_mrs_counter7 = 0
-        global_previous_reviewed_mrs_counter7 = 0
-        global_previous_create_to_merge7 = 0
-        global_previous_comments_in_created_mrs7 = 0
-        global_previous_created_commits7 = 0
-        global_previous_lines_added7 = 0
-        global_previous_lines_removed7 = 0
-
-        global_active_projects30 = 0
-        global_created_mrs_counter30 = 0
-        global_reviewed_mrs_counter30 = 0
-        global_create_to_merge30 = 0
-        global_comments_in_created_mrs30 = 0
-        global_created_commits30 = 0
-        global_lines_added30 = 0
-        global_lines_removed30 = 0
-        global_mrs_created_last_30_days_xAxis = []
-        global_mrs_reviewed_last_30_days_xAxis = []
-        global_mrs_created_last_30_days_yAxis = [
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-        ]
-        global_mrs_reviewed_last_30_days_yAxis = [
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-        ]
-        global_commits_added_lines_last_30_days_yAxis = []
-        global_commits_removed_lines_last_30_days_yAxis = []
-        tmp_commits_added_lines_last_30_days_yAxis = [
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-        ]
-        tmp_commits_removed_lines_last_30_days_yAxis = [
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-            0,
-        ]
-        global_previous_active_projects30 = 0
-        global_previous_created_mrs_counter30 = 0
-        global_previous_reviewed_mrs_counter30 = 0
-        global_previous_create_to_merge30 = 0
-        global_previous_comments_in_created_mrs30 = 0
-        global_previous_created_commits30 = 0
-        global_previous_lines_added30 = 0
-        global_previous_lines_removed30 = 0
-
-        for project, project_data in body.items():
-            global_active_projects7 += project_data["counters7"]["active_projects7"]
-            global_previous_active_projects7 += project_data["previous7"][
-                "previous_active_projects7"
-            ]
-            global_created_mrs_counter7 += project_data["counters7"][
-                "created_mrs_counter7"
-            ]
-            global_previous_created_mrs_counter7 += project_data["previous7"][
-                "previous_created_mrs_counter7"
-            ]
-            global_reviewed_mrs_counter7 += project_data["counters7"][
-                "reviewed_mrs_counter7"
-            ]
-            global_previous_reviewed_mrs_counter7 += project_data["previous7"][
-                "previous_reviewed_mrs_counter7"
-            ]
-            global_create_to_merge7 += project_data["counters7"]["create_to_merge7"]
-            global_previous_create_to_merge7 += project_data["previous7"][
-                "previous_create_to_merge7"
-            ]
-            global_comments_in_created_mrs7 += project_data["counters7"][
-                "comments_in_created_mrs7"
-            ]
-            global_previous_comments_in_created_mrs7 += project_data["previous7"][
-                "previous_comments_in_created_mrs7"
-            ]
-            global_created_commits7 += project_data["counters7"]["created_commits7"]
-            global_previous_created_commits7 += project_data["previous7"][
-                "previous_created_commits7"
-            ]
-            global_lines_added7 += project_data["counters7"]["lines_added7"]
-            global_previous_lines_added7 += project_data["previous7"][
-                "previous_lines_added7"
-            ]
-            global_lines_removed7 += project_data["counters7"]["lines_removed7"]
-            global_previous_lines_removed7 += project_data["previous7"][
-                "previous_lines_removed7"
-            ]
-            global_mrs_created_last_7_days_xAxis = last_7_days_xAxis
-            tmp_mrs_created_last_7_days_yAxis = [0, 0, 0, 0, 0, 0, 0]
-            global_mrs_created_last_7_days_yAxis = [
-                a + b
-                for a, b in zip(
-                    tmp_mrs_created_last_7_days_yAxis,
-                    project_data["counters7"]["mrs_created_last_7_days_yAxis"],
-                )
-            ]
-            global_mrs_reviewed_last_7_days_xAxis = last_7_days_xAxis
-            tmp_mrs_reviewed_last_7_days_yAxis = [0, 0, 0, 0, 0, 0, 0]
-            global_mrs_reviewed_last_7_days_yAxis = [
-                a + b
-                for a, b in zip(
-                    tmp_mrs_reviewed_last_7_days_yAxis,
-                    project_data["counters7"]["mrs_reviewed_last_7_days_yAxis"],
-                )
-            ]
-            global_commits_added_lines_last_7_days_yAxis = [
-                a + b
-                for a, b in zip(
-                    tmp_commits_added_lines_last_7_days_yAxis,
-                    project_data["counters7"]["commits_added_lines_last_7_days_yAxis"],
-                )
-            ]
-            tmp_commits_added_lines_last_7_days_yAxis = (
-                global_commits_added_lines_last_7_days_yAxis
-            )
-            global_commits_removed_lines_last_7_days_yAxis = [
-                a + b
-                for a, b in zip(
-                    tmp_commits_removed_lines_last_7_days_yAxis,
-                    project_data["counters7"][
-                        "commits_removed_lines_last_7_days_yAxis"
-                    ],
-                )
-            ]
-            tmp_commits_removed_lines_last_7_days_yAxis = (
-                global_commits_removed_lines_last_7_days_yAxis
-            )
+class TeammemberCodingStatsCreateAPIView(CreateAPIView):
+    queryset = TeammemberCodingStats.objects.all()
+    serializer_class = TeammemberCodingStatsSerializer
+    permission_classes = [permissions.IsAuthenticated]
 
-            global_active_projects30 += project_data["counters30"]["active_projects30"]
-            global_previous_active_projects30 += project_data["previous30"][
-                "previous_active_projects30"
-            ]
-            global_created_mrs_counter30 += project_data["counters30"][
-                "created_mrs_counter30"
-            ]
-            global_previous_created_mrs_counter30 += project_data["previous30"][
-                "previous_created_mrs_counter30"
-            ]
-            global_reviewed_mrs_counter30 += project_data["counters30"][
-                "reviewed_mrs_counter30"
-            ]
-            global_previous_reviewed_mrs_counter30 += project_data["previous30"][
-                "previous_reviewed_mrs_counter30"
-            ]
-            global_create_to_merge30 += project_data["counters30"]["create_to_merge30"]
-            global_previous_create_to_merge30 += project_data["previous30"][
-                "previous_create_to_merge30"
-            ]
-            global_comments_in_created_mrs30 += project_data["counters30"][
-                "comments_in_created_mrs30"
-            ]
-            global_previous_comments_in_created_mrs30 += project_data["previous30"][
-                "previous_comments_in_created_mrs30"
-            ]
-            global_created_commits30 += project_data["counters30"]["created_commits30"]
-            global_previous_created_commits30 += project_data["previous30"][
-                "previous_created_commits30"
-            ]
-            global_lines_added30 += project_data["counters30"]["lines_added30"]
-            global_previous_lines_added30 += project_data["previous30"][
-                "previous_lines_added30"
-            ]
-            global_lines_removed30 += project_data["counters30"]["lines_removed30"]
-            global_previous_lines_removed30 += project_data["previous30"][
-                "previous_lines_removed30"
-            ]
-            global_mrs_created_last_30_days_xAxis = last_30_days_xAxis
-            tmp_mrs_created_last_30_days_yAxis = [
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-            ]
-            global_mrs_created_last_30_days_yAxis = [
-                a + b
-                for a, b in zip(
-                    tmp_mrs_created_last_30_days_yAxis,
-                    project_data["counters30"]["mrs_created_last_30_days_yAxis"],
-                )
-            ]
-            global_mrs_reviewed_last_30_days_xAxis = last_30_days_xAxis
-            tmp_mrs_reviewed_last_30_days_xAxis = [
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-            ]
-            global_mrs_reviewed_last_30_days_yAxis = [
-                a + b
-                for a, b in zip(
-                    tmp_mrs_reviewed_last_30_days_xAxis,
-                    project_data["counters30"]["mrs_reviewed_last_30_days_yAxis"],
-                )
-            ]
-
-            global_commits_added_lines_last_30_days_yAxis = [
-                a + b
-                for a, b in zip(
-                    tmp_commits_added_lines_last_30_days_yAxis,
-                    project_data["counters30"][
-                        "commits_added_lines_last_30_days_yAxis"
-                    ],
-                )
-            ]
-            tmp_commits_added_lines_last_30_days_yAxis = (
-                global_commits_added_lines_last_30_days_yAxis
-            )
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-            global_commits_removed_lines_last_30_days_yAxis = [
-                a + b
-                for a, b in zip(
-                    tmp_commits_removed_lines_last_30_days_yAxis,
-                    project_data["counters30"][
-                        "commits_removed_lines_last_30_days_yAxis"
-                    ],
-                )
-            ]
-            tmp_commits_removed_lines_last_30_days_yAxis = (
-                global_commits_removed_lines_last_30_days_yAxis
+        # get related teammember and make sure it has integration data
+        teammember = get_object_or_404(
+            Teammember,
+            pk=serializer.validated_data["teammember"].pk,
+            created_by=request.user,
+        )
+        if not TeamMemberGitIntegrationData.objects.filter(
+            teammember=teammember
+        ).exists():
+            raise ValidationError(
+                {"detail": "Git integration data not found for the specified team member."}
             )
 
-        global_counters7 = {
-            "active_projects7": global_active_projects7,
-            "active_projects7_list": active_projects7_list,
-            "created_mrs_counter7": global_created_mrs_counter7,
-            "reviewed_mrs_counter7": global_reviewed_mrs_counter7,
-            "create_to_merge7": global_create_to_merge7 / global_active_projects7,
-            "comments_in_created_mrs7": global_comments_in_created_mrs7,
-            "created_commits7": global_created_commits7,
-            "commits_frequency7": round(global_created_commits7 / 7, 1),
-            "lines_added7": global_lines_added7,
-            "lines_removed7": global_lines_removed7,
-            "mrs_created_last_7_days_xAxis": global_mrs_created_last_7_days_xAxis,
-            "mrs_created_last_7_days_yAxis": global_mrs_created_last_7_days_yAxis,
-            "mrs_reviewed_last_7_days_xAxis": global_mrs_reviewed_last_7_days_xAxis,
-            "mrs_reviewed_last_7_days_yAxis": global_mrs_reviewed_last_7_days_yAxis,
-            "commits_added_lines_last_7_days_yAxis": global_commits_added_lines_last_7_days_yAxis,
-            "commits_removed_lines_last_7_days_yAxis": global_commits_removed_lines_last_7_days_yAxis,
-        }
-
-        global_previous_counters7 = {
-            "previous_active_projects7": global_previous_active_projects7,
-            "previous_created_mrs_counter7": global_previous_created_mrs_counter7,
-            "previous_reviewed_mrs_counter7": global_previous_reviewed_mrs_counter7,
-            "previous_create_to_merge7": global_previous_create_to_merge7
-            / global_previous_active_projects7,
-            "previous_comments_in_created_mrs7": global_previous_comments_in_created_mrs7,
-            "previous_created_commits7": global_previous_created_commits7,
-            "previous_commits_frequency7": round(
-                global_previous_created_commits7 / 7, 1
-            ),
-            "previous_lines_added7": global_previous_lines_added7,
-            "previous_lines_removed7": global_previous_lines_removed7,
-        }
-
-        global_counters30 = {
-            "active_projects30": global_active_projects30,
-            "active_projects30_list": active_projects30_list,
-            "created_mrs_counter30": global_created_mrs_counter30,
-            "reviewed_mrs_counter30": global_reviewed_mrs_counter30,
-            "create_to_merge30": global_create_to_merge30 / global_active_projects30,
-            "comments_in_created_mrs30": global_comments_in_created_mrs30,
-            "created_commits30": global_created_commits30,
-            "commits_frequency30": round(global_created_commits30 / 30, 1),
-            "lines_added30": global_lines_added30,
-            "lines_removed30": global_lines_removed30,
-            "mrs_created_last_30_days_xAxis": global_mrs_created_last_30_days_xAxis,
-            "mrs_created_last_30_days_yAxis": global_mrs_created_last_30_days_yAxis,
-            "mrs_reviewed_last_30_days_xAxis": global_mrs_reviewed_last_30_days_xAxis,
-            "mrs_reviewed_last_30_days_yAxis": global_mrs_reviewed_last_30_days_yAxis,
-            "commits_added_lines_last_30_days_yAxis": global_commits_added_lines_last_30_days_yAxis,
-            "commits_removed_lines_last_30_days_yAxis": global_commits_removed_lines_last_30_days_yAxis,
-        }
-
-        global_previous_counters30 = {
-            "previous_active_projects30": global_previous_active_projects30,
-            "previous_created_mrs_counter30": global_previous_created_mrs_counter30,
-            "previous_reviewed_mrs_counter30": global_previous_reviewed_mrs_counter30,
-            "previous_create_to_merge30": global_previous_create_to_merge30
-            / global_previous_active_projects30,
-            "previous_comments_in_created_mrs30": global_previous_comments_in_created_mrs30,
-            "previous_created_commits30": global_previous_created_commits30,
-            "previous_commits_frequency30": round(
-                global_previous_created_commits30 / 30, 1
-            ),
-            "previous_lines_added30": global_previous_lines_added30,
-            "previous_lines_removed30": global_previous_lines_removed30,
-        }
-
-        # save serialized data to database
-        serializer.save(
-            teammember=teammember,
-            body=body,
-            counters7=global_counters7,
-            counters30=global_counters30,
-            previous7=global_previous_counters7,
-            previous30=global_previous_counters30,
+        # GitLab fetching and aggregation run in the coding stats worker
+        job, created = enqueue_coding_stats_job(
+            request.user,
+            teammember,
+            "create",
+            params={
+                "latestUpdate": serializer.validated_data["latestUpdate"].isoformat()
+            },
         )
+        return coding_stats_job_response(job)
 
 
 class TeammemberCodingStatsUpdateAPIView(UpdateAPIView):
@@ -1418,240 +490,129 @@ class TeammemberCodingStatsUpdateAPIView(UpdateAPIView):
         # Fetch the coding stats for the Teammember
         return get_object_or_404(TeammemberCodingStats, teammember=teammember)
 
-    def perform_update(self, serializer):
-        user = self.request.user
-        teammember_id = self.kwargs.get("teammember_id")
-        teammemberCodingStats = self.get_object()
-        updateBody = {}
+    def update(self, request, *args, **kwargs):
+        # Queue an update of the coding stats, the worker fetches only the new activity
+        coding_stats = self.get_object()
+        job, created = enqueue_coding_stats_job(
+            request.user, coding_stats.teammember, "update"
+        )
+        return coding_stats_job_response(job)
 
-        # Get the related teammember
-        teammember = get_object_or_404(Teammember, id=teammember_id, created_by=user)
 
-        # Verify Git integration data (optional logic)
-        gitIntegrationData = TeamMemberGitIntegrationData.objects.filter(
-            teammember=teammember
-        ).first()
+class TeammemberCodingStatsRangeAPIView(APIView):
+    permission_classes = [IsAuthenticated]
 
-        if gitIntegrationData:
-            git_integration_dict = model_to_dict(gitIntegrationData)
-            integration_status = gitlab_verification_api_call(git_integration_dict)
+    def get(self, request, teammember_id, *args, **kwargs):
+        # Coding stats of any date range, read from the daily rollups without calling GitLab
+        # example: /team/teammember-coding-stats/8/range/?start=2024-01-01&end=2024-03-31&granularity=week&compare=true
+        teammember = get_object_or_404(
+            Teammember, id=teammember_id, created_by=request.user
+        )
+        query = CodingStatsRangeQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        start = query.validated_data["start"]
+        end = query.validated_data["end"]
+        granularity = query.validated_data["granularity"]
+
+        data = {
+            "teammember": teammember.id,
+            "start": start,
+            "end": end,
+            "granularity": granularity,
+            **coding_activity_range(teammember, start, end, granularity),
+        }
 
-            if integration_status is False:
-                # integration got broken so change it's status in the teammember model
-                teammember.teammember_hasGitIntegration = False
-                teammember.save()
+        # the window of the same length right before the range
+        if query.validated_data["compare"]:
+            length = end - start + timedelta(days=1)
+            previousStart = start - length
+            previousEnd = start - timedelta(days=1)
+            data["previous"] = {
+                "start": previousStart,
+                "end": previousEnd,
+                **coding_activity_range(
+                    teammember, previousStart, previousEnd, granularity
+                ),
+            }
 
-                return ValidationError(
-                    {"detail": "Git integration verification failed."}
-                )
+        return response.Response(data, status=status.HTTP_200_OK)
 
-        # get info about latest coding stats update
-        teammemberCodingStats = TeammemberCodingStats.objects.get(
-            teammember_id=teammember_id
-        )
 
-        data_limitation = teammemberCodingStats.latestUpdate
-        data_limitation_iso_format = data_limitation.strftime("%Y-%m-%dT%H:%M:%SZ")
+class ProjectCodingStatsDetailAPIView(RetrieveAPIView):
+    serializer_class = ProjectCodingStatsSerializer
+    permission_classes = [IsAuthenticated]
 
-        apiCallsInput = {
-            "groupID": gitIntegrationData.teammemberGitGroupID,
-            "userID": gitIntegrationData.teammemberGitUserID,
-            "accessToken": gitIntegrationData.teammemberGitPersonalAccessToken,
-            "data_limitation": data_limitation_iso_format,
-        }
+    def get_object(self):
+        # Team totals of a project of the authenticated user, kept up to date
+        # whenever the coding stats of one of its teammembers change
+        try:
+            return ProjectCodingStats.objects.get(
+                project_id=self.kwargs.get("project_id"),
+                project__project_owner=self.request.user,
+            )
+        except ProjectCodingStats.DoesNotExist:
+            raise NotFound(detail="Coding stats not found for the specified project.")
 
-        # Make created mrs api call with gitlab_merge_requests_api_call
-        apiCallsInput["requestType"] = "author_id"
-        created_mrs_data = gitlab_merge_requests_api_call(apiCallsInput)
-
-        # Make reviewed mrs api call with gitlab_merge_requests_api_call
-        apiCallsInput["requestType"] = "reviewer_id"
-        reviewed_mrs_data = gitlab_merge_requests_api_call(apiCallsInput)
-        del apiCallsInput["requestType"]
-
-        # Extract MR IDs and prepare the list for mrs_list
-        mrs_ids = set()  # Use a set to avoid duplicate IDs
-        # Add created MRs IDs to the set
-        for mr_id in created_mrs_data.keys():
-            mrs_ids.add(mr_id)
-
-        # Convert the set to a list and add to apiCallsInput
-        apiCallsInput["mrs_list"] = list(mrs_ids)
-
-        merged_project_ids = set()
-        for mr_id, mr_info in created_mrs_data.items():
-            project_id = mr_info.get("project_id")
-            if project_id:
-                merged_project_ids.add(project_id)  # Add to the set to avoid duplicates
-        for mr_id, mr_info in reviewed_mrs_data.items():
-            project_id = mr_info.get("project_id")
-            if project_id:
-                merged_project_ids.add(project_id)  # Add to the set to avoid duplicates
-
-        # Convert the set to a list and add it to api calls input
-        merged_project_ids_list = list(merged_project_ids)
-        apiCallsInput["projects_list"] = merged_project_ids_list
-
-        # Make Project api call
-        mrs_projects_data = gitlab_project_api_call(apiCallsInput)
-        del apiCallsInput["mrs_list"]
-
-        # Make commits created api call with gitlab_commits_created_api_call
-        commits_created_data = gitlab_commits_created_api_call(apiCallsInput)
-        del apiCallsInput["projects_list"]
-
-        # Make commits difference api call with gitlab_commits_diff_api_call
-        # apiCallsInput["commits_list"] = created_commits_data_dict
-        apiCallsInput["commits_list"] = commits_created_data
-        commits_diffs_data = gitlab_commits_diff_api_call(apiCallsInput)
-        del apiCallsInput["commits_list"]
-
-        # Fetch MRs comments api call with gitlab_commits_diff_api_call
-        # Combine both dictionaries
-        combined_mrs_data = created_mrs_data.copy()  # Start with created_mrs_data
-        combined_mrs_data.update(reviewed_mrs_data)  # Merge in reviewed_mrs_data
-        apiCallsInput["mrs_data"] = combined_mrs_data
-        mrs_comments_data = gitlab_mrs_comments_api_call(apiCallsInput)
-
-        # Structure the data in a reasonable way
-        # Adding the project data to the body and initializing the groups of data to be provided later
-        for project_id, project_data in mrs_projects_data.items():
-            project_id = str(project_id)
-            updateBody[project_id] = {
-                "project_name": project_data["project_name"],
-                "project_url": project_data["project_url"],
-                "created_mrs_data": [],
-                "reviewed_mrs_data": [],
-                "created_commits_data": [],
-            }
+    # example: http://127.0.0.1:8000/team/project-coding-stats/3/
 
-        # Before adding MRs data - merge the comments and the MRs info into one variable
-        for mr_id, comment_data in mrs_comments_data.items():
-            # Check if the MR ID exists in the created_mrs_data
-            if mr_id in created_mrs_data:
-                # Add the comment data to the respective MR in created_mrs_data
-                created_mrs_data[mr_id]["comment_ids"] = comment_data["comment_ids"]
-                created_mrs_data[mr_id]["comment_bodies"] = comment_data[
-                    "comment_bodies"
-                ]
-
-        for mr_id, comment_data in mrs_comments_data.items():
-            # Check if the MR ID exists in the reviewed_mrs_data
-            if mr_id in reviewed_mrs_data and mr_id not in created_mrs_data:
-                # Add the comment data to the respective MR in reviewed_mrs_data
-                reviewed_mrs_data[mr_id]["comment_ids"] = comment_data["comment_ids"]
-                reviewed_mrs_data[mr_id]["comment_bodies"] = comment_data[
-                    "comment_bodies"
-                ]
-
-        for mr_id, mr_data in created_mrs_data.items():
-            project_id = mr_data["project_id"]
-            project_id = str(project_id)
-
-            # check if there are comments for the mr
-            if not mr_data.get("comment_ids"):
-                mr_data["comment_ids"] = False
-            if not mr_data.get("comment_bodies"):
-                mr_data["comment_bodies"] = False
-
-            # Check if the project_id exists in the body
-            updateBody[project_id]["created_mrs_data"].append(
-                {
-                    "mr_id": mr_id,
-                    "iid": mr_data["iid"],
-                    "created_at": mr_data["created_at"],
-                    "merged_at": mr_data["merged_at"],
-                    "create_to_merge": mr_data["create_to_merge"],
-                    "comment_ids": mr_data["comment_ids"],
-                    "comment_bodies": mr_data["comment_bodies"],
-                }
-            )
 
-        for mr_id, mr_data in reviewed_mrs_data.items():
-            project_id = mr_data["project_id"]
-            project_id = str(project_id)
+class GitLabWebhookAPIView(APIView):
+    # GitLab authenticates with the X-Gitlab-Token header, not with a user token
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
 
-            # Check if there are comments for the mr
-            if not mr_data.get("comment_ids"):
-                mr_data["comment_ids"] = False
-            if not mr_data.get("comment_bodies"):
-                mr_data["comment_bodies"] = False
+    def post(self, request, *args, **kwargs):
+        if not gitlab_webhook_token_valid(request.headers.get("X-Gitlab-Token")):
+            raise PermissionDenied("Invalid GitLab webhook token.")
 
-            # Check if the project_id exists in the body
-            updateBody[project_id]["reviewed_mrs_data"].append(
-                {
-                    "mr_id": mr_id,
-                    "iid": mr_data["iid"],
-                    "created_at": mr_data["created_at"],
-                    "merged_at": mr_data["merged_at"],
-                    "comment_ids": mr_data["comment_ids"],
-                    "comment_bodies": mr_data["comment_bodies"],
-                }
+        # other events are acknowledged, GitLab disables hooks that keep failing
+        event = GITLAB_WEBHOOK_EVENTS.get(request.headers.get("X-Gitlab-Event"))
+        if event is None or not isinstance(request.data, dict):
+            return response.Response({"jobs": []}, status=status.HTTP_200_OK)
+
+        # the event is applied by the coding stats worker, one job per teammember
+        try:
+            activity = gitlab_webhook_activity(event, request.data)
+        except GitLabWebhookPayloadError as error:
+            raise ValidationError({"detail": str(error)})
+        jobs = []
+        for gitIntegrationData in gitlab_webhook_integrations(activity):
+            job, created = enqueue_coding_stats_job(
+                gitIntegrationData.created_by,
+                gitIntegrationData.teammember,
+                "webhook",
+                params={
+                    "event": event,
+                    "body": activity[gitIntegrationData.teammemberGitUserID],
+                },
+                reuse=False,
             )
+            jobs.append(job.pk)
 
-        # Add the Commit data to the 'created_commits_data' list for that project and initialize diff data
-        for project_id, commit_data_list in commits_created_data.items():
-            project_id = str(project_id)
-            # Ensure the project ID exists in the body
-            if project_id not in updateBody:
-                updateBody[project_id] = {"created_commits_data": []}
-
-            for commit_data in commit_data_list:
-                updateBody[project_id]["created_commits_data"].append(
-                    {
-                        "commit_short_id": commit_data["commit_short_id"],
-                        "created_at": commit_data["created_at"],
-                        "commit_web_url": commit_data["commit_web_url"],
-                        "diff_data": [],  # Initialize as an empty list
-                    }
-                )
-
-        # Add the commit diff data
-        for project_id, commit_comments_data_list in commits_diffs_data.items():
-            project_id = str(project_id)
-            for commit_comments_data in commit_comments_data_list:
-                # Find the correct commit in the body's created_commits_data list
-                for commit in updateBody[project_id]["created_commits_data"]:
-                    if (
-                        commit["commit_short_id"]
-                        == commit_comments_data["commit_short_id"]
-                    ):
-                        # Access 'diff_data' from commit_comments_data
-                        diff_data = commit_comments_data["diff_data"]
-
-                        # Append diff data to the respective commit's diff_data list
-                        commit["diff_data"].append(
-                            {
-                                "lines_added": diff_data["lines_added"],
-                                "lines_removed": diff_data["lines_removed"],
-                                "added_lines_content": diff_data["added_lines_content"],
-                                "removed_lines_content": diff_data[
-                                    "removed_lines_content"
-                                ],
-                            }
-                        )
-
-        for project_id, project_data in updateBody.items():
-            project_id = str(project_id)
-            if project_id not in teammemberCodingStats.body:
-                teammemberCodingStats.body[project_id] = project_data
-            else:
-                teammemberCodingStats.body[project_id]["created_mrs_data"] = (
-                    updateBody[project_id]["created_mrs_data"]
-                    + teammemberCodingStats.body[project_id]["created_mrs_data"]
-                )
-                teammemberCodingStats.body[project_id]["reviewed_mrs_data"] = (
-                    updateBody[project_id]["reviewed_mrs_data"]
-                    + teammemberCodingStats.body[project_id]["reviewed_mrs_data"]
-                )
-                teammemberCodingStats.body[project_id]["created_commits_data"] = (
-                    updateBody[project_id]["created_commits_data"]
-                    + teammemberCodingStats.body[project_id]["created_commits_data"]
-                )
-
-        print(teammemberCodingStats.body)
-        # TODO recalculate the counters in projects and globally
-        # TODO save updated model
+        return response.Response(
+            {"jobs": jobs},
+            status=status.HTTP_202_ACCEPTED if jobs else status.HTTP_200_OK,
+        )
+
+    # example: GitLab project > Settings > Webhooks > http://127.0.0.1:8000/team/gitlab-webhook/
+
+
+class CodingStatsJobDetailAPIView(RetrieveAPIView):
+    serializer_class = CodingStatsJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        # Only the jobs queued by the authenticated user
+        return CodingStatsJob.objects.filter(created_by=self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        job = self.get_object()
+        serializer = self.get_serializer(job)
+        return response.Response(
+            serializer.data,
+            status=status.HTTP_200_OK,
+            headers=coding_stats_job_headers(job),
+        )
 
 
 class TeammemberCodingStatsDeleteAPIView(DestroyAPIView):
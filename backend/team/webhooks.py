@@ -0,0 +1,242 @@
+import hmac
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from .coding_stats import (
+    CodingStatsError,
+    apply_coding_activity,
+    check_gitlab_result,
+    get_git_integration_data,
+    rebuild_coding_stats,
+)
+from .models import TeamMemberGitIntegrationData
+from .timing import timed_stage
+from .utils import gitlab_commits_diff_api_call
+
+# X-Gitlab-Event header of the handled events
+GITLAB_WEBHOOK_EVENTS = {
+    "Push Hook": "push",
+    "Merge Request Hook": "merge_request",
+    "Note Hook": "note",
+}
+
+
+class GitLabWebhookPayloadError(Exception):
+    # Raised when an event lacks the fields its activity is built from
+    pass
+
+
+def gitlab_webhook_token_valid(token):
+    # Requests are only accepted when a secret token is configured and they carry it
+    secret_token = getattr(settings, "GITLAB_WEBHOOK", {}).get("SECRET_TOKEN")
+    return bool(secret_token and token) and hmac.compare_digest(
+        token.encode(), secret_token.encode()
+    )
+
+
+def gitlab_timestamp(value):
+    # Webhooks send "2024-01-31T10:00:00Z", "2024-01-31T12:00:00+02:00" or (older
+    # GitLab) "2024-01-31 10:00:00 UTC", the API format of the stored records is used
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(
+            str(value).replace(" UTC", "+00:00").replace("Z", "+00:00")
+        )
+    except ValueError:
+        raise GitLabWebhookPayloadError(f"Invalid timestamp {value!r}.")
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=dt_timezone.utc)
+    return moment.astimezone(dt_timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def required_fields(data, *fields, name="payload"):
+    # The fields of data (an object of the event) that the body records need
+    if not isinstance(data, dict):
+        raise GitLabWebhookPayloadError(f"The {name} of the event is not an object.")
+    missing = [field for field in fields if data.get(field) in (None, "")]
+    if missing:
+        raise GitLabWebhookPayloadError(
+            f"The {name} of the event has no {', '.join(missing)}."
+        )
+    return data
+
+
+def project_activity(payload):
+    project = payload.get("project") or {}
+    return str(project.get("id")), {
+        "project_name": project.get("name"),
+        "project_url": project.get("web_url"),
+        "created_mrs_data": [],
+        "reviewed_mrs_data": [],
+        "created_commits_data": [],
+    }
+
+
+def merge_request_record(attributes, author=False):
+    # An MR record of the body from the MR attributes of an event
+    required_fields(attributes, "id", "iid", name="merge request")
+    created_at = gitlab_timestamp(attributes.get("created_at"))
+    merged_at = gitlab_timestamp(attributes.get("merged_at"))
+    if merged_at is None and attributes.get("state") == "merged":
+        merged_at = gitlab_timestamp(attributes.get("updated_at"))
+    record = {
+        "mr_id": attributes["id"],
+        "iid": attributes["iid"],
+        "created_at": created_at,
+        "merged_at": merged_at,
+        "comment_ids": False,
+        "comment_bodies": False,
+    }
+    if author:
+        # only merged MRs have a create to merge time, like the fetched records
+        record["create_to_merge"] = None
+        if merged_at:
+            record["create_to_merge"] = round(
+                (
+                    datetime.fromisoformat(merged_at.replace("Z", "+00:00"))
+                    - datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+                ).total_seconds(),
+                0,
+            )
+    return record
+
+
+def gitlab_webhook_activity(event, payload):
+    # {GitLab user id: body} with the activity an event brings to each user, in the
+    # body format of coding_stats.fetch_coding_activity. Pushed commits have no
+    # diff_data yet and MR records only carry the comments of the event.
+    # Raises GitLabWebhookPayloadError when the event misses fields of the records
+    activity = {}
+
+    def user_activity(user_id):
+        project_id, project_data = project_activity(payload)
+        return activity.setdefault(str(user_id), {project_id: project_data})[
+            project_id
+        ]
+
+    if event == "push":
+        # only the commits authored by the pusher, a push also brings in other's commits
+        user_email = payload.get("user_email")
+        for commit in payload.get("commits") or []:
+            required_fields(commit, "id", "timestamp", name="commit")
+        commits = [
+            commit
+            for commit in payload.get("commits") or []
+            if not user_email or (commit.get("author") or {}).get("email") == user_email
+        ]
+        if commits and payload.get("user_id"):
+            user_activity(payload["user_id"])["created_commits_data"] = [
+                {
+                    "commit_short_id": commit["id"][:8],
+                    "created_at": gitlab_timestamp(commit["timestamp"]),
+                    "commit_web_url": commit.get("url"),
+                    "diff_data": None,
+                }
+                for commit in commits
+            ]
+
+    elif event == "merge_request":
+        attributes = payload.get("object_attributes") or {}
+        if attributes.get("author_id"):
+            user_activity(attributes["author_id"])["created_mrs_data"].append(
+                merge_request_record(attributes, author=True)
+            )
+        for reviewer in payload.get("reviewers") or []:
+            required_fields(reviewer, "id", name="reviewer")
+            user_activity(reviewer["id"])["reviewed_mrs_data"].append(
+                merge_request_record(attributes)
+            )
+
+    elif event == "note":
+        # comments are counted on the MRs of their author
+        attributes = payload.get("object_attributes") or {}
+        merge_request = payload.get("merge_request") or {}
+        if attributes.get("noteable_type") == "MergeRequest" and merge_request.get(
+            "author_id"
+        ):
+            required_fields(attributes, "id", name="note")
+            record = merge_request_record(merge_request, author=True)
+            record["comment_ids"] = [attributes["id"]]
+            record["comment_bodies"] = [attributes.get("note") or ""]
+            user_activity(merge_request["author_id"])["created_mrs_data"].append(
+                record
+            )
+
+    return activity
+
+
+def gitlab_webhook_integrations(activity):
+    # GitLab integrations of the users of the activity that have coding stats,
+    # several teammembers can follow the same GitLab user
+    return (
+        TeamMemberGitIntegrationData.objects.filter(
+            teammemberGitHosting="GitLab",
+            teammemberGitUserID__in=list(activity),
+            teammember__teammembercodingstats__isnull=False,
+        )
+        .select_related("teammember", "created_by")
+        .order_by("pk")
+    )
+
+
+def fetch_pushed_commit_diffs(gitIntegrationData, updateBody):
+    # Line counts of the pushed commits, the push event only lists the changed files.
+    # Diffs are cached by gitlab_commits_diff_api_call so a commit is downloaded once
+    commits_list = {
+        project_id: [
+            commit["commit_short_id"]
+            for commit in project_data["created_commits_data"]
+            if commit["diff_data"] is None
+        ]
+        for project_id, project_data in updateBody.items()
+    }
+    commits_list = {
+        project_id: commits for project_id, commits in commits_list.items() if commits
+    }
+    if not commits_list:
+        return updateBody
+
+    with timed_stage("commit_diffs"):
+        commits_diffs_data = gitlab_commits_diff_api_call(
+            {
+                "accessToken": gitIntegrationData.teammemberGitPersonalAccessToken,
+                "commits_list": commits_list,
+            }
+        )
+    check_gitlab_result(commits_diffs_data)
+
+    diffs_by_commit = {}
+    for project_id, commit_diffs in commits_diffs_data.items():
+        for commit_diff in commit_diffs:
+            diff_data = commit_diff["diff_data"]
+            diffs_by_commit.setdefault(
+                (str(project_id), commit_diff["commit_short_id"]), []
+            ).append(
+                {
+                    "lines_added": diff_data["lines_added"],
+                    "lines_removed": diff_data["lines_removed"],
+                    "added_lines_content": diff_data["added_lines_content"],
+                    "removed_lines_content": diff_data["removed_lines_content"],
+                }
+            )
+    for project_id, project_data in updateBody.items():
+        for commit in project_data["created_commits_data"]:
+            if commit["diff_data"] is None:
+                commit["diff_data"] = diffs_by_commit.get(
+                    (project_id, commit["commit_short_id"]), []
+                )
+    return updateBody
+
+
+def apply_gitlab_webhook_activity(teammemberCodingStats, updateBody):
+    # Merge the activity of a webhook event into the coding stats, the comments already
+    # stored on an MR are kept. latestUpdate stays the time of the latest full update
+    # so deliveries GitLab failed to make are still picked up by the next update
+    if not updateBody:
+        raise CodingStatsError("The webhook event has no activity to apply.")
+    if not teammemberCodingStats.has_stored_body:
+        # the full fetch of stats without a stored body includes the event activity
+        return rebuild_coding_stats(teammemberCodingStats)
+    gitIntegrationData = get_git_integration_data(teammemberCodingStats.teammember)
+    updateBody = fetch_pushed_commit_diffs(gitIntegrationData, updateBody)
+    return apply_coding_activity(teammemberCodingStats, updateBody, keep_comments=True)
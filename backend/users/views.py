@@ -6,6 +6,7 @@ from django.contrib.auth import get_user_model, authenticate
 from knox.models import AuthToken
 from knox.auth import TokenAuthentication
 from rest_framework.authentication import SessionAuthentication
+from core.pagination import OptInCursorPagination
 
 User = get_user_model()
 
@@ -52,9 +53,16 @@ class UsersListViewset(viewsets.ViewSet):
     permission_classes = [permissions.AllowAny]
     queryset = User.objects.all()
     serializer_class = RegisterSerializer
+    cursor_ordering = ("id",)
 
     def list(self, request):
-        queryset = User.objects.all()
+        queryset = User.objects.order_by(*self.cursor_ordering)
+        # a page of users when the request asks for one (cursor or page_size)
+        paginator = OptInCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        if page is not None:
+            serializer = self.serializer_class(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
         serializer = self.serializer_class(queryset, many=True)
         return Response(serializer.data)
 